@@ -1,7 +1,7 @@
 # pnote-ai-app/app.py
 import streamlit as st
 import os
-from ui import utils, sidebar, onboarding
+from ui import utils, sidebar, onboarding, data
 from core.services import service_manager
 from config import CHROMA_DB_PATH, USER_DATA_PATH, GEMINI_API_KEY
 
@@ -22,11 +22,11 @@ os.makedirs(CHROMA_DB_PATH, exist_ok=True); os.makedirs(USER_DATA_PATH, exist_ok
 
 if "sm" not in st.session_state:
     st.session_state.sm = service_manager
-    st.session_state.courses = st.session_state.sm.list_courses()
+    st.session_state.courses = data.list_courses()
     st.session_state.cid = st.session_state.courses[0]['id'] if st.session_state.courses else None
     st.session_state.history = {}
 else:
-    st.session_state.courses = st.session_state.sm.list_courses()
+    st.session_state.courses = data.list_courses()
 
 # --- BƯỚC 3: VẼ GIAO DIỆN ---
 sidebar.display()
@@ -47,3 +47,7 @@ else:
     name = next((c['name'] for c in st.session_state.courses if c['id'] == st.session_state.cid), "...")
     st.title(f"🚀 Không gian làm việc: {name}")
     st.page_link("pages/workspace.py", label="**Đi đến Workspace để bắt đầu →**", icon="📝")
+    st.page_link("pages/search.py", label="Tìm kiếm trên mọi không gian làm việc", icon="🔎")
+
+# --- BƯỚC 5: NẠP TRƯỚC CÁC THƯ VIỆN NẶNG (CHẠY NỀN, MỘT LẦN MỖI TIẾN TRÌNH) ---
+service_manager.warm_up()
@@ -0,0 +1,2 @@
+# pnote-ai-app/benchmarks/__init__.py
+# Các script đo hiệu năng chạy offline: python -m benchmarks.<tên_module>
@@ -0,0 +1,146 @@
+# pnote-ai-app/benchmarks/corpus.py
+
+# ==============================================================================
+# SINH DỮ LIỆU TỔNG HỢP CHO BENCHMARK
+# Tạo tài liệu giả lập (không cần mạng, không cần thư viện ngoài) để đo hiệu năng.
+# ==============================================================================
+
+import hashlib
+import io
+import random
+import unicodedata
+
+import numpy as np
+
+WORDS = (
+    "hoc may du lieu mo hinh thuat toan toi uu ham mat mat dao ham gradient vector ma tran "
+    "xac suat thong ke phan phoi kiem dinh gia thuyet hoi quy phan loai mang neural "
+    "kinh te vi mo lam phat tang truong tien te chinh sach tai khoa cung cau thi truong "
+    "the quick brown fox jumps over the lazy dog entropy bayes markov fourier laplace"
+).split()
+# Hư từ tiếng Việt thường gặp (có dấu, như trong tài liệu và câu hỏi thật); chiếm
+# khoảng FUNCTION_WORD_RATIO số từ nên chúng có mặt trong phần lớn các chunk.
+FUNCTION_WORDS = (
+    "là gì và được dùng như thế nào của có cho các những một trong với không này đó "
+    "thì mà để khi từ theo về đã sẽ đang bị rất nhiều hay hoặc tại do nên vì nếu"
+).split()
+FUNCTION_WORD_RATIO = 0.4
+
+
+def make_text(num_words: int, seed: int = 0) -> str:
+    """Sinh một đoạn văn bản ngẫu nhiên (có thể tái lập nhờ `seed`) gồm `num_words` từ."""
+    rng = random.Random(seed)
+    sentences, words = [], 0
+    while words < num_words:
+        length = min(rng.randint(8, 20), num_words - words)
+        sentence = " ".join(rng.choice(FUNCTION_WORDS if rng.random() < FUNCTION_WORD_RATIO else WORDS)
+                            for _ in range(length))
+        sentences.append(sentence.capitalize() + ".")
+        words += length
+    return " ".join(sentences)
+
+
+# Kích thước tài liệu (số từ) dùng chung cho các benchmark.
+SIZES = {"small": 2_000, "medium": 20_000, "large": 100_000}
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _strip_accents(text: str) -> str:
+    """Bỏ dấu tiếng Việt: font chuẩn (WinAnsiEncoding) không có các ký tự này."""
+    text = text.replace("đ", "d").replace("Đ", "D")
+    return "".join(c for c in unicodedata.normalize("NFD", text) if not unicodedata.combining(c))
+
+
+def make_pdf(num_pages: int, words_per_page: int = 400, seed: int = 0) -> bytes:
+    """
+    Tạo một file PDF hợp lệ gồm `num_pages` trang văn bản (font Helvetica chuẩn),
+    viết trực tiếp cấu trúc PDF để không phụ thuộc thư viện tạo PDF.
+    """
+    objects: list[bytes] = []
+    page_ids = [4 + 2 * i for i in range(num_pages)]
+    objects.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    kids = " ".join(f"{pid} 0 R" for pid in page_ids)
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {num_pages} >>".encode())
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+    for i, pid in enumerate(page_ids):
+        words = _strip_accents(make_text(words_per_page, seed * 100_003 + i)).split()
+        lines = [" ".join(words[j:j + 12]) for j in range(0, len(words), 12)]
+        body = "BT /F1 10 Tf 40 800 Td 13 TL " + " ".join(f"({_pdf_escape(line)}) Tj T*" for line in lines) + " ET"
+        stream = body.encode("latin-1")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {pid + 1} 0 R >>".encode())
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def make_docx(num_words: int, words_per_paragraph: int = 120, seed: int = 0) -> bytes:
+    """Tạo một file Word (.docx) gồm các đoạn văn tổng hợp, tổng cộng khoảng `num_words` từ."""
+    import docx
+    document = docx.Document()
+    for i in range(0, num_words, words_per_paragraph):
+        if i % (words_per_paragraph * 10) == 0:
+            document.add_heading(f"Chương {i // (words_per_paragraph * 10) + 1}", level=1)
+        document.add_paragraph(make_text(min(words_per_paragraph, num_words - i), seed * 100_003 + i))
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def make_html(num_words: int, words_per_paragraph: int = 120, seed: int = 0) -> str:
+    """Tạo một trang HTML có nội dung chính cùng script/style/nav/footer mà bộ trích xuất phải loại bỏ."""
+    paragraphs = "\n".join(
+        f"<p>{make_text(min(words_per_paragraph, num_words - i), seed * 100_003 + i)}</p>"
+        for i in range(0, num_words, words_per_paragraph)
+    )
+    return (
+        "<!DOCTYPE html><html><head><meta charset='utf-8'><title>Bài giảng</title>"
+        "<style>body { font-family: sans-serif; }</style><script>var tracking = 1;</script></head><body>"
+        "<header><h1>Trang khóa học</h1></header><nav><a href='/'>Trang chủ</a> <a href='/a'>Bài 1</a></nav>"
+        f"<main><article><h2>Nội dung</h2>\n{paragraphs}\n</article></main>"
+        "<aside>Bài viết liên quan</aside><footer>© PNote</footer></body></html>"
+    )
+
+
+def make_transcript(num_words: int, seed: int = 0) -> str:
+    """Văn bản giống transcript YouTube: các câu nói ngắn, không viết hoa, nối bằng dấu cách."""
+    rng = random.Random(seed)
+    segments, words = [], 0
+    while words < num_words:
+        length = min(rng.randint(4, 10), num_words - words)
+        segments.append(" ".join(rng.choice(WORDS) for _ in range(length)))
+        words += length
+    return " ".join(segments)
+
+
+class HashingEmbeddingFunction:
+    """
+    Embedding "bag-of-words" băm vào `dim` chiều, chạy offline và tất định.
+    Dùng thay cho mô hình embedding thật khi benchmark không có mạng; chất
+    lượng ngữ nghĩa thấp hơn nhưng chi phí truy vấn ChromaDB là như nhau.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def __call__(self, input: list[str]) -> list[np.ndarray]:
+        vectors = []
+        for text in input:
+            vector = np.zeros(self.dim, dtype=np.float32)
+            for word in text.lower().split():
+                vector[int.from_bytes(hashlib.blake2b(word.encode('utf-8'), digest_size=4).digest(), 'little') % self.dim] += 1.0
+            norm = np.linalg.norm(vector)
+            vectors.append(vector / norm if norm else vector)
+        return vectors
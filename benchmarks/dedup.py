@@ -0,0 +1,122 @@
+# pnote-ai-app/benchmarks/dedup.py
+
+# ==============================================================================
+# BENCHMARK: KHỬ TRÙNG LẶP CHUNK GIỮA CÁC PHIÊN BẢN TÀI LIỆU
+# Nạp một tài liệu gốc và N bản sửa gần giống nhau (như các lần cập nhật một bộ
+# slide) theo hai cách rồi so sánh số chunk được lưu, dung lượng vector, số
+# lần embedding và thời gian nạp:
+# - "baseline": mỗi phiên bản nằm trong một khóa học riêng, tức không có chunk
+#   nào được dùng chung (tương đương cách lưu trước khi có ID theo nội dung).
+# - "dedup": mọi phiên bản nằm trong cùng một khóa học.
+# Các kiểu bản sửa:
+# - reexport: văn bản giữ nguyên (file xuất lại, hash file khác).
+# - append: thêm một phần mới vào cuối.
+# - edit_tail / edit_middle: thay một câu ở 90% / 50% độ dài. Chunk là các cửa sổ
+#   token cố định nên mọi chunk sau vị trí sửa đều bị dịch và không dùng chung được.
+#
+#   python -m benchmarks.dedup --words 20000 --revisions 5
+# ==============================================================================
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import config
+from benchmarks.corpus import HashingEmbeddingFunction, make_text
+from benchmarks.fake_gemini import FakeGemini
+from benchmarks.suite import make_service_manager
+
+KINDS = ("reexport", "append", "edit_tail", "edit_middle")
+EMBEDDING_DIM = 384
+
+
+def revisions(kind: str, words: int, count: int, seed: int = 0) -> list[str]:
+    """Tài liệu gốc và `count` bản sửa liên tiếp theo kiểu `kind`."""
+    versions = [make_text(words, seed)]
+    for i in range(1, count + 1):
+        text = versions[-1]
+        if kind == "append":
+            text = f"{text} {make_text(words // 20, seed + i)}"
+        elif kind in ("edit_tail", "edit_middle"):
+            sentences = text.split(". ")
+            at = int(len(sentences) * (0.9 if kind == "edit_tail" else 0.5))
+            sentences[at] = make_text(12, seed + 1000 + i).rstrip(".")
+            text = ". ".join(sentences)
+        versions.append(text)
+    return versions
+
+
+def directory_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(path) for name in files)
+
+
+def ingest(sm, tmp: str, label: str, versions: list[str], shared: bool) -> dict:
+    """Nạp các phiên bản (chung một khóa học nếu `shared`) với cache embedding riêng cho lần chạy này."""
+    from core.bm25 import BM25_FILENAME
+    from core.embedding_cache import EmbeddingCache
+    sm.embedder = EmbeddingCache(os.path.join(tmp, f"embeddings-{label}.sqlite3"), HashingEmbeddingFunction(EMBEDDING_DIM),
+                                 f"hashing-{EMBEDDING_DIM}", config.EMBEDDING_CACHE_MAX_ENTRIES)
+    course_ids, stored, refs, bm25_bytes, elapsed = [], 0, 0, 0, 0.0
+    for i, text in enumerate(versions):
+        if shared and course_ids:
+            course_id = course_ids[0]
+        else:
+            course_id, error = sm.create_course(f"{label} {i}")
+            if error: raise RuntimeError(error)
+            course_ids.append(course_id)
+        started = time.perf_counter()
+        sm.add_doc(course_id, text, f"slides-v{i}.txt", f"{label}-v{i}")
+        elapsed += time.perf_counter() - started
+    for course_id in course_ids:
+        stored += sm.chroma_client.get_collection(name=course_id).count()
+        refs += sm._get_manifest(course_id).ref_totals()["refs"]
+        sm._get_bm25(course_id)  # Đảm bảo file chỉ mục đã được ghi xuống đĩa.
+        bm25_bytes += os.path.getsize(os.path.join(config.USER_DATA_PATH, course_id, BM25_FILENAME))
+    result = {"ingest_s": elapsed, "stored_chunks": stored, "referenced_chunks": refs,
+              "vector_bytes": stored * EMBEDDING_DIM * 4, "bm25_bytes": bm25_bytes,
+              "embedding_calls": sm.embedder.stats()["misses"]}
+    for course_id in course_ids:
+        sm.delete_course(course_id)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--words", type=int, default=20_000, help="Số từ của tài liệu gốc.")
+    parser.add_argument("--revisions", type=int, default=5, help="Số bản sửa sau tài liệu gốc.")
+    parser.add_argument("--kinds", default=",".join(KINDS), help=f"Các kiểu bản sửa, chọn trong: {', '.join(KINDS)}.")
+    parser.add_argument("--json", help="Ghi kết quả ra file JSON.")
+    args = parser.parse_args()
+    kinds = [kind.strip() for kind in args.kinds.split(",") if kind.strip()]
+    if unknown := [kind for kind in kinds if kind not in KINDS]:
+        parser.error(f"Kiểu bản sửa không hợp lệ: {', '.join(unknown)}")
+
+    report = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        sm, tokenizer_name = make_service_manager(tmp, FakeGemini())
+        print(f"Tokenizer: {tokenizer_name}; tài liệu gốc {args.words} từ, {args.revisions} bản sửa")
+        print(f"{'kiểu':<12} {'cách lưu':<9} {'chunk lưu':>10} {'tham chiếu':>11} {'vector (KB)':>12} {'BM25 (KB)':>10} {'embedding':>10} {'thời gian':>10}")
+        for kind in kinds:
+            versions = revisions(kind, args.words, args.revisions)
+            report[kind] = {mode: ingest(sm, tmp, f"{kind}-{mode}", versions, shared=(mode == "dedup"))
+                            for mode in ("baseline", "dedup")}
+            for mode, r in report[kind].items():
+                print(f"{kind:<12} {mode:<9} {r['stored_chunks']:>10} {r['referenced_chunks']:>11} {r['vector_bytes'] / 1024:>12.0f}"
+                      f" {r['bm25_bytes'] / 1024:>10.0f} {r['embedding_calls']:>10} {r['ingest_s']:>9.2f}s")
+            base, dedup = report[kind]["baseline"], report[kind]["dedup"]
+            report[kind]["saved"] = {
+                "stored_chunks_pct": 100 * (1 - dedup["stored_chunks"] / base["stored_chunks"]),
+                "ingest_time_pct": 100 * (1 - dedup["ingest_s"] / base["ingest_s"]),
+            }
+            print(f"{'':<12} {'tiết kiệm':<9} {report[kind]['saved']['stored_chunks_pct']:>9.1f}% chunk,"
+                  f" {report[kind]['saved']['ingest_time_pct']:.1f}% thời gian nạp")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# pnote-ai-app/benchmarks/fake_gemini.py
+
+# ==============================================================================
+# MÔ HÌNH GEMINI GIẢ LẬP CHO BENCHMARK
+# Cài đặt đúng phần API của google.generativeai.GenerativeModel mà LLMGateway
+# dùng (generate_content, start_chat().send_message(stream=True)), với độ trễ
+# cấu hình được, để đo pipeline mà không cần mạng hay API key:
+#
+#   service_manager.llm.model_factory = FakeGemini(latency=0.5, first_token_latency=0.3)
+# ==============================================================================
+
+import json
+import threading
+import time
+import zlib
+
+from benchmarks.corpus import make_text
+
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeGemini:
+    """
+    Factory thay cho genai.GenerativeModel. `latency`: thời gian trả lời một lời
+    gọi không stream; `first_token_latency` / `chunk_latency`: độ trễ của phần
+    đầu tiên và giữa các phần khi stream. Đếm số lời gọi trong `calls`.
+    """
+
+    def __init__(self, latency: float = 0.0, first_token_latency: float = 0.0, chunk_latency: float = 0.0,
+                 response_words: int = 150, words_per_chunk: int = 8):
+        self.latency = latency
+        self.first_token_latency = first_token_latency
+        self.chunk_latency = chunk_latency
+        self.response_words = response_words
+        self.words_per_chunk = words_per_chunk
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, model_name: str, system_instruction: str | None = None) -> "FakeGenerativeModel":
+        return FakeGenerativeModel(self, model_name, system_instruction)
+
+    def _count(self):
+        with self._lock:
+            self.calls += 1
+
+    def answer(self, prompt: str) -> str:
+        return make_text(self.response_words, zlib.crc32(prompt.encode("utf-8")))
+
+    @staticmethod
+    def json_answer(prompt: str) -> str:
+        """Danh sách JSON có dạng giống câu trả lời thật của từng tính năng."""
+        seed = zlib.crc32(prompt.encode("utf-8"))
+        if '"options"' in prompt:
+            return json.dumps([{"question": make_text(12, seed + i), "options": [make_text(4, seed + i * 10 + j) for j in range(4)],
+                                "answer": make_text(4, seed + i * 10), "source_chunk": i + 1} for i in range(5)], ensure_ascii=False)
+        if '"source_chunk"' in prompt:
+            return json.dumps([{"question": make_text(10, seed + i), "source_chunk": i + 1} for i in range(3)], ensure_ascii=False)
+        return json.dumps([make_text(6, seed + i) for i in range(10)], ensure_ascii=False)
+
+
+class FakeGenerativeModel:
+    def __init__(self, backend: FakeGemini, model_name: str, system_instruction: str | None = None):
+        self.backend = backend
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+
+    def generate_content(self, prompt: str, generation_config: dict | None = None, **kwargs) -> FakeResponse:
+        self.backend._count()
+        time.sleep(self.backend.latency)
+        if (generation_config or {}).get("response_mime_type") == "application/json":
+            return FakeResponse(self.backend.json_answer(prompt))
+        return FakeResponse(self.backend.answer(prompt))
+
+    def start_chat(self, history: list | None = None) -> "FakeChatSession":
+        return FakeChatSession(self.backend, list(history or []))
+
+
+class FakeChatSession:
+    def __init__(self, backend: FakeGemini, history: list):
+        self.backend = backend
+        self.history = history
+
+    def send_message(self, content: str, stream: bool = False):
+        self.backend._count()
+        if not stream:
+            time.sleep(self.backend.latency)
+            return FakeResponse(self.backend.answer(content))
+        return self._stream(content)
+
+    def _stream(self, content: str):
+        words = self.backend.answer(content).split(" ")
+        time.sleep(self.backend.first_token_latency)
+        for i in range(0, len(words), self.backend.words_per_chunk):
+            if i: time.sleep(self.backend.chunk_latency)
+            yield FakeResponse(" ".join(words[i:i + self.backend.words_per_chunk]) + " ")
@@ -0,0 +1,121 @@
+# pnote-ai-app/benchmarks/html_extraction.py
+
+# ==============================================================================
+# BENCHMARK: TẢI & TRÍCH XUẤT VĂN BẢN TRANG WEB
+# So sánh cách cũ (requests.get cho mỗi trang + BeautifulSoup html.parser) với
+# cách hiện tại (Session dùng chung có keep-alive, đọc theo luồng + lxml) trên
+# các trang HTML tổng hợp phục vụ từ máy cục bộ:
+# 1. parse: chỉ trích xuất văn bản từ HTML đã có sẵn.
+# 2. fetch: tải tuần tự từng trang, và tải song song nhiều trang bằng một thread pool.
+# 3. cap: trang vượt FETCH_MAX_BYTES bị từ chối ngay khi đọc quá giới hạn.
+# Văn bản của hai đường trích xuất được so sánh để bảo đảm kết quả giống nhau.
+#
+#   python -m benchmarks.html_extraction --sizes small,medium,large --pages 32
+# ==============================================================================
+
+import argparse
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.corpus import SIZES, make_html
+from benchmarks.suite import measure, serve_pages
+from core import extractors
+
+
+def baseline_html_to_text(content: bytes) -> str:
+    """html_to_text trước khi có đường lxml."""
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(content, 'html.parser')
+    for tag in soup(list(extractors.BOILERPLATE_TAGS)):
+        tag.decompose()
+    return soup.get_text(separator='\n', strip=True)
+
+
+def baseline_fetch(url: str) -> str:
+    """Cách tải cũ: một kết nối mới cho mỗi yêu cầu, đọc toàn bộ nội dung rồi mới phân tích."""
+    import requests
+    response = requests.get(url, headers={'User-Agent': 'Mozilla/5.0'}, timeout=15)
+    response.raise_for_status()
+    return baseline_html_to_text(response.content)
+
+
+def pooled_fetch(url: str, max_bytes: int) -> str:
+    return extractors.extract_url_text(url, max_bytes)
+
+
+def fetch_all(fetch, urls: list[str], workers: int) -> list[str]:
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(fetch, urls))
+
+
+def rejected_after(url: str, max_bytes: int) -> str:
+    try:
+        extractors.extract_url_text(url, max_bytes)
+    except ValueError as e:
+        return str(e)
+    return "không bị từ chối"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="small,medium,large", help=f"Kích thước trang, chọn trong: {', '.join(SIZES)}.")
+    parser.add_argument("--repeat", type=int, default=5, help="Số lần đo mỗi phép thử.")
+    parser.add_argument("--pages", type=int, default=32, help="Số trang của phép tải song song.")
+    parser.add_argument("--workers", type=int, default=8, help="Số luồng của phép tải song song.")
+    parser.add_argument("--max-bytes", type=int, default=256 * 1024, help="Giới hạn dung lượng của phép thử cap.")
+    parser.add_argument("--json", help="Ghi kết quả ra file JSON.")
+    args = parser.parse_args()
+    sizes = [size.strip() for size in args.sizes.split(",") if size.strip()]
+    if unknown := [size for size in sizes if size not in SIZES]:
+        parser.error(f"Kích thước không hợp lệ: {', '.join(unknown)}")
+
+    pages = {f"/{size}.html": make_html(SIZES[size], seed=i) for i, size in enumerate(sizes)}
+    pages.update({f"/many/{i}.html": make_html(SIZES["small"], seed=100 + i) for i in range(args.pages)})
+    server = serve_pages(pages)
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    no_cap = 1 << 40
+    report = {}
+    print(f"{'phép thử':<22} {'cũ p50 (ms)':>12} {'mới p50 (ms)':>13} {'tăng tốc':>9}  văn bản")
+    try:
+        for size in sizes:
+            content = pages[f"/{size}.html"].encode("utf-8")
+            url = f"{base_url}/{size}.html"
+            rows = {
+                f"parse/{size}": (lambda: baseline_html_to_text(content), lambda: extractors.html_to_text(content)),
+                f"fetch/{size}": (lambda: baseline_fetch(url), lambda: pooled_fetch(url, no_cap)),
+            }
+            for name, (old, new) in rows.items():
+                old_stats, old_text = measure(old, args.repeat)
+                new_stats, new_text = measure(new, args.repeat)
+                report[name] = {"bytes": len(content), "baseline": old_stats, "pooled_lxml": new_stats,
+                                "speedup": old_stats["p50_ms"] / new_stats["p50_ms"], "same_text": old_text == new_text}
+                print(f"{name:<22} {old_stats['p50_ms']:>12.2f} {new_stats['p50_ms']:>13.2f} {report[name]['speedup']:>8.1f}x"
+                      f"  {'giống' if old_text == new_text else 'KHÁC'}")
+
+        urls = [f"{base_url}/many/{i}.html" for i in range(args.pages)]
+        name = f"fetch/{args.pages}x{args.workers}"
+        old_stats, old_texts = measure(lambda: fetch_all(baseline_fetch, urls, args.workers), args.repeat)
+        new_stats, new_texts = measure(lambda: fetch_all(lambda u: pooled_fetch(u, no_cap), urls, args.workers), args.repeat)
+        report[name] = {"pages": args.pages, "workers": args.workers, "baseline": old_stats, "pooled_lxml": new_stats,
+                        "speedup": old_stats["p50_ms"] / new_stats["p50_ms"], "same_text": old_texts == new_texts}
+        print(f"{name:<22} {old_stats['p50_ms']:>12.2f} {new_stats['p50_ms']:>13.2f} {report[name]['speedup']:>8.1f}x"
+              f"  {'giống' if old_texts == new_texts else 'KHÁC'}")
+
+        largest = max(sizes, key=SIZES.get)
+        url = f"{base_url}/{largest}.html"
+        old_stats, _ = measure(lambda: baseline_fetch(url), args.repeat)
+        new_stats, message = measure(lambda: rejected_after(url, args.max_bytes), args.repeat)
+        report[f"cap/{largest}"] = {"bytes": len(pages[f"/{largest}.html"].encode("utf-8")), "max_bytes": args.max_bytes,
+                                    "baseline": old_stats, "pooled_lxml": new_stats, "result": message}
+        print(f"{'cap/' + largest:<22} {old_stats['p50_ms']:>12.2f} {new_stats['p50_ms']:>13.2f}"
+              f" {old_stats['p50_ms'] / new_stats['p50_ms']:>8.1f}x  {message}")
+    finally:
+        server.shutdown()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# pnote-ai-app/benchmarks/pdf_extraction.py
+
+# ==============================================================================
+# BENCHMARK: TRÍCH XUẤT VĂN BẢN PDF
+# So sánh cách cũ (gọi extract_text() hai lần mỗi trang, nối thành một chuỗi)
+# với core.pdf_engine (một lần mỗi trang, tuần tự hoặc song song theo khoảng trang).
+#
+#   python -m benchmarks.pdf_extraction --pages 400
+# ==============================================================================
+
+import argparse
+import io
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from pypdf import PdfReader
+
+from benchmarks.corpus import make_pdf
+from config import INGEST_PROCESS_WORKERS, PDF_PAGES_PER_TASK
+from core.pdf_engine import iter_pdf_pages
+
+
+def legacy_extract(data: bytes) -> str:
+    """Bản sao của nhánh PDF trong extract_text_from_source trước đây."""
+    pdf_reader = PdfReader(io.BytesIO(data))
+    return "".join(page.extract_text() for page in pdf_reader.pages if page.extract_text())
+
+
+def timed(fn, repeat: int) -> tuple[float, object]:
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=400)
+    parser.add_argument("--words-per-page", type=int, default=400)
+    parser.add_argument("--workers", type=int, default=INGEST_PROCESS_WORKERS)
+    parser.add_argument("--pages-per-task", type=int, default=PDF_PAGES_PER_TASK)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    data = make_pdf(args.pages, args.words_per_page)
+    print(f"PDF tổng hợp: {args.pages} trang, {len(data) / 1e6:.1f} MB")
+
+    legacy_time, legacy_text = timed(lambda: legacy_extract(data), args.repeat)
+    seq_time, seq_pages = timed(lambda: list(iter_pdf_pages(data)), args.repeat)
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        par_time, par_pages = timed(lambda: list(iter_pdf_pages(data, pool, args.pages_per_task)), args.repeat)
+
+    assert "".join(t for _, t in seq_pages) == legacy_text
+    assert par_pages == seq_pages
+    print(f"{'Cách cũ (2 lần/trang)':<40}{legacy_time:8.2f}s")
+    print(f"{'pdf_engine tuần tự':<40}{seq_time:8.2f}s  x{legacy_time / seq_time:.2f}")
+    print(f"{f'pdf_engine song song ({args.workers} tiến trình)':<40}{par_time:8.2f}s  x{legacy_time / par_time:.2f}")
+
+
+if __name__ == "__main__":
+    main()
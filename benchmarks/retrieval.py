@@ -0,0 +1,93 @@
+# pnote-ai-app/benchmarks/retrieval.py
+
+# ==============================================================================
+# BENCHMARK: TRUY XUẤT DENSE / BM25 / HYBRID
+# Sinh một tập chunk tổng hợp, gài vào mỗi chunk mục tiêu một thuật ngữ chính
+# xác (mã môn học, tên công thức), rồi đo độ trễ và recall@k của ba chế độ.
+#
+#   python -m benchmarks.retrieval --chunks 5000 --queries 200
+#   python -m benchmarks.retrieval --embedding hash   # không cần tải mô hình
+# ==============================================================================
+
+import argparse
+import random
+import statistics
+import tempfile
+import time
+
+import chromadb
+from chromadb.utils import embedding_functions
+
+from benchmarks.corpus import HashingEmbeddingFunction, make_text
+from core.bm25 import BM25Index, reciprocal_rank_fusion
+
+TERMS = ["ECO{n}", "MAT{n}", "định lý Bayes-{n}", "công thức Black-Scholes-{n}", "hàm Lagrange-{n}"]
+
+
+def build_corpus(num_chunks: int, num_queries: int, seed: int = 0):
+    rng = random.Random(seed)
+    texts = [make_text(220, seed * 1_000_003 + i) for i in range(num_chunks)]
+    queries = []
+    for q, target in enumerate(rng.sample(range(num_chunks), num_queries)):
+        term = rng.choice(TERMS).format(n=1000 + q)
+        words = texts[target].split()
+        words.insert(rng.randrange(len(words)), term)
+        texts[target] = " ".join(words)
+        queries.append((f"{term} là gì và được dùng như thế nào?", f"c{target}"))
+    return texts, queries
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--candidates", type=int, default=20)
+    parser.add_argument("--embedding", choices=["default", "hash"], default="default")
+    args = parser.parse_args()
+
+    embed = HashingEmbeddingFunction() if args.embedding == "hash" else embedding_functions.DefaultEmbeddingFunction()
+    texts, queries = build_corpus(args.chunks, args.queries)
+    ids = [f"c{i}" for i in range(len(texts))]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        collection = chromadb.PersistentClient(path=tmp).create_collection("bench")
+        index = BM25Index(tmp)
+        start = time.perf_counter()
+        for i in range(0, len(texts), 500):
+            collection.add(ids=ids[i:i + 500], documents=texts[i:i + 500], embeddings=embed(texts[i:i + 500]))
+        dense_build = time.perf_counter() - start
+        start = time.perf_counter()
+        for i in range(0, len(texts), 500):
+            index.add(ids[i:i + 500], ["bench"] * len(ids[i:i + 500]), texts[i:i + 500])
+        bm25_build = time.perf_counter() - start
+
+        results = {mode: {"latency": [], "hits": 0} for mode in ("dense", "lexical", "hybrid")}
+        for question, target in queries:
+            start = time.perf_counter()
+            dense_ids = collection.query(query_embeddings=embed([question]), n_results=args.candidates)['ids'][0]
+            dense_time = time.perf_counter() - start
+            start = time.perf_counter()
+            lexical_ids = [cid for cid, _ in index.search(question, args.candidates)]
+            lexical_time = time.perf_counter() - start
+            start = time.perf_counter()
+            fused = [cid for cid, _ in reciprocal_rank_fusion([dense_ids, lexical_ids])]
+            fuse_time = time.perf_counter() - start
+
+            for mode, ranked, latency in (("dense", dense_ids, dense_time), ("lexical", lexical_ids, lexical_time),
+                                          ("hybrid", fused, dense_time + lexical_time + fuse_time)):
+                results[mode]["latency"].append(latency * 1000)
+                results[mode]["hits"] += target in ranked[:args.top_k]
+        index.close()
+
+    print(f"{args.chunks} chunk, {args.queries} câu hỏi, embedding={args.embedding}")
+    print(f"Lập chỉ mục: ChromaDB {dense_build:.2f}s, BM25 {bm25_build:.2f}s")
+    print(f"{'Chế độ':<10}{'p50 (ms)':>10}{'p95 (ms)':>10}{f'recall@{args.top_k}':>12}")
+    for mode, data in results.items():
+        latency = sorted(data["latency"])
+        p95 = latency[int(0.95 * (len(latency) - 1))]
+        print(f"{mode:<10}{statistics.median(latency):>10.2f}{p95:>10.2f}{data['hits'] / len(queries):>12.2%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# pnote-ai-app/benchmarks/snapshot.py
+
+# ==============================================================================
+# BENCHMARK: NHẬP SNAPSHOT SO VỚI NẠP LẠI TÀI LIỆU TỪ NGUỒN
+# Dựng một khóa học từ các file PDF tổng hợp qua add_sources (trích xuất, chia
+# chunk, embedding, ghi ChromaDB/BM25/manifest) với cache embedding trống, xuất
+# snapshot, rồi nhập lại nhiều lần và so sánh:
+# - thời gian và số chunk/giây của hai cách, số lần gọi mô hình embedding,
+# - dung lượng từng file trong snapshot so với văn bản gốc,
+# - độ trùng khớp kết quả truy xuất giữa khóa học gốc và bản nhập (chỉ mục HNSW phụ
+#   thuộc thứ tự và kích thước lô khi ghi, nên vài kết quả gần đúng có thể khác nhau).
+# Embedding dùng HashingEmbeddingFunction (rất nhanh), nên thời gian nạp từ nguồn ở
+# đây là cận dưới: với mô hình embedding thật, phần "embedding" còn lớn hơn nhiều.
+#
+#   python -m benchmarks.snapshot --docs 8 --pages 40 --repeat 3
+# ==============================================================================
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import config
+from benchmarks.corpus import HashingEmbeddingFunction, make_pdf, make_text
+from benchmarks.fake_gemini import FakeGemini
+from benchmarks.suite import NamedBytesIO, make_service_manager, timing
+
+
+class TimedEmbedding:
+    """Bọc hàm embedding để đếm số lần gọi và tổng thời gian tính embedding."""
+
+    def __init__(self, embed_fn):
+        self.embed_fn = embed_fn
+        self.calls = 0
+        self.seconds = 0.0
+
+    def __call__(self, texts):
+        started = time.perf_counter()
+        try:
+            return self.embed_fn(texts)
+        finally:
+            self.calls += 1
+            self.seconds += time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=8, help="Số file PDF của khóa học.")
+    parser.add_argument("--pages", type=int, default=40, help="Số trang mỗi file PDF.")
+    parser.add_argument("--repeat", type=int, default=3, help="Số lần nhập snapshot.")
+    parser.add_argument("--json", help="Ghi kết quả ra file JSON.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sm, tokenizer_name = make_service_manager(tmp, FakeGemini())
+        from core.embedding_cache import EmbeddingCache
+        embed_fn = TimedEmbedding(HashingEmbeddingFunction())
+        sm.embedder = EmbeddingCache(os.path.join(tmp, "embeddings-cold.sqlite3"), embed_fn, "hashing-384",
+                                     config.EMBEDDING_CACHE_MAX_ENTRIES)
+        print(f"Tokenizer: {tokenizer_name}; {args.docs} PDF x {args.pages} trang")
+
+        pdfs = [NamedBytesIO(make_pdf(args.pages, seed=i), f"tai-lieu-{i}.pdf") for i in range(args.docs)]
+        course_id, _ = sm.create_course("bench snapshot source")
+        started = time.perf_counter()
+        results = sm.add_sources(course_id, [("pdf", pdf) for pdf in pdfs])
+        ingest_s = time.perf_counter() - started
+        if failed := [r for r in results if r["status"] != "added"]:
+            raise RuntimeError(f"Nạp tài liệu thất bại: {failed}")
+        chunks = sm.chroma_client.get_collection(name=course_id).count()
+        text_bytes = sum(len(text.encode("utf-8")) for text in sm.chroma_client.get_collection(name=course_id).get(include=["documents"])["documents"])
+        ingest = {"seconds": ingest_s, "chunks_per_s": chunks / ingest_s, "embedding_calls": embed_fn.calls,
+                  "embedding_s": embed_fn.seconds}
+
+        path = os.path.join(tmp, "snapshot")
+        started = time.perf_counter()
+        info = sm.export_course(course_id, path)
+        export = {"seconds": time.perf_counter() - started, "bytes": info["bytes"],
+                  "files": {name: os.path.getsize(os.path.join(path, name)) for name in sorted(os.listdir(path))}}
+
+        samples, import_calls = [], 0
+        questions = [make_text(12, seed=7000 + q) + "?" for q in range(10)]
+        expected = [[r["id"] for r in sm.retrieve(course_id, q)] for q in questions]
+        overlaps = []
+        for r in range(args.repeat):
+            calls, started = embed_fn.calls, time.perf_counter()
+            imported, error = sm.import_course(path, f"bench snapshot copy {r}")
+            samples.append(time.perf_counter() - started)
+            import_calls += embed_fn.calls - calls
+            if error: raise RuntimeError(error)
+            for q, ids in zip(questions, expected):
+                overlaps.append(len(set(ids) & {x["id"] for x in sm.retrieve(imported, q)}) / max(len(ids), 1))
+            sm.delete_course(imported)
+        stats = timing(samples)
+        restore = {**stats, "chunks_per_s": chunks / (stats["p50_ms"] / 1000),
+                   "embedding_calls": import_calls, "retrieval_overlap": sum(overlaps) / len(overlaps)}
+
+    report = {"chunks": chunks, "text_bytes": text_bytes, "ingest": ingest, "export": export, "import": restore,
+              "speedup": ingest_s / (stats["p50_ms"] / 1000)}
+    print(f"{'':<18} {'thời gian (s)':>14} {'chunk/s':>10} {'gọi embedding':>14}")
+    print(f"{'nạp từ nguồn':<18} {ingest_s:>14.2f} {ingest['chunks_per_s']:>10.0f} {ingest['embedding_calls']:>14}"
+          f"  (tính embedding {embed_fn.seconds:.2f}s)")
+    print(f"{'nhập snapshot p50':<18} {stats['p50_ms'] / 1000:>14.2f} {restore['chunks_per_s']:>10.0f} {restore['embedding_calls']:>14}"
+          f"  ({report['speedup']:.1f}x, trùng khớp truy xuất {restore['retrieval_overlap']:.0%})")
+    print(f"xuất snapshot: {export['seconds']:.2f}s, {chunks} chunk, văn bản {text_bytes / 1024:.0f} KB ->"
+          f" {', '.join(f'{name} {size / 1024:.0f} KB' for name, size in export['files'].items())}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
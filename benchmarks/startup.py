@@ -0,0 +1,74 @@
+# pnote-ai-app/benchmarks/startup.py
+
+# ==============================================================================
+# BENCHMARK: THỜI GIAN KHỞI ĐỘNG (COLD START)
+# Chạy `python -X importtime -c "import core.services"` trong tiến trình mới rồi
+# báo cáo tổng thời gian import, các module tốn thời gian nhất và phần thư viện
+# được hoãn đến lần dùng đầu tiên (nay do ServiceManager.warm_up nạp chạy nền).
+# Kết quả đo trước/sau được ghi trong benchmarks/results/startup.md.
+#
+#   python -m benchmarks.startup --top 15
+# ==============================================================================
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Các thư viện trước đây được import ngay khi import core.services.
+DEFERRED_MODULES = [
+    "google.generativeai", "chromadb", "tiktoken", "pypdf", "docx", "bs4", "youtube_transcript_api", "requests",
+]
+
+
+def importtime(statement: str) -> tuple[float, list[tuple[str, int, int, int]]]:
+    """Chạy `statement` trong tiến trình mới với -X importtime; trả về (thời gian thực, [(module, tự thân µs, tích lũy µs, độ sâu)])."""
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                          cwd=ROOT_DIR, capture_output=True, text=True)
+    wall = time.perf_counter() - started
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return wall, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--top", type=int, default=15, help="Số module tốn thời gian nhất cần liệt kê.")
+    parser.add_argument("--json", help="Ghi kết quả ra file JSON.")
+    args = parser.parse_args()
+
+    wall, rows = importtime("import core.services")
+    total = next(cum for name, _, cum, _ in rows if name == "core.services")
+    print(f"import core.services: {total / 1e6:.3f}s (tiến trình: {wall:.3f}s)")
+    top = sorted((r for r in rows if r[3] == 1), key=lambda r: r[2], reverse=True)[:args.top]
+    for name, _, cumulative, _ in top:
+        print(f"  {cumulative / 1e6:8.3f}s  {name}")
+
+    deferred_wall, deferred_rows = importtime(f"import {', '.join(DEFERRED_MODULES)}")
+    deferred = {name: cum for name, _, cum, depth in deferred_rows if depth == 0 and name in DEFERRED_MODULES}
+    print(f"Thư viện được hoãn đến lần dùng đầu: {sum(deferred.values()) / 1e6:.3f}s")
+    for name, cumulative in sorted(deferred.items(), key=lambda kv: kv[1], reverse=True):
+        print(f"  {cumulative / 1e6:8.3f}s  {name}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({
+                "import_core_services_s": total / 1e6, "process_wall_s": wall,
+                "top_modules": [{"module": name, "cumulative_s": cum / 1e6} for name, _, cum, _ in top],
+                "deferred_modules": {name: cum / 1e6 for name, cum in deferred.items()},
+            }, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+# pnote-ai-app/benchmarks/suite.py
+
+# ==============================================================================
+# BỘ BENCHMARK OFFLINE CHO SERVICE MANAGER
+# Chạy toàn bộ pipeline trên dữ liệu tổng hợp, không cần mạng hay API key:
+# 1. extract_text_from_source cho PDF, DOCX và trang web (phục vụ từ máy cục bộ).
+# 2. add_doc (chia chunk + ghi ChromaDB/BM25/manifest) cho văn bản và transcript.
+# 3. list_docs, hash_exists.
+# 4. get_chat_stream: độ trễ truy xuất, thời gian tới token đầu tiên và tổng.
+# 5. Tóm tắt, quiz, từ khóa, câu hỏi tự luận: lần đầu (chưa cache) và lần sau.
+# Gemini được thay bằng benchmarks.fake_gemini, embedding bằng HashingEmbeddingFunction;
+# nếu chưa có file cl100k_base trong cache của tiktoken thì dùng tokenizer theo byte.
+# Kết quả ghi ra JSON để so sánh giữa các lần chạy.
+#
+#   python -m benchmarks.suite --sizes small,medium --out bench.json
+# ==============================================================================
+
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import config
+from benchmarks.corpus import SIZES, HashingEmbeddingFunction, make_docx, make_html, make_pdf, make_text, make_transcript
+from benchmarks.fake_gemini import FakeGemini
+
+# Biểu thức tách từ của cl100k_base (tiktoken_ext.openai_public).
+CL100K_PAT_STR = r"""'(?i:[sdmt]|ll|ve|re)|[^\r\n\p{L}\p{N}]?+\p{L}++|\p{N}{1,3}+| ?[^\s\p{L}\p{N}]++[\r\n]*+|\s++$|\s*[\r\n]|\s+(?!\S)|\s"""
+
+
+class NamedBytesIO(io.BytesIO):
+    """Giống file tải lên của Streamlit: có nội dung và thuộc tính `name`."""
+
+    def __init__(self, data: bytes, name: str):
+        super().__init__(data)
+        self.name = name
+
+
+def load_tokenizer():
+    """cl100k_base nếu đã có trong cache của tiktoken, ngược lại một tokenizer theo byte (cùng biểu thức tách từ)."""
+    import tiktoken
+    try:
+        return tiktoken.get_encoding("cl100k_base"), "cl100k_base"
+    except Exception:
+        ranks = {bytes([i]): i for i in range(256)}
+        return tiktoken.Encoding("offline-bytes", pat_str=CL100K_PAT_STR, mergeable_ranks=ranks, special_tokens={}), "offline-bytes"
+
+
+def timing(samples: list[float]) -> dict:
+    ordered = sorted(samples)
+    return {"n": len(ordered), "min_ms": ordered[0] * 1000, "p50_ms": statistics.median(ordered) * 1000,
+            "p95_ms": ordered[int(0.95 * (len(ordered) - 1))] * 1000, "mean_ms": statistics.fmean(ordered) * 1000}
+
+
+def measure(fn, repeat: int) -> tuple[dict, object]:
+    samples, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - started)
+    return timing(samples), result
+
+
+def serve_pages(pages: dict[str, str]) -> ThreadingHTTPServer:
+    """Phục vụ các trang HTML tổng hợp trên 127.0.0.1 (cổng ngẫu nhiên, có keep-alive) trong một luồng nền."""
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True  # Header và nội dung được ghi riêng; tránh trễ do delayed ACK.
+
+        def do_GET(self):
+            body = pages.get(self.path, "").encode("utf-8")
+            self.send_response(200 if self.path in pages else 404)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.handle_error = lambda request, client_address: None  # Client ngắt kết nối giữa chừng (trang vượt giới hạn).
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def make_service_manager(tmp: str, fake: FakeGemini):
+    """ServiceManager cô lập trong `tmp`, dùng embedding băm, tokenizer offline và Gemini giả."""
+    config.CHROMA_DB_PATH = os.path.join(tmp, "chroma_db")
+    config.USER_DATA_PATH = os.path.join(tmp, "user_data")
+    config.EMBEDDING_CACHE_PATH = os.path.join(config.USER_DATA_PATH, "embedding_cache.sqlite3")
+    config.INGEST_JOBS_PATH = os.path.join(config.USER_DATA_PATH, "jobs.sqlite3")
+    config.INGEST_WORKER_LOCK_PATH = os.path.join(config.USER_DATA_PATH, "ingest-worker.lock")
+    # Tiến trình worker riêng sẽ không dùng embedding băm và Gemini giả của benchmark.
+    config.INGEST_JOB_RUNNER = "thread"
+    config.METRICS_TEXTFILE_PATH = None
+    config.GEMINI_API_KEY = config.GEMINI_API_KEY or "offline-benchmark"
+    if "core.services" in sys.modules:
+        raise RuntimeError("core.services phải được import sau khi cấu hình đường dẫn benchmark.")
+    from core.embedding_cache import EmbeddingCache
+    from core.llm import LLMGateway
+    from core.services import service_manager as sm
+
+    sm.tokenizer, tokenizer_name = load_tokenizer()
+    sm.embedder = EmbeddingCache(config.EMBEDDING_CACHE_PATH, HashingEmbeddingFunction(), "hashing-384",
+                                 config.EMBEDDING_CACHE_MAX_ENTRIES)
+    # Không giới hạn tốc độ và không thử lại: chỉ đo chi phí của pipeline và độ trễ giả lập.
+    sm.llm = LLMGateway(fake, sm.tokenizer, 10**9, 10**12, config.LLM_MAX_CONCURRENCY, 0, 0.0, 0.0)
+    return sm, tokenizer_name
+
+
+def bench_extraction(sm, sizes: list[str], repeat: int) -> dict:
+    results = {}
+    pages = {f"/{size}.html": make_html(SIZES[size], seed=i) for i, size in enumerate(sizes)}
+    server = serve_pages(pages)
+    try:
+        for i, size in enumerate(sizes):
+            words = SIZES[size]
+            pdf, docx_bytes = make_pdf(max(words // 400, 1), seed=i), make_docx(words, seed=i)
+            cases = {
+                "pdf": lambda: sm.extract_text_from_source("pdf", NamedBytesIO(pdf, f"{size}.pdf")),
+                "docx": lambda: sm.extract_text_from_source("docx", NamedBytesIO(docx_bytes, f"{size}.docx")),
+                "url": lambda: sm.extract_text_from_source("url", f"http://127.0.0.1:{server.server_port}/{size}.html"),
+            }
+            for source_type, fn in cases.items():
+                stats, (text, _) = measure(fn, repeat)
+                results[f"{source_type}/{size}"] = {**stats, "words": words, "chars": len(text or "")}
+    finally:
+        server.shutdown()
+    return results
+
+
+def bench_ingestion(sm, sizes: list[str], repeat: int) -> dict:
+    results = {}
+    for size in sizes:
+        for kind, make in (("text", make_text), ("transcript", make_transcript)):
+            samples, chunks = [], 0
+            for r in range(repeat):
+                course_id, _ = sm.create_course(f"bench ingest {kind} {size} {r}")
+                text = make(SIZES[size], seed=r)
+                started = time.perf_counter()
+                chunks = sm.add_doc(course_id, text, f"{kind}-{size}.txt", f"{kind}-{size}-{r}")
+                samples.append(time.perf_counter() - started)
+                sm.delete_course(course_id)
+            stats = timing(samples)
+            results[f"{kind}/{size}"] = {**stats, "words": SIZES[size], "chunks": chunks,
+                                         "chunks_per_s": chunks / (stats["p50_ms"] / 1000)}
+    return results
+
+
+def build_course(sm, name: str, num_docs: int, words: int) -> str:
+    course_id, _ = sm.create_course(name)
+    for i in range(num_docs):
+        sm.add_doc(course_id, make_text(words, seed=1000 + i), f"tai-lieu-{i}.txt", f"doc-{i}")
+    return course_id
+
+
+def bench_metadata(sm, course_id: str, num_docs: int, iterations: int) -> dict:
+    return {
+        "list_docs": {**measure(lambda: sm.list_docs(course_id), iterations)[0], "docs": num_docs},
+        "hash_exists/hit": measure(lambda: sm.hash_exists(course_id, "doc-0"), iterations)[0],
+        "hash_exists/miss": measure(lambda: sm.hash_exists(course_id, "khong-ton-tai"), iterations)[0],
+    }
+
+
+def bench_chat(sm, course_id: str, num_queries: int) -> dict:
+    questions = [make_text(12, seed=5000 + q) + "?" for q in range(num_queries)]
+    retrieval, first_token, total = [], [], []
+    for question in questions:
+        started = time.perf_counter()
+        sm.retrieve(course_id, question)
+        retrieval.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        # Mỗi câu hỏi là câu mở đầu của một cuộc trò chuyện riêng.
+        stream = sm.get_chat_stream(course_id, question, sm.new_conversation(course_id))
+        next(stream)
+        first_token.append(time.perf_counter() - started)
+        for _ in stream: pass
+        total.append(time.perf_counter() - started)
+    return {"retrieve": timing(retrieval), "time_to_first_token": timing(first_token), "total": timing(total)}
+
+
+def bench_features(sm, course_id: str, fake: FakeGemini) -> dict:
+    features = {
+        "summarize": lambda: sm.summarize(course_id),
+        "generate_quiz": lambda: sm.generate_quiz(course_id, 5),
+        "extract_keywords": lambda: sm.extract_keywords(course_id),
+        "generate_study_questions": lambda: sm.generate_study_questions(course_id, 3),
+    }
+    question_kinds = {"generate_quiz": "quiz", "generate_study_questions": "study_questions"}
+    results = {}
+    for name, fn in features.items():
+        calls = fake.calls
+        uncached, _ = measure(fn, 1)
+        model_calls = fake.calls - calls
+        results[name] = {"uncached_ms": uncached["p50_ms"], "model_calls": model_calls}
+        # Ngân hàng câu hỏi được sinh nốt trong nền: chờ xong để không chồng lên các phép đo sau.
+        if name in question_kinds and (fill := sm.fill_question_bank(course_id, question_kinds[name])) is not None:
+            fill.join()
+            results[name]["background_model_calls"] = fake.calls - calls - model_calls
+        cached, _ = measure(fn, 5)
+        results[name]["cached_p50_ms"] = cached["p50_ms"]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="small,medium", help=f"Danh sách kích thước, chọn trong: {', '.join(SIZES)}.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--docs", type=int, default=20, help="Số tài liệu của khóa học dùng cho benchmark đọc/chat/tính năng.")
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.2, help="Độ trễ (giây) của một lời gọi Gemini giả.")
+    parser.add_argument("--first-token-latency", type=float, default=0.3)
+    parser.add_argument("--chunk-latency", type=float, default=0.02)
+    parser.add_argument("--out", default="benchmark_results.json")
+    args = parser.parse_args()
+    sizes = [size.strip() for size in args.sizes.split(",") if size.strip()]
+    if unknown := [size for size in sizes if size not in SIZES]:
+        parser.error(f"Kích thước không hợp lệ: {', '.join(unknown)}")
+
+    fake = FakeGemini(args.latency, args.first_token_latency, args.chunk_latency)
+    with tempfile.TemporaryDirectory() as tmp:
+        sm, tokenizer_name = make_service_manager(tmp, fake)
+        report = {
+            "meta": {"timestamp": time.time(), "python": platform.python_version(), "platform": platform.platform(),
+                     "tokenizer": tokenizer_name, "sizes": {size: SIZES[size] for size in sizes}, "args": vars(args)},
+        }
+        print("Trích xuất văn bản...")
+        report["extract_text_from_source"] = bench_extraction(sm, sizes, args.repeat)
+        print("Nạp tài liệu (add_doc)...")
+        report["add_doc"] = bench_ingestion(sm, sizes, args.repeat)
+        course_id = build_course(sm, "bench workspace", args.docs, SIZES[sizes[0]])
+        print("list_docs / hash_exists...")
+        report["metadata"] = bench_metadata(sm, course_id, args.docs, 200)
+        print("Chat (truy xuất + stream)...")
+        report["chat"] = bench_chat(sm, course_id, args.queries)
+        print("Các tính năng AI (chưa cache / đã cache)...")
+        report["features"] = bench_features(sm, course_id, fake)
+        report["meta"]["model_calls"] = fake.calls
+        # Độ trễ theo giai đoạn do core.metrics ghi nhận trong suốt lần chạy.
+        report["stages"] = sm.get_metrics_summary()
+        sm.delete_course(course_id)
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    for section in ("extract_text_from_source", "add_doc", "metadata", "chat"):
+        for name, stats in report[section].items():
+            print(f"  {section:<26}{name:<26}p50 {stats['p50_ms']:>9.2f} ms")
+    for name, stats in report["features"].items():
+        print(f"  {'features':<26}{name:<26}lần đầu {stats['uncached_ms']:>9.1f} ms, đã cache {stats['cached_p50_ms']:.3f} ms")
+    print(f"Đã ghi kết quả vào {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+# pnote-ai-app/benchmarks/vector_index.py
+
+# ==============================================================================
+# BENCHMARK: RECALL & ĐỘ TRỄ CỦA CHỈ MỤC VECTOR (HNSW) SO VỚI TÌM KIẾM VÉT CẠN
+# Với mỗi kích thước corpus (số chunk), dựng collection ChromaDB theo từng cấu
+# hình HNSW (max_neighbors, ef_construction) rồi đo, cho từng giá trị ef_search
+# (ef_search mới chỉ có hiệu lực khi chỉ mục được nạp lại, nên client được mở lại):
+# - recall@k so với kết quả chính xác tính bằng NumPy (tích vô hướng trên ma trận),
+# - độ trễ truy vấn p50/p95 của ChromaDB và của NumPy,
+# - thời gian dựng chỉ mục.
+# Cuối cùng đo truy vấn đầu tiên sau khi mở lại cơ sở dữ liệu (tiến trình mới) có
+# và không có bước warm-up. Vector là các cụm ngẫu nhiên đã chuẩn hóa (giống embedding
+# câu), truy vấn là các điểm lân cận của dữ liệu.
+#
+#   python -m benchmarks.vector_index --sizes 2000,20000 --dim 384
+# ==============================================================================
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.suite import timing
+
+PROFILES = ((16, 100), (24, 200), (32, 400))
+EF_SEARCH = (32, 64, 128, 256, 512)
+
+COLD_START_SCRIPT = """
+import sys, time
+import numpy as np
+import chromadb
+path, name, warm = sys.argv[1], sys.argv[2], sys.argv[3] == "1"
+started = time.perf_counter()
+client = chromadb.PersistentClient(path=path)
+collection = client.get_collection(name)
+query = np.load(sys.argv[4])
+opened = time.perf_counter()
+if warm:
+    sample = collection.get(limit=1, include=["embeddings"])["embeddings"]
+    collection.query(query_embeddings=[sample[0]], n_results=1, include=[])
+warmed = time.perf_counter()
+collection.query(query_embeddings=[query.tolist()], n_results=10, include=[])
+first = time.perf_counter()
+collection.query(query_embeddings=[query.tolist()], n_results=10, include=[])
+second = time.perf_counter()
+print(opened - started, warmed - opened, first - warmed, second - first)
+"""
+
+
+def make_vectors(count: int, dim: int, seed: int = 0) -> np.ndarray:
+    """Các cụm điểm quanh những tâm ngẫu nhiên (khoảng 50 điểm mỗi cụm), đã chuẩn hóa."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, count // 50), dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), count)] + 0.6 * rng.standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_queries(vectors: np.ndarray, count: int, seed: int = 1) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.integers(0, len(vectors), count)] + 0.3 * rng.standard_normal((count, vectors.shape[1])).astype(np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def brute_force(vectors: np.ndarray, queries: np.ndarray, k: int) -> tuple[list[set[int]], dict]:
+    """Top-k chính xác theo cosine (tích vô hướng của vector đã chuẩn hóa) và độ trễ từng truy vấn."""
+    truth, samples = [], []
+    for query in queries:
+        started = time.perf_counter()
+        scores = vectors @ query
+        top = np.argpartition(-scores, k)[:k]
+        samples.append(time.perf_counter() - started)
+        truth.append(set(top.tolist()))
+    return truth, timing(samples)
+
+
+def build(client, name: str, vectors: np.ndarray, max_neighbors: int, ef_construction: int):
+    collection = client.create_collection(name, embedding_function=None, configuration={"hnsw": {
+        "space": "cosine", "max_neighbors": max_neighbors, "ef_construction": ef_construction}})
+    batch = min(client.get_max_batch_size(), 5000)
+    for start in range(0, len(vectors), batch):
+        part = vectors[start:start + batch]
+        collection.add(ids=[str(i) for i in range(start, start + len(part))], embeddings=part)
+    return collection
+
+
+def reopen(client, path: str):
+    import chromadb
+    client.clear_system_cache()
+    return chromadb.PersistentClient(path=path)
+
+
+def evaluate(collection, queries: np.ndarray, truth: list[set[int]], k: int) -> dict:
+    collection.query(query_embeddings=queries[:1], n_results=k, include=[])  # Nạp chỉ mục trước khi đo.
+    hits, samples = 0, []
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        result = collection.query(query_embeddings=[query], n_results=k, include=[])
+        samples.append(time.perf_counter() - started)
+        hits += len(expected & {int(i) for i in result["ids"][0]})
+    return {"recall": hits / (k * len(queries)), **timing(samples)}
+
+
+def cold_start(path: str, name: str, query: np.ndarray, tmp: str) -> dict:
+    """Truy vấn đầu tiên trong một tiến trình mới, không và có warm-up (thời gian tính bằng ms)."""
+    query_path = f"{tmp}/query.npy"
+    np.save(query_path, query)
+    report = {}
+    for label, warm in (("cold", "0"), ("warmed", "1")):
+        output = subprocess.run([sys.executable, "-c", COLD_START_SCRIPT, path, name, warm, query_path],
+                                capture_output=True, text=True, check=True).stdout.split()
+        opened, warm_up, first, second = (float(value) * 1000 for value in output[-4:])
+        report[label] = {"open_ms": opened, "warm_up_ms": warm_up, "first_query_ms": first, "second_query_ms": second}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="2000,20000", help="Các kích thước corpus (số chunk), cách nhau bởi dấu phẩy.")
+    parser.add_argument("--dim", type=int, default=384, help="Số chiều embedding.")
+    parser.add_argument("--queries", type=int, default=200, help="Số truy vấn mỗi phép đo.")
+    parser.add_argument("--k", type=int, default=10, help="Số kết quả mỗi truy vấn (recall@k).")
+    parser.add_argument("--json", help="Ghi kết quả ra file JSON.")
+    args = parser.parse_args()
+    import chromadb
+
+    report = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        client = chromadb.PersistentClient(path=f"{tmp}/chroma")
+        print(f"{'chunk':>7} {'M':>3} {'ef_c':>5} {'dựng (s)':>9} {'ef_s':>5} {'recall':>7} {'p50 (ms)':>9} {'p95 (ms)':>9} {'NumPy p50':>10}")
+        for size in (int(s) for s in args.sizes.split(",") if s.strip()):
+            vectors = make_vectors(size, args.dim)
+            queries = make_queries(vectors, args.queries)
+            truth, numpy_stats = brute_force(vectors, queries, args.k)
+            report[size] = {"numpy": numpy_stats, "profiles": {}}
+            for max_neighbors, ef_construction in PROFILES:
+                name = f"bench-{size}-{max_neighbors}-{ef_construction}"
+                started = time.perf_counter()
+                collection = build(client, name, vectors, max_neighbors, ef_construction)
+                build_s = time.perf_counter() - started
+                rows = {}
+                for ef_search in EF_SEARCH:
+                    collection.modify(configuration={"hnsw": {"ef_search": ef_search}})
+                    client = reopen(client, f"{tmp}/chroma")
+                    collection = client.get_collection(name)
+                    rows[ef_search] = r = evaluate(collection, queries, truth, args.k)
+                    print(f"{size:>7} {max_neighbors:>3} {ef_construction:>5} {build_s:>9.2f} {ef_search:>5} {r['recall']:>7.3f}"
+                          f" {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {numpy_stats['p50_ms']:>10.2f}")
+                report[size]["profiles"][f"{max_neighbors}/{ef_construction}"] = {"build_s": build_s, "ef_search": rows}
+            report[size]["cold_start"] = cold_start(f"{tmp}/chroma", name, queries[0], tmp)
+            for label, r in report[size]["cold_start"].items():
+                print(f"{size:>7} {label:<7} mở {r['open_ms']:.0f} ms, warm-up {r['warm_up_ms']:.0f} ms,"
+                      f" truy vấn đầu {r['first_query_ms']:.1f} ms, truy vấn sau {r['second_query_ms']:.1f} ms")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,11 +6,139 @@ GEMINI_API_KEY = st.secrets.get("GEMINI_API_KEY", os.environ.get("GEMINI_API_KEY
 ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
 CHROMA_DB_PATH = os.path.join(ROOT_DIR, "chroma_db")
 USER_DATA_PATH = os.path.join(ROOT_DIR, "user_data")
+# Cache embedding dùng chung cho mọi không gian làm việc (khóa theo nội dung chunk + mô hình).
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+EMBEDDING_CACHE_PATH = os.path.join(USER_DATA_PATH, "embedding_cache.sqlite3")
+EMBEDDING_CACHE_MAX_ENTRIES = 200_000
 
 TEXT_CHUNK_SIZE = 1500
 TEXT_CHUNK_OVERLAP = 200
+# Số chunk ghi vào ChromaDB trong mỗi lần collection.add (giữ bộ nhớ đỉnh ổn định).
+CHUNK_INSERT_BATCH_SIZE = 64
+# Khoảng thời gian (giây) trước khi thử lại việc dựng manifest của một khóa học bị lỗi lần trước.
+MANIFEST_REBUILD_RETRY_SECONDS = 60
+# Số tiến trình trích xuất file (PDF, DOCX) và số luồng tải URL/YouTube khi nạp nhiều nguồn.
+INGEST_PROCESS_WORKERS = max(1, min(4, (os.cpu_count() or 1)))
+INGEST_THREAD_WORKERS = 8
+# Số trang PDF mỗi tác vụ song song; PDF ngắn hơn được đọc tuần tự trong tiến trình hiện tại.
+PDF_PAGES_PER_TASK = 50
+# Số khoảng trang tối đa của một PDF đang chờ/đã xong trong process pool mà chưa được
+# đọc hết; giới hạn lượng văn bản trích xuất nằm trong bộ nhớ khi PDF chưa kịp được ghi.
+PDF_RANGES_IN_FLIGHT = INGEST_PROCESS_WORKERS
+# Hàng đợi nạp tài liệu chạy nền: số luồng worker, số lần chạy lại tối đa của một job
+# bị gián đoạn, chu kỳ (giây) worker kiểm tra hàng đợi khi rảnh và số job tối đa của
+# cùng một khóa học được nạp chung trong một lần add_sources.
+INGEST_JOBS_PATH = os.path.join(USER_DATA_PATH, "jobs.sqlite3")
+INGEST_JOB_WORKERS = 2
+INGEST_JOB_MAX_ATTEMPTS = 3
+INGEST_JOB_POLL_SECONDS = 2.0
+INGEST_JOB_BATCH_SIZE = 8
+# Worker chạy ở tiến trình riêng ("process": python -m core.jobs worker) hoặc trong
+# tiến trình ứng dụng ("thread"). Tiến trình worker thoát sau INGEST_WORKER_IDLE_SECONDS
+# giây không có job và ghi metrics ra file riêng (tiền tố pnote_worker, None = tắt).
+INGEST_JOB_RUNNER = "process"
+INGEST_WORKER_LOCK_PATH = os.path.join(USER_DATA_PATH, "ingest-worker.lock")
+INGEST_WORKER_IDLE_SECONDS = 300
+INGEST_WORKER_METRICS_TEXTFILE_PATH = os.path.join(USER_DATA_PATH, "metrics-worker.prom")
+# Làm mới nguồn web (URL, YouTube): số nguồn tải song song và chu kỳ tự động làm
+# mới mọi khóa học (giây; None: chỉ làm mới khi người dùng yêu cầu).
+WEB_REFRESH_MAX_WORKERS = 4
+WEB_REFRESH_INTERVAL_SECONDS = None
+# Tải trang web: dung lượng tối đa của một trang (byte, đọc theo luồng và dừng khi vượt)
+# và thời gian chờ mỗi yêu cầu (giây).
+FETCH_MAX_BYTES = 10 * 1024 * 1024
+FETCH_TIMEOUT_SECONDS = 15
 DEFAULT_MODEL = "gemini-1.5-flash"
 VECTOR_DB_SEARCH_RESULTS = 5
+# Tìm kiếm trên nhiều không gian làm việc: số kết quả sau khi gộp và số collection truy vấn song song.
+GLOBAL_SEARCH_RESULTS = 10
+GLOBAL_SEARCH_MAX_WORKERS = 8
+# Chỉ mục vector HNSW theo kích thước corpus: (số chunk tối đa, cấu hình); None: không giới hạn.
+# Collection mới dùng bậc đầu tiên. Khi corpus lớn lên, ef_search được chỉnh tại chỗ (có hiệu
+# lực khi chỉ mục được nạp lại); đổi space/max_neighbors/ef_construction cần dựng lại collection
+# (python -m core.vector_index rebuild). Chọn theo benchmarks/vector_index.py (recall@10 ≈ 0.97-0.99).
+VECTOR_INDEX_PROFILES = [
+    (5_000, {"space": "cosine", "max_neighbors": 16, "ef_construction": 100, "ef_search": 128}),
+    (50_000, {"space": "cosine", "max_neighbors": 16, "ef_construction": 100, "ef_search": 256}),
+    (None, {"space": "cosine", "max_neighbors": 24, "ef_construction": 200, "ef_search": 512}),
+]
+# Tỉ lệ chunk đã xóa (so với tổng số từng có trong chỉ mục) từ đó nên dựng lại collection,
+# và số chunk chép mỗi lô khi dựng lại.
+VECTOR_INDEX_REBUILD_DELETED_RATIO = 0.3
+VECTOR_INDEX_COPY_BATCH_SIZE = 1_000
+# Snapshot không gian làm việc (core/snapshot.py): số chunk đọc/ghi mỗi lô khi xuất và
+# khi nhập (giới hạn thêm bởi kích thước lô tối đa của ChromaDB).
+SNAPSHOT_BATCH_SIZE = 5_000
+# Chế độ truy xuất ngữ cảnh cho chat: "dense" (chỉ ChromaDB), "lexical" (chỉ BM25,
+# không cần embedding câu hỏi) hoặc "hybrid" (hợp nhất cả hai bằng Reciprocal Rank Fusion).
+RETRIEVAL_MODE = "hybrid"
+HYBRID_CANDIDATES = 20
+RRF_K = 60
+# BM25: term xuất hiện trong hơn tỉ lệ này số chunk bị bỏ khỏi câu truy vấn (cùng với hư từ).
+BM25_MAX_DF_RATIO = 0.5
+
+# Tóm tắt map-reduce: số lời gọi mô hình song song tối đa, ngân sách token cho mỗi
+# nhóm chunk (bước map) và cho phần gộp cuối cùng (bước reduce).
+SUMMARY_MAX_PARALLEL_CALLS = 4
+SUMMARY_GROUP_TOKENS = 12_000
+SUMMARY_REDUCE_MAX_TOKENS = 24_000
+
+# Ngân sách token cho ngữ cảnh của từng tính năng. Các chunk kề nhau được gộp và
+# phần chồng lấp chỉ tính một lần. "summary" là ngân sách mỗi nhóm chunk khi tóm tắt;
+# "quiz" và "study_questions" là ngân sách mỗi nhóm chunk khi sinh ngân hàng câu hỏi.
+CONTEXT_TOKEN_BUDGETS = {
+    "chat": 6_000,
+    "summary": SUMMARY_GROUP_TOKENS,
+    "quiz": 8_000,
+    "keywords": 28_000,
+    "study_questions": 8_000,
+}
+# Ngân hàng câu hỏi: số câu hỏi mô hình sinh cho mỗi nhóm chunk.
+QUESTION_BANK_QUESTIONS_PER_GROUP = {"quiz": 5, "study_questions": 3}
+# Số lượt sinh tối đa cho mỗi tài liệu khi ngân hàng chưa đủ số câu được yêu cầu (lượt đầu + các lượt sinh thêm).
+QUESTION_BANK_MAX_ROUNDS = 3
+# Số nhóm chunk mỗi lô khi sinh nốt ngân hàng câu hỏi trong nền (mỗi lô được lưu ngay khi xong).
+QUESTION_BANK_FILL_GROUPS = 16
+# Số chunk ứng viên cho chat trước khi đóng gói, và hệ số MMR (None = không dùng MMR).
+CHAT_CONTEXT_CANDIDATES = 10
+CONTEXT_MMR_LAMBDA = {"chat": 0.7, "keywords": 0.5}
+# Tính năng không có câu hỏi (từ khóa): số chunk ứng viên rải đều trên corpus, tính
+# theo bội số của số chunk vừa ngân sách, được xếp theo độ tiêu biểu + MMR trước khi đóng gói.
+CONTEXT_CANDIDATE_FACTOR = 4
+
+# Cache kết quả AI: giới hạn tầng bộ nhớ (toàn tiến trình) và tầng đĩa (mỗi khóa học).
+RESULT_CACHE_MEMORY_MAX_BYTES = 32 * 1024 * 1024
+RESULT_CACHE_DISK_MAX_BYTES = 16 * 1024 * 1024
+
+# Cache câu trả lời chat theo ngữ nghĩa (bật riêng cho từng không gian làm việc).
+ANSWER_CACHE_SIMILARITY_THRESHOLD = 0.92
+ANSWER_CACHE_MAX_ENTRIES = 2_000
+
+# Bộ nhớ hội thoại: ngân sách token của các tin nhắn gần nhất gửi nguyên văn cho mô hình,
+# tỉ lệ ngân sách còn giữ lại sau mỗi lần gộp các lượt cũ vào bản tóm tắt, số tin
+# nhắn mỗi trang khi hiển thị lịch sử và số cuộc trò chuyện gần đây để chọn mở lại.
+CHAT_HISTORY_TOKEN_BUDGET = 4_000
+CHAT_HISTORY_KEEP_RATIO = 0.5
+CHAT_HISTORY_PAGE_SIZE = 20
+CHAT_RECENT_CONVERSATIONS = 10
+
+# Cổng gọi Gemini dùng chung cho cả tiến trình: hạn mức request/phút và token/phút
+# (theo hạn mức của API key), số lời gọi đồng thời tối đa và chính sách thử lại
+# (backoff lũy thừa, tính bằng giây) khi gặp lỗi 429/503.
+LLM_REQUESTS_PER_MINUTE = 15
+LLM_TOKENS_PER_MINUTE = 1_000_000
+LLM_MAX_CONCURRENCY = 4
+LLM_MAX_RETRIES = 4
+LLM_BACKOFF_BASE_SECONDS = 2.0
+LLM_BACKOFF_MAX_SECONDS = 30.0
+
+# Đo độ trễ theo giai đoạn (trích xuất, chunk, embedding, truy vấn, mô hình...).
+# Khi tắt, các span gần như không tốn chi phí. Metrics được xuất theo định dạng
+# Prometheus ra file (ghi định kỳ, None = tắt) và/hoặc qua http://127.0.0.1:<cổng>/metrics.
+METRICS_ENABLED = True
+METRICS_TEXTFILE_PATH = os.path.join(USER_DATA_PATH, "metrics.prom")
+METRICS_EXPORT_INTERVAL_SECONDS = 15
+METRICS_HTTP_PORT = None
 
 DEFAULT_SYSTEM_PROMPT = """Bạn là một trợ lý AI chuyên gia, được lập trình để phân tích và trả lời các câu hỏi dựa trên một tập hợp tài liệu được cung cấp.
 Nhiệm vụ của bạn là cung cấp câu trả lời chính xác, súc tích và chỉ dựa vào "NGỮ CẢNH" cho trước.
@@ -31,14 +159,40 @@ NGỮ CẢNH:
 
 BẢN PHÂN TÍCH CỦA BẠN:"""
 
+KEYWORDS_PROMPT_TEMPLATE = """Trích xuất 10-15 từ khóa/cụm từ khóa quan trọng từ ngữ cảnh. Trả về dưới dạng danh sách JSON. NGỮ CẢNH:\n{context}\n\nDANH SÁCH JSON:"""
+
+STUDY_QUESTIONS_PROMPT_TEMPLATE = """Tạo {num_questions} câu hỏi mở, sâu sắc từ ngữ cảnh để hỗ trợ học tập. Ngữ cảnh gồm các đoạn được đánh số [1], [2]... Trả về dưới dạng danh sách JSON các đối tượng có key "question" (string) và "source_chunk" (số thứ tự của đoạn mà câu hỏi dựa vào). NGỮ CẢNH:\n{context}\n\nDANH SÁCH JSON:"""
+QUESTION_BANK_EXTRA_ROUND_PREFIX = """Các câu hỏi sau đã có cho ngữ cảnh này; hãy tạo câu hỏi MỚI về những ý khác, không trùng hoặc diễn đạt lại các câu này:\n{questions}\n\n"""
+
+PARTIAL_SUMMARY_PROMPT_TEMPLATE = """Tóm tắt đoạn tài liệu dưới đây trong khoảng 150-250 từ. Giữ lại các khái niệm, định nghĩa, công thức, số liệu và luận điểm quan trọng; không thêm thông tin ngoài đoạn tài liệu.
+
+ĐOẠN TÀI LIỆU:
+---
+{context}
+---
+
+BẢN TÓM TẮT:"""
+
+CHAT_HISTORY_SUMMARY_PROMPT_TEMPLATE = """Dưới đây là bản tóm tắt cuộc trò chuyện giữa người dùng và trợ lý học tập cho tới nay, cùng các lượt trao đổi tiếp theo. Hãy viết một bản tóm tắt duy nhất (tối đa 200 từ) gộp cả hai, giữ lại các câu hỏi chính, kết luận, thuật ngữ đã được giải thích và những gì người dùng nói về nhu cầu của họ.
+
+BẢN TÓM TẮT HIỆN CÓ:
+{summary}
+
+CÁC LƯỢT TIẾP THEO:
+---
+{turns}
+---
+
+BẢN TÓM TẮT MỚI:"""
+
 QUIZ_PROMPT_TEMPLATE = """Với vai trò là một nhà giáo dục kinh nghiệm, hãy dựa vào "NGỮ CẢNH" được cung cấp để tạo ra chính xác {num_questions} câu hỏi trắc nghiệm (MCQ) chất lượng cao.
 **YÊU CẦU BẮT BUỘC:**
 1.  Câu hỏi phải kiểm tra sự hiểu biết, không chỉ là ghi nhớ thông tin.
 2.  Mỗi câu hỏi có 4 lựa chọn (A, B, C, D), trong đó chỉ có MỘT đáp án đúng. Các lựa chọn gây nhiễu phải hợp lý.
 3.  **TRẢ VỀ KẾT QUẢ DƯỚI DẠNG MỘT DANH SÁCH JSON HỢP LỆ VÀ CHỈ DUY NHẤT DANH SÁCH ĐÓ.**
-4.  Mỗi đối tượng JSON trong danh sách phải có các key: "question" (string), "options" (list of 4 strings), và "answer" (string, là nội dung của đáp án đúng).
+4.  Mỗi đối tượng JSON trong danh sách phải có các key: "question" (string), "options" (list of 4 strings), "answer" (string, là nội dung của đáp án đúng) và "source_chunk" (số thứ tự của đoạn ngữ cảnh mà câu hỏi dựa vào).
 
-NGỮ CẢNH:
+NGỮ CẢNH (gồm các đoạn được đánh số [1], [2]...):
 ---
 {context}
 ---
@@ -0,0 +1,123 @@
+# pnote-ai-app/core/answer_cache.py
+
+# ==============================================================================
+# CACHE CÂU TRẢ LỜI THEO NGỮ NGHĨA CHO CHAT RAG
+#
+# Khi nhiều sinh viên trong cùng một không gian làm việc hỏi cùng một ý bằng
+# các cách diễn đạt khác nhau, câu trả lời trước đó được dùng lại nếu độ tương
+# đồng cosine giữa embedding của hai câu hỏi vượt ngưỡng. Mỗi mục gắn với dấu
+# vân tay của tập tài liệu và tên mô hình embedding, nên sẽ tự hết hiệu lực khi
+# tài liệu thay đổi hoặc khi đổi mô hình (embedding khác số chiều/không so sánh được).
+# Dữ liệu nằm trong user_data/<course>/answer_cache.sqlite3.
+# ==============================================================================
+
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import TYPE_CHECKING, Iterator
+
+if TYPE_CHECKING:
+    import numpy as np
+
+ANSWER_CACHE_FILENAME = "answer_cache.sqlite3"
+
+
+def replay_stream(answer: str, words_per_chunk: int = 8, delay: float = 0.0) -> Iterator[str]:
+    """Phát lại một câu trả lời đã lưu dưới dạng luồng để st.write_stream hiển thị như bình thường."""
+    words = re.findall(r'\S+\s*', answer)
+    for i in range(0, len(words), words_per_chunk):
+        yield "".join(words[i:i + words_per_chunk])
+        if delay: time.sleep(delay)
+
+
+class SemanticAnswerCache:
+    def __init__(self, course_dir: str, threshold: float, max_entries: int, model_name: str = ""):
+        os.makedirs(course_dir, exist_ok=True)
+        self.path = os.path.join(course_dir, ANSWER_CACHE_FILENAME)
+        self.threshold = threshold
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self._lock = threading.Lock()
+        # Ma trận embedding đã chuẩn hóa của từng phiên bản tài liệu, nạp lười từ SQLite.
+        self._matrices: dict[str, tuple[list[int], "np.ndarray"]] = {}
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, fingerprint TEXT NOT NULL, question TEXT NOT NULL,"
+            " embedding BLOB NOT NULL, answer TEXT NOT NULL, latency REAL NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_answers_fingerprint ON answers(fingerprint)")
+        self._conn.commit()
+
+    @staticmethod
+    def _normalize(embedding) -> "np.ndarray":
+        import numpy as np  # Import khi dùng lần đầu (numpy làm chậm lúc khởi động).
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _scope(self, fingerprint: str) -> str:
+        return f"{self.model_name}\x00{fingerprint}" if self.model_name else fingerprint
+
+    def _matrix(self, fingerprint: str) -> tuple[list[int], "np.ndarray"]:
+        import numpy as np
+        if fingerprint not in self._matrices:
+            rows = self._conn.execute("SELECT id, embedding FROM answers WHERE fingerprint = ? ORDER BY id", (fingerprint,)).fetchall()
+            # Chỉ so sánh với các mục cùng số chiều với mục mới nhất (mô hình đổi mà không đổi tên).
+            rows = [row for row in rows if len(row[1]) == len(rows[-1][1])]
+            ids = [row[0] for row in rows]
+            matrix = np.stack([np.frombuffer(row[1], dtype=np.float32) for row in rows]) if rows else np.empty((0, 0), np.float32)
+            self._matrices = {fingerprint: (ids, matrix)}  # Chỉ giữ phiên bản tài liệu đang dùng.
+        return self._matrices[fingerprint]
+
+    def lookup(self, fingerprint: str, embedding) -> str | None:
+        """Trả về câu trả lời của câu hỏi gần nhất nếu độ tương đồng đạt ngưỡng, ngược lại None."""
+        import numpy as np
+        query, fingerprint = self._normalize(embedding), self._scope(fingerprint)
+        with self._lock:
+            ids, matrix = self._matrix(fingerprint)
+            if ids and matrix.shape[1] == query.shape[0]:
+                scores = matrix @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    answer, latency = self._conn.execute("SELECT answer, latency FROM answers WHERE id = ?", (ids[best],)).fetchone()
+                    self.hits += 1
+                    self.saved_seconds += latency
+                    return answer
+            self.misses += 1
+            return None
+
+    def store(self, fingerprint: str, question: str, embedding, answer: str, latency: float):
+        """Lưu câu trả lời mới; bỏ các mục cũ nhất khi vượt quá giới hạn."""
+        import numpy as np
+        vector, fingerprint = self._normalize(embedding), self._scope(fingerprint)
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO answers(fingerprint, question, embedding, answer, latency, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (fingerprint, question, vector.tobytes(), answer, latency, time.time()),
+            )
+            evicted = self._conn.execute(
+                "DELETE FROM answers WHERE id NOT IN (SELECT id FROM answers ORDER BY id DESC LIMIT ?)", (self.max_entries,)
+            ).rowcount
+            self._conn.commit()
+            ids, matrix = self._matrices.get(fingerprint, ([], None))
+            if evicted or (ids and matrix.shape[1] != vector.shape[0]):
+                self._matrices.clear()
+            elif fingerprint in self._matrices:
+                matrix = np.vstack([matrix, vector]) if ids else vector[None, :]
+                self._matrices[fingerprint] = (ids + [cursor.lastrowid], matrix)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0,
+                    "saved_seconds": self.saved_seconds}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,175 @@
+# pnote-ai-app/core/bm25.py
+
+# ==============================================================================
+# CHỈ MỤC TỪ VỰNG BM25 CHO TỪNG KHÓA HỌC
+#
+# Tìm kiếm vector bỏ sót các thuật ngữ chính xác (tên công thức, mã môn học,
+# thuật ngữ chuyên ngành tiếng Việt). Module này duy trì một chỉ mục đảo
+# (inverted index) trong user_data/<course>/bm25.sqlite3, được cập nhật khi
+# nạp và khi xóa tài liệu, và hỗ trợ:
+# 1. Tìm kiếm thuần từ vựng (không cần tính embedding cho câu hỏi).
+# 2. Hợp nhất với kết quả ChromaDB bằng Reciprocal Rank Fusion (RRF).
+#
+# Mỗi từ có dấu được lập chỉ mục cả ở dạng gốc và dạng bỏ dấu, nên câu hỏi gõ
+# không dấu ("hoc may") vẫn khớp với tài liệu có dấu ("học máy").
+#
+# Khi tìm kiếm, hư từ ("là", "gì", "được"...) và các term xuất hiện trong quá
+# nhiều chunk bị bỏ qua: chúng gần như không đóng góp vào điểm (IDF thấp) nhưng
+# danh sách posting dài bằng cả khóa học. Chỉ mục vẫn lưu mọi term, nên câu hỏi
+# chỉ gồm các từ này vẫn được tìm như bình thường.
+# ==============================================================================
+
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from unicodedata import normalize
+
+BM25_FILENAME = "bm25.sqlite3"
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+# Hư từ tiếng Việt bị bỏ khỏi câu truy vấn. Chỉ dạng có dấu: dạng bỏ dấu trùng với
+# từ có nghĩa ("vi" trong "vi mô", "ma" trong "ma trận") nên để ngưỡng tần suất xử lý.
+STOPWORDS = frozenset((
+    "là gì và được dùng như thế nào của có cho các những một trong với không này đó thì mà để khi từ theo về"
+    " đã sẽ đang bị rất nhiều hoặc tại nên vì nếu nhiêu đâu hãy cũng lại vào"
+).split())
+
+
+def fold_accents(word: str) -> str:
+    """Bỏ dấu tiếng Việt: 'học' -> 'hoc', 'đạo hàm' -> 'dao ham'."""
+    word = word.replace('đ', 'd').replace('Đ', 'D')
+    return "".join(c for c in normalize('NFKD', word) if not 0x300 <= ord(c) <= 0x36f)
+
+
+def tokenize(text: str) -> list[str]:
+    """Tách từ cho BM25: chữ thường, chuẩn hóa NFC, giữ nguyên dấu."""
+    return _WORD_RE.findall(normalize('NFC', text).lower())
+
+
+def index_terms(text: str) -> tuple[Counter, int]:
+    """Tần suất các term cần lập chỉ mục (dạng gốc + dạng bỏ dấu) và độ dài văn bản."""
+    words = tokenize(text)
+    counts = Counter(words)
+    for word, tf in list(counts.items()):
+        if (folded := fold_accents(word)) != word:
+            counts[folded] += tf
+    return counts, len(words)
+
+
+def reciprocal_rank_fusion(rankings: list[list[str]], k: int = 60) -> list[tuple[str, float]]:
+    """Hợp nhất nhiều danh sách xếp hạng: score(d) = Σ 1 / (k + rank)."""
+    scores: dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+
+
+class BM25Index:
+    def __init__(self, course_dir: str, k1: float = 1.5, b: float = 0.75, max_df_ratio: float = 0.5):
+        os.makedirs(course_dir, exist_ok=True)
+        self.path = os.path.join(course_dir, BM25_FILENAME)
+        self.is_new = not os.path.exists(self.path)
+        self.k1, self.b = k1, b
+        self.max_df_ratio = max_df_ratio
+        self._lock = threading.Lock()
+        self._corpus_stats: tuple[int, float] | None = None
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS chunks (id TEXT PRIMARY KEY, file_hash TEXT NOT NULL, length INTEGER NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS idx_chunks_file_hash ON chunks(file_hash);"
+            "CREATE TABLE IF NOT EXISTS postings (term TEXT NOT NULL, chunk_id TEXT NOT NULL, tf INTEGER NOT NULL,"
+            " PRIMARY KEY (term, chunk_id)) WITHOUT ROWID;"
+            "CREATE INDEX IF NOT EXISTS idx_postings_chunk ON postings(chunk_id);"
+        )
+        self._conn.commit()
+
+    def add(self, chunk_ids: list[str], file_hashes: list[str], texts: list[str]):
+        """Lập chỉ mục một lô chunk."""
+        chunk_rows, posting_rows = [], []
+        for chunk_id, file_hash, text in zip(chunk_ids, file_hashes, texts):
+            counts, length = index_terms(text)
+            chunk_rows.append((chunk_id, file_hash, length))
+            posting_rows.extend((term, chunk_id, tf) for term, tf in counts.items())
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?)", chunk_rows)
+            self._conn.executemany("INSERT OR REPLACE INTO postings VALUES (?, ?, ?)", posting_rows)
+            self._conn.commit()
+            self._corpus_stats = None
+
+    def delete_doc(self, file_hash: str):
+        """Gỡ mọi chunk của một tài liệu khỏi chỉ mục."""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM postings WHERE chunk_id IN (SELECT id FROM chunks WHERE file_hash = ?)", (file_hash,)
+            )
+            self._conn.execute("DELETE FROM chunks WHERE file_hash = ?", (file_hash,))
+            self._conn.commit()
+            self._corpus_stats = None
+
+    def delete_chunks(self, chunk_ids: list[str]):
+        """Gỡ một số chunk cụ thể khỏi chỉ mục (dùng khi làm mới một phần tài liệu)."""
+        with self._lock:
+            self._conn.executemany("DELETE FROM postings WHERE chunk_id = ?", [(i,) for i in chunk_ids])
+            self._conn.executemany("DELETE FROM chunks WHERE id = ?", [(i,) for i in chunk_ids])
+            self._conn.commit()
+            self._corpus_stats = None
+
+    def clear(self):
+        with self._lock:
+            self._conn.executescript("DELETE FROM postings; DELETE FROM chunks;")
+            self._conn.commit()
+            self._corpus_stats = None
+
+    def invalidate(self):
+        """Bỏ thống kê corpus đã nhớ (chỉ mục vừa được một tiến trình khác ghi)."""
+        with self._lock:
+            self._corpus_stats = None
+
+    def _query_terms(self, query: str, n_chunks: int) -> list[str]:
+        """
+        Các term của câu hỏi cần tra posting: bỏ hư từ, rồi bỏ term xuất hiện trong
+        hơn `max_df_ratio` số chunk. Nếu không còn term nào thì dùng lại toàn bộ.
+        Số chunk chứa mỗi term được đếm trên chỉ mục (term, chunk_id) của bảng postings.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        terms = [term for term in terms if term not in STOPWORDS] or terms
+        if len(terms) < 2: return terms
+        max_df = self.max_df_ratio * n_chunks
+        selective = [term for term in terms if self._conn.execute(
+            "SELECT COUNT(*) FROM (SELECT 1 FROM postings WHERE term = ? LIMIT ?)", (term, int(max_df) + 1)
+        ).fetchone()[0] <= max_df]
+        return selective or terms
+
+    def search(self, query: str, top_k: int) -> list[tuple[str, float]]:
+        """Trả về tối đa `top_k` cặp (chunk_id, điểm BM25) theo điểm giảm dần."""
+        if not tokenize(query):
+            return []
+        with self._lock:
+            if self._corpus_stats is None:
+                count, avg_length = self._conn.execute("SELECT COUNT(*), AVG(length) FROM chunks").fetchone()
+                self._corpus_stats = (count, avg_length or 0.0)
+            n_chunks, avg_length = self._corpus_stats
+            if not n_chunks:
+                return []
+            terms = self._query_terms(query, n_chunks)
+            rows = self._conn.execute(
+                f"SELECT p.term, p.chunk_id, p.tf, c.length FROM postings p JOIN chunks c ON c.id = p.chunk_id"
+                f" WHERE p.term IN ({','.join('?' * len(terms))})", terms
+            ).fetchall()
+        postings: dict[str, list[tuple[str, int, int]]] = {}
+        for term, chunk_id, tf, length in rows:
+            postings.setdefault(term, []).append((chunk_id, tf, length))
+        scores: dict[str, float] = {}
+        for term, entries in postings.items():
+            idf = math.log(1 + (n_chunks - len(entries) + 0.5) / (len(entries) + 0.5))
+            for chunk_id, tf, length in entries:
+                norm = self.k1 * (1 - self.b + self.b * length / avg_length) if avg_length else self.k1
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:top_k]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,117 @@
+# pnote-ai-app/core/cache.py
+
+# ==============================================================================
+# BỘ NHỚ ĐỆM KẾT QUẢ AI (RESULT CACHE)
+#
+# Khóa cache được suy ra từ "dấu vân tay" của tập tài liệu trong khóa học, mã
+# hash của prompt template, tên mô hình và các tham số. Khi tài liệu thay đổi,
+# các mục cũ đơn giản là không còn khớp (không cần xóa hàng loạt), và khi quay
+# lại đúng tập tài liệu trước đó thì cache lại được dùng.
+#
+# Hai tầng lưu trữ:
+# 1. Tầng bộ nhớ: LRU trong tiến trình, giới hạn theo tổng số byte.
+# 2. Tầng đĩa: user_data/<course>/cache/<key>.json, ghi nguyên tử
+#    (file tạm + os.replace), giới hạn số byte mỗi khóa học, loại bỏ theo
+#    thời điểm dùng gần nhất (mtime được cập nhật mỗi lần đọc trúng).
+# ==============================================================================
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(fingerprint: str, template: str, model_name: str, params: dict | None = None) -> str:
+    """Tạo khóa cache từ dấu vân tay tài liệu, prompt template, mô hình và tham số."""
+    template_hash = hashlib.sha256(template.encode('utf-8')).hexdigest()
+    payload = json.dumps([fingerprint, template_hash, model_name, params or {}], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, root_dir: str, memory_max_bytes: int, disk_max_bytes: int):
+        self.root_dir = root_dir
+        self.memory_max_bytes = memory_max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self._memory: OrderedDict[tuple[str, str], tuple[object, int]] = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+    def _cache_dir(self, course_id: str) -> str:
+        return os.path.join(self.root_dir, course_id, "cache")
+
+    # --- TẦNG BỘ NHỚ ---
+    def _remember(self, course_id: str, key: str, value, size: int):
+        with self._lock:
+            if (old := self._memory.pop((course_id, key), None)) is not None:
+                self._memory_bytes -= old[1]
+            if size > self.memory_max_bytes:
+                return
+            self._memory[(course_id, key)] = (value, size)
+            self._memory_bytes += size
+            while self._memory_bytes > self.memory_max_bytes:
+                _, (_, evicted) = self._memory.popitem(last=False)
+                self._memory_bytes -= evicted
+
+    # --- API CHÍNH ---
+    def get(self, course_id: str, key: str):
+        """Trả về giá trị đã lưu hoặc None nếu không có."""
+        with self._lock:
+            if (entry := self._memory.get((course_id, key))) is not None:
+                self._memory.move_to_end((course_id, key))
+                return entry[0]
+        path = os.path.join(self._cache_dir(course_id), f"{key}.json")
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                raw = f.read()
+            value = json.loads(raw)
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except (json.JSONDecodeError, OSError) as e:
+            logger.error(f"Không thể đọc cache từ {path}: {e}")
+            return None
+        self._remember(course_id, key, value, len(raw.encode('utf-8')))
+        return value
+
+    def set(self, course_id: str, key: str, value):
+        """Lưu giá trị vào cả hai tầng; ghi file nguyên tử rồi loại bỏ mục cũ nếu vượt giới hạn."""
+        raw = json.dumps(value, ensure_ascii=False, indent=4)
+        self._remember(course_id, key, value, len(raw.encode('utf-8')))
+        cache_dir = self._cache_dir(course_id)
+        path = os.path.join(cache_dir, f"{key}.json")
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(raw)
+            os.replace(tmp_path, path)
+            self._evict_disk(cache_dir)
+        except OSError as e:
+            logger.error(f"Không thể lưu cache vào {path}: {e}")
+
+    def _evict_disk(self, cache_dir: str):
+        entries = []
+        for entry in os.scandir(cache_dir):
+            if entry.is_file() and entry.name.endswith('.json'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def drop_course(self, course_id: str):
+        """Bỏ mọi mục của một khóa học khỏi tầng bộ nhớ (tầng đĩa bị xóa cùng thư mục khóa học)."""
+        with self._lock:
+            for mem_key in [k for k in self._memory if k[0] == course_id]:
+                self._memory_bytes -= self._memory.pop(mem_key)[1]
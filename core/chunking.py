@@ -0,0 +1,144 @@
+# pnote-ai-app/core/chunking.py
+
+# ==============================================================================
+# BỘ CHIA CHUNK THEO LUỒNG (STREAMING CHUNKER)
+#
+# Thay vì encode toàn bộ tài liệu một lần rồi giữ mọi chunk trong bộ nhớ,
+# module này token hóa văn bản theo từng đoạn và sinh ra các cửa sổ token
+# (kích thước TEXT_CHUNK_SIZE, chồng lấp TEXT_CHUNK_OVERLAP) dưới dạng
+# generator. Bộ nhớ đỉnh chỉ phụ thuộc vào kích thước cửa sổ và kích thước
+# đoạn đọc, không phụ thuộc vào độ dài tài liệu.
+#
+# Kết quả giống hệt cách chia cũ:
+#   tokens = encode(text)
+#   [decode(tokens[i:i + size]) for i in range(0, len(tokens), size - overlap)]
+# trừ khi văn bản dài quá PENDING_MAX_SEGMENTS đoạn liền không có vị trí cắt an
+# toàn nào (vd: một chuỗi số "1 2 3 ..." hay văn bản không có dấu cách); khi đó
+# đoạn bị buộc cắt và vài token quanh vị trí cắt có thể khác với encode cả chuỗi.
+# ==============================================================================
+
+from typing import Iterable, Iterator
+
+from config import TEXT_CHUNK_SIZE, TEXT_CHUNK_OVERLAP
+
+# Số ký tự tối thiểu gom lại trước khi token hóa một đoạn.
+SEGMENT_CHARS = 16_384
+# Đoạn chờ dài quá số đoạn này mà vẫn không có vị trí cắt an toàn thì bị buộc cắt,
+# để bộ nhớ và thời gian dò vị trí cắt không tăng theo độ dài tài liệu.
+PENDING_MAX_SEGMENTS = 4
+
+
+def _safe_split_point(text: str, end: int) -> int:
+    """
+    Tìm vị trí cắt an toàn cuối cùng trước `end`: ngay trước một dấu cách nằm
+    giữa một ký tự không phải khoảng trắng và một chữ cái (vd: "abc| def").
+    Tại vị trí này bộ tiền-token hóa của tiktoken luôn tách token, nên encode
+    hai nửa riêng biệt cho kết quả giống hệt encode cả chuỗi. Trả về 0 nếu
+    không tìm thấy.
+    """
+    pos = text.rfind(' ', 1, end)
+    while pos > 0:
+        if pos + 1 < len(text) and text[pos + 1].isalpha() and not text[pos - 1].isspace():
+            return pos
+        pos = text.rfind(' ', 1, pos)
+    return 0
+
+
+def _forced_split_point(text: str) -> int:
+    """
+    Vị trí buộc cắt khi không có vị trí an toàn: trước khoảng trắng cuối cùng ở
+    nửa sau của đoạn, hoặc ngay trước ký tự cuối cùng.
+    """
+    half = len(text) // 2
+    return max(text.rfind(' ', half), text.rfind('\n', half), 0) or len(text) - 1
+
+
+def _tagged(pieces: Iterable) -> Iterator[tuple]:
+    """Chuẩn hóa luồng đầu vào: chuỗi thường có tag None, tuple (page, text) giữ nguyên tag."""
+    for piece in pieces:
+        yield (None, piece) if isinstance(piece, str) else piece
+
+
+def iter_token_segments(tokenizer, pieces: Iterable, segment_chars: int = SEGMENT_CHARS) -> Iterator[tuple[list[int], object]]:
+    """
+    Token hóa dần một luồng văn bản, mỗi lần trả về (danh sách token, tag) của
+    một đoạn. Khi tag đổi (sang trang mới), đoạn cũ được cắt tại vị trí an toàn
+    gần nhất trước ranh giới trang nên số trang của token lệch tối đa một từ.
+    Đoạn chờ không bao giờ dài quá PENDING_MAX_SEGMENTS * segment_chars ký tự.
+    """
+    pending, tag = "", None
+    max_pending = PENDING_MAX_SEGMENTS * segment_chars
+    for piece_tag, piece in _tagged(pieces):
+        if not piece:
+            continue
+        if piece_tag != tag:
+            if pending:
+                cut = _safe_split_point(pending + piece[:1], len(pending))
+                if cut:
+                    yield tokenizer.encode(pending[:cut]), tag
+                    pending = pending[cut:]
+            tag = piece_tag
+        pending += piece
+        if len(pending) < segment_chars:
+            continue
+        cut = _safe_split_point(pending, len(pending) - 1)
+        if not cut and len(pending) >= max_pending:
+            cut = _forced_split_point(pending)
+        if cut:
+            yield tokenizer.encode(pending[:cut]), tag
+            pending = pending[cut:]
+    if pending:
+        yield tokenizer.encode(pending), tag
+
+
+def iter_tagged_chunks(tokenizer, source: str | Iterable, chunk_size: int = TEXT_CHUNK_SIZE,
+                       overlap: int = TEXT_CHUNK_OVERLAP, segment_chars: int = SEGMENT_CHARS,
+                       stats: dict | None = None) -> Iterator[tuple[str, object, object]]:
+    """
+    Sinh lần lượt các chunk (text, tag đầu, tag cuối) từ `source`: một chuỗi,
+    một luồng các mảnh chuỗi, hoặc một luồng (page, text) — các mảnh được nối
+    liền nhau. Với đầu vào theo trang, tag đầu/cuối là trang đầu/cuối của chunk.
+    Nếu có `stats`, tổng số token của tài liệu được cộng dồn vào stats["tokens"].
+    """
+    if chunk_size <= overlap:
+        raise ValueError("TEXT_CHUNK_SIZE phải lớn hơn TEXT_CHUNK_OVERLAP.")
+    if isinstance(source, str):
+        text = source
+        source = (text[i:i + segment_chars] for i in range(0, len(text), segment_chars))
+    stride = chunk_size - overlap
+    window: list[int] = []
+    tags: list = []
+    for segment, tag in iter_token_segments(tokenizer, source, segment_chars):
+        window.extend(segment)
+        tags.extend([tag] * len(segment))
+        if stats is not None:
+            stats["tokens"] = stats.get("tokens", 0) + len(segment)
+        while len(window) >= chunk_size:
+            yield tokenizer.decode(window[:chunk_size]), tags[0], tags[chunk_size - 1]
+            del window[:stride], tags[:stride]
+    # Các cửa sổ cuối cùng (ngắn hơn chunk_size), giống range(0, len, stride).
+    while window:
+        yield tokenizer.decode(window[:chunk_size]), tags[0], tags[min(chunk_size, len(tags)) - 1]
+        del window[:stride], tags[:stride]
+
+
+def iter_chunks(tokenizer, source: str | Iterable, chunk_size: int = TEXT_CHUNK_SIZE,
+                overlap: int = TEXT_CHUNK_OVERLAP, segment_chars: int = SEGMENT_CHARS) -> Iterator[str]:
+    """
+    Sinh lần lượt các chunk văn bản từ `source` (một chuỗi hoặc một luồng các
+    mảnh chuỗi sẽ được nối liền nhau).
+    """
+    for text, _, _ in iter_tagged_chunks(tokenizer, source, chunk_size, overlap, segment_chars):
+        yield text
+
+
+def iter_chunk_batches(chunks: Iterable, batch_size: int) -> Iterator[list]:
+    """Gom một luồng chunk thành các lô có tối đa `batch_size` phần tử."""
+    batch = []
+    for chunk in chunks:
+        batch.append(chunk)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -0,0 +1,105 @@
+# pnote-ai-app/core/context.py
+
+# ==============================================================================
+# ĐÓNG GÓI NGỮ CẢNH THEO NGÂN SÁCH TOKEN (CONTEXT PACKER)
+#
+# Các chunk liền kề của cùng một tài liệu chồng lấp nhau TEXT_CHUNK_OVERLAP
+# token, nên ghép nguyên văn sẽ trả tiền cho phần lặp trong mọi prompt. Bộ
+# đóng gói này:
+# 1. Đếm token bằng tokenizer của ServiceManager.
+# 2. (Tùy chọn) sắp xếp lại ứng viên theo MMR để tăng độ đa dạng.
+# 3. Chọn chunk cho tới khi đầy ngân sách token của từng tính năng; phần chồng
+#    lấp với chunk kề đã chọn không bị tính hai lần.
+# 4. Gộp các chunk liền kề/chồng lấp của cùng tài liệu thành một đoạn liền mạch.
+# ==============================================================================
+
+from config import TEXT_CHUNK_OVERLAP
+
+
+def mmr_order(embeddings, mmr_lambda: float) -> list[int]:
+    """
+    Sắp xếp lại các ứng viên (đã theo thứ tự liên quan giảm dần) bằng Maximal
+    Marginal Relevance: λ·độ liên quan − (1−λ)·độ giống lớn nhất với mục đã chọn.
+    """
+    import numpy as np  # Import khi dùng lần đầu (numpy làm chậm lúc khởi động).
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    if len(vectors) <= 1:
+        return list(range(len(vectors)))
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    similarity = vectors @ vectors.T
+    relevance = 1.0 - np.arange(len(vectors)) / len(vectors)
+    order, remaining = [0], list(range(1, len(vectors)))
+    while remaining:
+        redundancy = similarity[np.ix_(remaining, order)].max(axis=1)
+        scores = mmr_lambda * relevance[remaining] - (1 - mmr_lambda) * redundancy
+        order.append(remaining.pop(int(np.argmax(scores))))
+    return order
+
+
+def representative_order(embeddings) -> list[int]:
+    """
+    Thứ tự "liên quan" khi không có câu hỏi (từ khóa, tổng quan): chunk gần tâm
+    của tập ứng viên nhất đứng đầu, để MMR sau đó chọn các chunk vừa tiêu biểu vừa đa dạng.
+    """
+    import numpy as np
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    if len(vectors) <= 1:
+        return list(range(len(vectors)))
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    return [int(i) for i in np.argsort(-(vectors @ vectors.mean(axis=0)), kind="stable")]
+
+
+class ContextPacker:
+    def __init__(self, tokenizer, overlap: int = TEXT_CHUNK_OVERLAP, separator: str = "\n---\n"):
+        self.tokenizer = tokenizer
+        self.overlap = overlap
+        self.separator = separator
+
+    def _overlap_text(self, text: str) -> str:
+        """Phần đầu của chunk trùng với phần cuối của chunk đứng trước nó."""
+        return self.tokenizer.decode(self.tokenizer.encode(text)[:self.overlap])
+
+    def merge_texts(self, texts: list[str]) -> str:
+        """Nối các chunk liên tiếp của một tài liệu, bỏ phần chồng lấp giữa hai chunk kề nhau."""
+        merged = texts[0]
+        for text in texts[1:]:
+            head = self._overlap_text(text)
+            merged += text[len(head):] if merged.endswith(head) else "\n" + text
+        return merged
+
+    def pack(self, chunks: list[dict], budget: int, embeddings=None, mmr_lambda: float | None = None) -> str:
+        """
+        Đóng gói `chunks` (theo thứ tự liên quan giảm dần, mỗi phần tử có "text",
+        "file_hash" và "index") vào tối đa `budget` token. Trả về ngữ cảnh đã
+        gộp, các đoạn được sắp theo chunk liên quan nhất của mỗi đoạn.
+        """
+        if not chunks:
+            return ""
+        order = mmr_order(embeddings, mmr_lambda) if embeddings is not None and mmr_lambda is not None else range(len(chunks))
+        selected: dict[tuple, tuple[int, dict]] = {}  # (file_hash, index) -> (thứ hạng khi được chọn, chunk)
+        used = 0
+        for rank, position in enumerate(order):
+            chunk = chunks[position]
+            key = (chunk["file_hash"], chunk["index"])
+            if key in selected:
+                continue
+            cost = len(self.tokenizer.encode(chunk["text"]))
+            # Phần chồng lấp với chunk kề đã chọn sẽ bị loại khi gộp nên không tính.
+            neighbours = ((chunk["file_hash"], chunk["index"] - 1) in selected) + ((chunk["file_hash"], chunk["index"] + 1) in selected)
+            cost = max(cost - neighbours * self.overlap, 0)
+            if used + cost > budget:
+                if used: continue
+                # Chunk đầu tiên lớn hơn cả ngân sách: cắt bớt thay vì trả về rỗng.
+                chunk = {**chunk, "text": self.tokenizer.decode(self.tokenizer.encode(chunk["text"])[:budget])}
+                cost = budget
+            selected[key] = (rank, chunk)
+            used += cost
+
+        runs: list[tuple[int, list[dict]]] = []
+        for (file_hash, index), (rank, chunk) in sorted(selected.items()):
+            if runs and runs[-1][1][-1]["file_hash"] == file_hash and runs[-1][1][-1]["index"] == index - 1:
+                runs[-1] = (min(runs[-1][0], rank), runs[-1][1] + [chunk])
+            else:
+                runs.append((rank, [chunk]))
+        runs.sort(key=lambda item: item[0])
+        return self.separator.join(self.merge_texts([c["text"] for c in run]) for _, run in runs)
@@ -0,0 +1,177 @@
+# pnote-ai-app/core/conversation.py
+
+# ==============================================================================
+# BỘ NHỚ HỘI THOẠI (GIỚI HẠN THEO TOKEN) & KHO LƯU TRỮ TIN NHẮN CHAT
+#
+# 1. Tin nhắn của mỗi khóa học được ghi nối tiếp (chỉ thêm, không sửa) vào
+#    user_data/<course>/conversations.sqlite3, kèm số token đếm sẵn lúc ghi.
+#    Mỗi phiên làm việc giữ conversation_id đang mở trong session_state của
+#    Streamlit. Khi mở tab trò chuyện, phiên tiếp tục cuộc trò chuyện gần nhất của
+#    khóa học (hoặc cuộc được chọn trong danh sách gần đây). "Cuộc trò chuyện mới"
+#    chỉ mở một conversation_id mới; các cuộc cũ được giữ nguyên.
+# 2. Mỗi lượt chat chỉ gửi nguyên văn các tin nhắn gần nhất nằm trong
+#    CHAT_HISTORY_TOKEN_BUDGET; các tin nhắn cũ hơn được gộp vào một bản tóm tắt
+#    cuốn chiếu.
+# 3. Bản tóm tắt được lưu cùng ID của tin nhắn cuối cùng nó bao phủ, nên chỉ phải
+#    gọi mô hình khi cửa sổ vượt ngân sách; mỗi lần gộp, cửa sổ được thu về
+#    CHAT_HISTORY_KEEP_RATIO ngân sách để vài lượt tiếp theo không phải tóm tắt lại.
+# 4. Giao diện đọc lịch sử theo trang (từ mới về cũ) thay vì nạp cả cuộc trò chuyện.
+# ==============================================================================
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+CONVERSATIONS_FILENAME = "conversations.sqlite3"
+MESSAGE_COLUMNS = ("id", "role", "text", "tokens", "created_at")
+
+
+class ConversationStore:
+    def __init__(self, course_dir: str):
+        os.makedirs(course_dir, exist_ok=True)
+        self.path = os.path.join(course_dir, CONVERSATIONS_FILENAME)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS conversations (id INTEGER PRIMARY KEY AUTOINCREMENT, created_at REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS messages ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, conversation_id INTEGER NOT NULL, role TEXT NOT NULL,"
+            " text TEXT NOT NULL, tokens INTEGER NOT NULL, created_at REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS idx_messages_conversation ON messages(conversation_id, id);"
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, conversation_id INTEGER NOT NULL, upto_id INTEGER NOT NULL,"
+            " text TEXT NOT NULL, tokens INTEGER NOT NULL, created_at REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS idx_summaries_conversation ON summaries(conversation_id, id);"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _rows(rows) -> list[dict]:
+        return [dict(zip(MESSAGE_COLUMNS, row)) for row in rows]
+
+    # --- CUỘC TRÒ CHUYỆN ---
+    def new(self) -> int:
+        with self._lock:
+            conversation_id = self._conn.execute("INSERT INTO conversations(created_at) VALUES (?)", (time.time(),)).lastrowid
+            self._conn.commit()
+            return conversation_id
+
+    def recent(self, limit: int = 10) -> list[dict]:
+        """
+        Các cuộc trò chuyện đã có tin nhắn, cuộc có tin nhắn mới nhất đứng đầu:
+        {"id", "title" (câu hỏi đầu tiên), "messages", "updated_at"}.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT m.conversation_id, (SELECT text FROM messages f WHERE f.conversation_id = m.conversation_id ORDER BY f.id LIMIT 1),"
+                " COUNT(*), MAX(m.created_at) FROM messages m GROUP BY m.conversation_id ORDER BY MAX(m.id) DESC LIMIT ?",
+                (limit,)).fetchall()
+        return [dict(zip(("id", "title", "messages", "updated_at"), row)) for row in rows]
+
+    # --- TIN NHẮN ---
+    def append(self, conversation_id: int, messages: list[tuple[str, str, int]]) -> list[dict]:
+        """Ghi các tin nhắn (vai trò, nội dung, số token) trong một giao dịch và trả về chúng kèm ID."""
+        now = time.time()
+        with self._lock:
+            ids = [self._conn.execute(
+                "INSERT INTO messages(conversation_id, role, text, tokens, created_at) VALUES (?, ?, ?, ?, ?)",
+                (conversation_id, role, text, tokens, now)).lastrowid for role, text, tokens in messages]
+            self._conn.commit()
+        return [dict(zip(MESSAGE_COLUMNS, (message_id, role, text, tokens, now)))
+                for message_id, (role, text, tokens) in zip(ids, messages)]
+
+    def page(self, conversation_id: int, before_id: int | None = None, limit: int = 20) -> tuple[list[dict], bool]:
+        """`limit` tin nhắn ngay trước `before_id` (hoặc mới nhất), theo thứ tự thời gian, và còn tin cũ hơn hay không."""
+        query = f"SELECT {', '.join(MESSAGE_COLUMNS)} FROM messages WHERE conversation_id = ?"
+        params: tuple = (conversation_id,)
+        if before_id is not None:
+            query += " AND id < ?"
+            params += (before_id,)
+        with self._lock:
+            rows = self._conn.execute(f"{query} ORDER BY id DESC LIMIT ?", params + (limit + 1,)).fetchall()
+        return self._rows(reversed(rows[:limit])), len(rows) > limit
+
+    def messages_after(self, conversation_id: int, after_id: int) -> list[dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(MESSAGE_COLUMNS)} FROM messages WHERE conversation_id = ? AND id > ? ORDER BY id",
+                (conversation_id, after_id)).fetchall()
+        return self._rows(rows)
+
+    # --- BẢN TÓM TẮT CUỐN CHIẾU ---
+    def latest_summary(self, conversation_id: int) -> dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT upto_id, text, tokens FROM summaries WHERE conversation_id = ? ORDER BY id DESC LIMIT 1",
+                (conversation_id,)).fetchone()
+        return dict(zip(("upto_id", "text", "tokens"), row)) if row else None
+
+    def add_summary(self, conversation_id: int, upto_id: int, text: str, tokens: int):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO summaries(conversation_id, upto_id, text, tokens, created_at) VALUES (?, ?, ?, ?, ?)",
+                (conversation_id, upto_id, text, tokens, time.time()))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ConversationMemory:
+    """
+    Ngữ cảnh hội thoại của một cuộc trò chuyện trong khóa học: bản tóm tắt các
+    lượt cũ và các tin nhắn gần nhất (định dạng lịch sử của Gemini).
+    `summarize(prompt)` gọi mô hình để gộp các lượt cũ vào bản tóm tắt.
+    """
+
+    def __init__(self, store: ConversationStore, tokenizer, summarize: Callable[[str], str],
+                 token_budget: int, keep_ratio: float, prompt_template: str):
+        self.store = store
+        self.tokenizer = tokenizer
+        self.summarize = summarize
+        self.token_budget = token_budget
+        self.keep_ratio = keep_ratio
+        self.prompt_template = prompt_template
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.tokenizer.encode(text))
+
+    def record_turn(self, conversation_id: int, question: str, answer: str) -> list[dict]:
+        """Ghi một lượt hỏi - đáp hoàn chỉnh vào cuộc trò chuyện `conversation_id`."""
+        return self.store.append(conversation_id, [
+            ("user", question, self.count_tokens(question)), ("model", answer, self.count_tokens(answer))])
+
+    def _fold(self, summary: str | None, messages: list[dict]) -> str:
+        turns = "\n".join(f"{'NGƯỜI DÙNG' if m['role'] == 'user' else 'TRỢ LÝ'}: {m['text']}" for m in messages)
+        return self.summarize(self.prompt_template.format(summary=summary or "(chưa có)", turns=turns)).strip()
+
+    def context(self, conversation_id: int) -> tuple[str | None, list[dict]]:
+        """
+        (bản tóm tắt hoặc None, lịch sử gần nhất). Khi các tin nhắn sau bản tóm tắt
+        vượt ngân sách, các lượt cũ nhất được gộp vào bản tóm tắt mới (cắt ở đầu
+        một câu hỏi để lịch sử luôn bắt đầu bằng lượt của người dùng).
+        Nếu gọi mô hình thất bại, các lượt đó chỉ bị bỏ khỏi lần gửi này và sẽ được
+        gộp lại ở lượt sau.
+        """
+        summary = self.store.latest_summary(conversation_id)
+        summary_text = summary["text"] if summary else None
+        window = self.store.messages_after(conversation_id, summary["upto_id"] if summary else 0)
+        remaining = sum(m["tokens"] for m in window)
+        if remaining > self.token_budget:
+            target, cut = self.token_budget * self.keep_ratio, 0
+            while cut < len(window) and (remaining > target or window[cut]["role"] != "user"):
+                remaining -= window[cut]["tokens"]
+                cut += 1
+            folded, window = window[:cut], window[cut:]
+            try:
+                summary_text = self._fold(summary_text, folded)
+                self.store.add_summary(conversation_id, folded[-1]["id"], summary_text, self.count_tokens(summary_text))
+            except Exception as e:
+                logger.warning(f"Không tóm tắt được lịch sử hội thoại, chỉ giữ các lượt gần nhất: {e}")
+        return summary_text, [{"role": m["role"], "parts": [m["text"]]} for m in window]
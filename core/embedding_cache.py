@@ -0,0 +1,113 @@
+# pnote-ai-app/core/embedding_cache.py
+
+# ==============================================================================
+# BỘ NHỚ ĐỆM EMBEDDING THEO NỘI DUNG (CONTENT-ADDRESSED)
+#
+# Embedding của một chunk chỉ phụ thuộc vào văn bản và mô hình embedding, nên
+# được lưu trong một file SQLite dùng chung cho mọi không gian làm việc với
+# khóa = SHA256(tên mô hình + văn bản). Khi cùng một tài liệu được thêm vào
+# nhiều workspace hoặc được xóa rồi thêm lại, chỉ các chunk chưa có trong
+# cache mới phải tính embedding. Cache có giới hạn số mục và loại bỏ theo LRU.
+# ==============================================================================
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Sequence
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    def __init__(self, path: str, embed_fn: Callable[[list[str]], Sequence], model_name: str, max_entries: int):
+        self.path = path
+        self.embed_fn = embed_fn
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        self._conn.commit()
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\x00{text}".encode('utf-8')).hexdigest()
+
+    def _lookup(self, keys: list[str]) -> dict[str, "np.ndarray"]:
+        import numpy as np  # Import khi dùng lần đầu (numpy làm chậm lúc khởi động).
+        found = {}
+        unique = list(dict.fromkeys(keys))
+        for i in range(0, len(unique), 500):
+            part = unique[i:i + 500]
+            rows = self._conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part
+            ).fetchall()
+            found.update((key, np.frombuffer(blob, dtype=np.float32)) for key, blob in rows)
+        return found
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        """Trả về embedding của `texts`, chỉ gọi mô hình cho những văn bản chưa có trong cache."""
+        if not texts:
+            return []
+        keys = [self._key(text) for text in texts]
+        with self._lock:
+            found = self._lookup(keys)
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        if missing:
+            import numpy as np
+            vectors = self.embed_fn(list(missing.values()))
+            fresh = {key: np.asarray(vector, dtype=np.float32) for key, vector in zip(missing, vectors)}
+            found.update(fresh)
+        now = time.time()
+        with self._lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+            try:
+                if missing:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO embeddings(key, vector, last_used) VALUES (?, ?, ?)",
+                        [(key, vector.tobytes(), now) for key, vector in fresh.items()],
+                    )
+                hit_keys = [key for key in set(keys) if key not in missing]
+                if hit_keys:
+                    self._conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key in hit_keys])
+                self._evict()
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Không thể ghi cache embedding vào {self.path}: {e}")
+        return [found[key].tolist() for key in keys]
+
+    def _evict(self):
+        """Xóa các mục ít được dùng gần đây nhất khi vượt quá giới hạn."""
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def stats(self) -> dict:
+        """Số lượt trúng/trượt từ khi khởi động, tỉ lệ trúng và số mục đang lưu."""
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": entries,
+                "max_entries": self.max_entries,
+            }
@@ -0,0 +1,196 @@
+# pnote-ai-app/core/extractors.py
+
+# ==============================================================================
+# CÁC HÀM TRÍCH XUẤT VĂN BẢN TỪ NGUỒN TÀI LIỆU
+#
+# Module này không phụ thuộc vào ServiceManager hay Streamlit để có thể được
+# gọi trực tiếp trong các tiến trình con (ProcessPoolExecutor) mà không phải
+# khởi tạo lại ChromaDB hay cấu hình ứng dụng.
+# ==============================================================================
+
+import io
+import logging
+import re
+import threading
+
+from core.pdf_engine import iter_pdf_pages
+
+# docx, requests, lxml, bs4 và youtube_transcript_api được import trong từng hàm để
+# việc import module (và khởi động ứng dụng) không phải nạp chúng.
+
+logger = logging.getLogger(__name__)
+
+# Các loại nguồn cần CPU (phân tích file) và các loại nguồn cần mạng.
+FILE_SOURCE_TYPES = ('pdf', 'docx')
+NETWORK_SOURCE_TYPES = ('url', 'youtube')
+
+# Tải trang web: mọi lần tải trong một tiến trình dùng chung một Session (giữ kết nối
+# keep-alive theo từng máy chủ); pool đủ cho các luồng tải khi nạp và khi làm mới song song.
+HTTP_POOL_SIZE = 16
+HTTP_READ_CHUNK_BYTES = 64 * 1024
+HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml')
+TEXT_CONTENT_TYPES = HTML_CONTENT_TYPES + ('text/plain',)
+# Các thẻ không thuộc nội dung chính, bị bỏ cùng toàn bộ phần bên trong.
+BOILERPLATE_TAGS = ("script", "style", "nav", "footer", "header", "aside")
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+
+def extract_pdf_text(stream) -> str:
+    """Trích xuất văn bản từ một file PDF (đối tượng có phương thức read), mỗi trang đọc một lần."""
+    return "".join(text for _, text in iter_pdf_pages(stream))
+
+
+def extract_docx_text(stream) -> str:
+    """Trích xuất văn bản từ một file Word (.docx)."""
+    import docx
+    doc = docx.Document(stream)
+    return "\n".join([para.text for para in doc.paragraphs if para.text])
+
+
+# --- TẢI TRANG WEB ---
+def http_session():
+    """Session HTTP dùng chung của tiến trình (tạo ở lần gọi đầu tiên)."""
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers['User-Agent'] = 'Mozilla/5.0'
+            _http_session = session
+        return _http_session
+
+
+def _charset(content_type: str) -> str | None:
+    for param in content_type.split(';')[1:]:
+        key, _, value = param.partition('=')
+        if key.strip().lower() == 'charset':
+            return value.strip().strip('"\'') or None
+    return None
+
+
+def fetch_url_text(url: str, etag: str | None = None, last_modified: str | None = None,
+                   max_bytes: int | None = None, timeout: float = 15) -> tuple[str | None, str | None, str | None]:
+    """
+    Tải một trang web có điều kiện (If-None-Match / If-Modified-Since) và trả về
+    (văn bản, ETag, Last-Modified). Văn bản là None khi máy chủ trả 304, tức
+    trang không đổi kể từ lần tải có các giá trị `etag` / `last_modified` đó.
+    Nội dung được đọc theo luồng và bị từ chối (ValueError) ngay khi vượt quá
+    `max_bytes` hoặc khi không phải HTML / văn bản thuần.
+    """
+    headers = {}
+    if etag: headers['If-None-Match'] = etag
+    if last_modified: headers['If-Modified-Since'] = last_modified
+    with http_session().get(url, headers=headers, timeout=timeout, stream=True) as response:
+        if response.status_code == 304:
+            return None, etag, last_modified
+        response.raise_for_status()
+        content_type = response.headers.get('Content-Type', '')
+        mime_type = content_type.split(';')[0].strip().lower()
+        if mime_type and mime_type not in TEXT_CONTENT_TYPES:
+            raise ValueError(f"Loại nội dung không được hỗ trợ: {mime_type}")
+        too_large = f"Trang vượt quá giới hạn {max_bytes // 1024} KB." if max_bytes else ""
+        declared = response.headers.get('Content-Length', '')
+        if max_bytes and declared.isdigit() and int(declared) > max_bytes:
+            raise ValueError(too_large)
+        body = bytearray()
+        for block in response.iter_content(HTTP_READ_CHUNK_BYTES):
+            body += block
+            if max_bytes and len(body) > max_bytes:
+                raise ValueError(too_large)
+        charset = _charset(content_type)
+        if mime_type == 'text/plain':
+            text = bytes(body).decode(charset or 'utf-8', errors='replace')
+        else:
+            text = html_to_text(bytes(body), charset)
+        return text, response.headers.get('ETag'), response.headers.get('Last-Modified')
+
+
+def extract_url_text(url: str, max_bytes: int | None = None, timeout: float = 15) -> str:
+    """Tải một trang web và lấy phần văn bản chính."""
+    return fetch_url_text(url, max_bytes=max_bytes, timeout=timeout)[0]
+
+
+# --- TRÍCH XUẤT VĂN BẢN HTML ---
+def _decode_html(content: bytes, charset: str | None) -> str:
+    """Giải mã theo charset của header, rồi thử UTF-8; không được thì đoán như BeautifulSoup (thẻ meta...)."""
+    for encoding in filter(None, (charset, 'utf-8')):
+        try:
+            return content.decode(encoding)
+        except (LookupError, UnicodeDecodeError):
+            continue
+    from bs4 import UnicodeDammit
+    return UnicodeDammit(content, is_html=True).unicode_markup
+
+
+def _html_to_text_lxml(markup: str) -> str:
+    from lxml import etree, html
+    # lxml không nhận chuỗi Unicode có khai báo encoding của XML.
+    root = html.document_fromstring(re.sub(r'^\s*<\?xml[^>]*\?>', '', markup))
+    # Xóa nội dung nhưng giữ phần tail của thẻ để văn bản hai bên không bị dính vào nhau.
+    for element in list(root.iter(*BOILERPLATE_TAGS, etree.Comment, etree.ProcessingInstruction)):
+        element.clear(keep_tail=True)
+    return "\n".join(line for line in (part.strip() for part in root.itertext()) if line)
+
+
+def _html_to_text_bs4(markup: str) -> str:
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(markup, 'html.parser')
+    for tag in soup(list(BOILERPLATE_TAGS)):
+        tag.decompose()
+    return soup.get_text(separator='\n', strip=True)
+
+
+def html_to_text(content: bytes, charset: str | None = None) -> str:
+    """
+    Lấy phần văn bản chính của một trang HTML (bỏ script, style, menu...).
+    Dùng lxml (parser C, nhanh hơn nhiều lần) khi có; BeautifulSoup (html.parser)
+    là đường dự phòng khi thiếu lxml hoặc lxml không đọc được trang.
+    """
+    markup = _decode_html(content, charset)
+    try:
+        return _html_to_text_lxml(markup)
+    except ImportError:
+        pass
+    except Exception as e:
+        logger.debug(f"lxml không đọc được trang, dùng BeautifulSoup: {e}")
+    return _html_to_text_bs4(markup)
+
+
+def youtube_video_id(url: str) -> str:
+    """Lấy video ID từ một đường dẫn YouTube."""
+    video_id_match = re.search(r"(?<=v=)[\w-]+|(?<=youtu.be/)[\w-]+", url)
+    if not video_id_match:
+        raise ValueError("URL YouTube không hợp lệ.")
+    return video_id_match.group(0)
+
+
+def extract_youtube_text(url: str) -> str:
+    """Lấy transcript (tiếng Việt hoặc tiếng Anh) của một video YouTube."""
+    from youtube_transcript_api import YouTubeTranscriptApi
+    transcript = YouTubeTranscriptApi.get_transcript(youtube_video_id(url), languages=['vi', 'en'])
+    return " ".join([item['text'] for item in transcript])
+
+
+def preload():
+    """Nạp trước các thư viện trích xuất (dùng cho warm-up chạy nền)."""
+    import docx, requests, bs4, youtube_transcript_api, pypdf  # noqa: F401
+    try: import lxml.html  # noqa: F401
+    except ImportError: pass
+
+
+def extract_file_bytes(source_type: str, data: bytes) -> str:
+    """
+    Trích xuất văn bản từ nội dung nhị phân của file. Được dùng làm hàm worker
+    cho ProcessPoolExecutor nên chỉ nhận và trả về các đối tượng picklable.
+    """
+    if source_type == 'pdf':
+        return extract_pdf_text(io.BytesIO(data))
+    if source_type == 'docx':
+        return extract_docx_text(io.BytesIO(data))
+    raise ValueError(f"Loại file không được hỗ trợ: {source_type}")
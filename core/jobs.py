@@ -0,0 +1,300 @@
+# pnote-ai-app/core/jobs.py
+
+# ==============================================================================
+# HÀNG ĐỢI NẠP TÀI LIỆU CHẠY NỀN (LƯU TRONG SQLITE)
+#
+# 1. Mỗi nguồn tài liệu là một job, khóa duy nhất theo (khóa học, file_hash):
+#    xếp hàng lại cùng một tài liệu không tạo job trùng.
+# 2. Nội dung file tải lên được ghi vào user_data/<course>/uploads/ trước khi
+#    xếp hàng, nên job không phụ thuộc vào phiên Streamlit đã tạo ra nó.
+# 3. Job đang chạy dở khi tiến trình dừng được đưa về hàng đợi ở lần khởi động
+#    sau (tối đa INGEST_JOB_MAX_ATTEMPTS lần) và chạy lại từ đầu.
+# 4. Job được chạy bởi một tiến trình worker riêng (ứng dụng tự khởi động khi có
+#    job, tự thoát khi rảnh) để việc trích xuất, chia chunk và embedding không
+#    tranh CPU với các phiên Streamlit. Khóa file INGEST_WORKER_LOCK_PATH bảo đảm
+#    chỉ có một worker; INGEST_JOB_RUNNER = "thread" chạy worker trong tiến trình
+#    ứng dụng như trước. Phần trích xuất file vẫn chạy trong process pool.
+# 5. Các nguồn gửi cùng một lần tạo thành một nhóm job (batch_id). Worker nhận cả
+#    nhóm, thêm các job đang chờ khác của cùng khóa học nếu nhóm còn nhỏ hơn
+#    INGEST_JOB_BATCH_SIZE, và nạp chúng qua một lần add_sources.
+#
+#   python -m core.jobs list [course_id]   # xem trạng thái các job
+#   python -m core.jobs worker             # chạy worker (thường do ứng dụng khởi động)
+# ==============================================================================
+
+import io
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+JOB_COLUMNS = ("id", "course_id", "file_hash", "name", "source_type", "source", "status", "chunks", "error",
+               "attempts", "created_at", "updated_at", "batch_id")
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class StoredUpload(io.BytesIO):
+    """Nội dung file đã lưu của một job, có `name` như file tải lên của Streamlit."""
+
+    def __init__(self, data: bytes, name: str):
+        super().__init__(data)
+        self.name = name
+
+
+def save_upload(uploads_dir: str, file_hash: str, data: bytes) -> str:
+    """Ghi nội dung file tải lên (ghi file tạm rồi đổi tên) và trả về đường dẫn."""
+    os.makedirs(uploads_dir, exist_ok=True)
+    path = os.path.join(uploads_dir, file_hash)
+    if not os.path.exists(path):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    return path
+
+
+def _lock_file(f, blocking: bool) -> bool:
+    if fcntl is not None:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            return True
+        except BlockingIOError:
+            return False
+    while True:
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            if not blocking: return False
+            time.sleep(0.05)
+
+
+def _unlock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f, fcntl.LOCK_UN)
+    else:
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class FileLock:
+    """
+    Khóa loại trừ giữa các luồng và giữa các tiến trình (khóa trên file `path`),
+    dùng như threading.Lock. Khóa được nhả khi tiến trình giữ nó kết thúc.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        if not self._lock.acquire(blocking):
+            return False
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            f = open(self.path, 'a+b')
+            if not _lock_file(f, blocking):
+                f.close()
+                self._lock.release()
+                return False
+        except BaseException:
+            self._lock.release()
+            raise
+        self._file = f
+        return True
+
+    def release(self):
+        f, self._file = self._file, None
+        try:
+            _unlock_file(f)
+        finally:
+            f.close()
+            self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class JobQueue:
+    def __init__(self, path: str, max_attempts: int):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, course_id TEXT NOT NULL, file_hash TEXT NOT NULL,"
+            " name TEXT NOT NULL, source_type TEXT NOT NULL, source TEXT NOT NULL, status TEXT NOT NULL,"
+            " chunks INTEGER NOT NULL DEFAULT 0, error TEXT, attempts INTEGER NOT NULL DEFAULT 0,"
+            " created_at REAL NOT NULL, updated_at REAL NOT NULL, UNIQUE (course_id, file_hash))"
+        )
+        if "batch_id" not in {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN batch_id INTEGER")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_course ON jobs(course_id, status, updated_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def _row(row) -> dict | None:
+        return dict(zip(JOB_COLUMNS, row)) if row else None
+
+    def _get(self, job_id: int) -> dict | None:
+        return self._row(self._conn.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def enqueue(self, course_id: str, file_hash: str, name: str, source_type: str, source: str) -> dict:
+        """Xếp hàng một nguồn (một nhóm chỉ có một job), xem enqueue_group."""
+        return self.enqueue_group(course_id, [(file_hash, name, source_type, source)])[0]
+
+    def enqueue_group(self, course_id: str, sources: list[tuple[str, str, str, str]]) -> list[dict]:
+        """
+        Xếp hàng các nguồn (file_hash, name, source_type, source) của một lần gửi
+        thành một nhóm job. `source` là đường dẫn file đã lưu (pdf, docx) hoặc URL.
+        Job cùng khóa đang chờ/đang chạy được giữ nguyên (ở nhóm cũ); job đã kết
+        thúc được xếp hàng lại vào nhóm mới.
+        """
+        now = time.time()
+        with self._lock:
+            batch_id = self._conn.execute("SELECT COALESCE(MAX(batch_id), 0) + 1 FROM jobs").fetchone()[0]
+            job_ids = []
+            for file_hash, name, source_type, source in sources:
+                row = self._conn.execute("SELECT id, status FROM jobs WHERE course_id = ? AND file_hash = ?",
+                                         (course_id, file_hash)).fetchone()
+                if row is None:
+                    cursor = self._conn.execute(
+                        "INSERT INTO jobs(course_id, file_hash, name, source_type, source, status, created_at, updated_at, batch_id)"
+                        " VALUES (?, ?, ?, ?, ?, 'queued', ?, ?, ?)",
+                        (course_id, file_hash, name, source_type, source, now, now, batch_id))
+                    job_ids.append(cursor.lastrowid)
+                    continue
+                job_ids.append(row[0])
+                if row[1] not in ACTIVE_STATUSES:
+                    self._conn.execute(
+                        "UPDATE jobs SET name = ?, source_type = ?, source = ?, status = 'queued', chunks = 0,"
+                        " error = NULL, attempts = 0, created_at = ?, updated_at = ?, batch_id = ? WHERE id = ?",
+                        (name, source_type, source, now, now, batch_id, row[0]))
+            self._conn.commit()
+            return [self._get(job_id) for job_id in job_ids]
+
+    def claim(self, limit: int = 1) -> list[dict]:
+        """
+        Lấy nhóm của job cũ nhất đang chờ (cả nhóm, kể cả khi lớn hơn `limit`),
+        thêm các job đang chờ khác của cùng khóa học cho đủ `limit`, rồi chuyển
+        chúng sang 'running'; danh sách rỗng nếu hàng đợi rỗng. Giao dịch BEGIN
+        IMMEDIATE giữ an toàn khi nhiều tiến trình cùng lấy.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                first = self._conn.execute(
+                    "SELECT id, course_id, batch_id FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1").fetchone()
+                ids = []
+                if first is not None:
+                    job_id, course_id, batch_id = first
+                    ids = [job_id] if batch_id is None else [row[0] for row in self._conn.execute(
+                        "SELECT id FROM jobs WHERE status = 'queued' AND course_id = ? AND batch_id = ? ORDER BY id",
+                        (course_id, batch_id))]
+                    if len(ids) < limit:
+                        ids += [row[0] for row in self._conn.execute(
+                            f"SELECT id FROM jobs WHERE status = 'queued' AND course_id = ? AND id NOT IN ({','.join('?' * len(ids))})"
+                            " ORDER BY id LIMIT ?", (course_id, *ids, limit - len(ids)))]
+                self._conn.executemany("UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                                       [(time.time(), job_id) for job_id in ids])
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+            return [self._get(job_id) for job_id in ids]
+
+    def finish(self, job_id: int, status: str, chunks: int = 0, error: str | None = None):
+        """Ghi kết quả cuối cùng: 'added', 'skipped' hoặc 'error'."""
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET status = ?, chunks = ?, error = ?, updated_at = ? WHERE id = ?",
+                               (status, chunks, error, time.time(), job_id))
+            self._conn.commit()
+
+    def recover(self) -> int:
+        """
+        Đưa các job 'running' của tiến trình trước (đã dừng giữa chừng) về hàng đợi;
+        job đã thử đủ `max_attempts` lần bị đánh dấu lỗi. Trả về số job được chạy lại.
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'error', error = 'Bị gián đoạn quá nhiều lần.', updated_at = ?"
+                " WHERE status = 'running' AND attempts >= ?", (time.time(), self.max_attempts))
+            resumed = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', updated_at = ? WHERE status = 'running'", (time.time(),)).rowcount
+            self._conn.commit()
+            return resumed
+
+    def retry(self, job_id: int) -> bool:
+        """Xếp hàng lại một job bị lỗi."""
+        with self._lock:
+            updated = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', error = NULL, attempts = 0, updated_at = ? WHERE id = ? AND status = 'error'",
+                (time.time(), job_id)).rowcount
+            self._conn.commit()
+            return bool(updated)
+
+    def list(self, course_id: str | None = None, limit: int = 50) -> list[dict]:
+        """Các job mới nhất (của một khóa học nếu có `course_id`)."""
+        query = f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs"
+        params: tuple = ()
+        if course_id is not None:
+            query += " WHERE course_id = ?"
+            params = (course_id,)
+        with self._lock:
+            rows = self._conn.execute(f"{query} ORDER BY id DESC LIMIT ?", params + (limit,)).fetchall()
+        return [self._row(row) for row in rows]
+
+    def has_pending(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM jobs WHERE status IN ('queued', 'running') LIMIT 1").fetchone() is not None
+
+    def last_finished(self, course_id: str) -> float:
+        """Thời điểm kết thúc của job gần nhất có thể đã ghi/xóa chunk của khóa học (0 nếu chưa có)."""
+        with self._lock:
+            row = self._conn.execute("SELECT MAX(updated_at) FROM jobs WHERE course_id = ? AND status IN ('added', 'error')",
+                                     (course_id,)).fetchone()
+        return row[0] or 0.0
+
+    def delete_course(self, course_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM jobs WHERE course_id = ?", (course_id,))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def main(argv: list[str]) -> int:
+    from config import INGEST_JOBS_PATH, INGEST_JOB_MAX_ATTEMPTS
+    if argv == ["worker"]:
+        from core.services import service_manager
+        return service_manager.run_job_worker()
+    if not argv or argv[0] != "list":
+        print("Cách dùng: python -m core.jobs list [course_id ...] | worker")
+        return 2
+    queue = JobQueue(INGEST_JOBS_PATH, INGEST_JOB_MAX_ATTEMPTS)
+    for course_id in argv[1:] or [None]:
+        for job in queue.list(course_id):
+            detail = job["error"] or (f"{job['chunks']} chunk" if job["status"] == "added" else "")
+            print(f"#{job['id']:<5} {job['status']:<8} {job['course_id']:<24} {job['name']}  {detail}")
+    queue.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
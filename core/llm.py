@@ -0,0 +1,177 @@
+# pnote-ai-app/core/llm.py
+
+# ==============================================================================
+# CỔNG GỌI MÔ HÌNH NGÔN NGỮ (LLM GATEWAY)
+#
+# Mọi lời gọi Gemini của ServiceManager đi qua một cổng duy nhất để:
+# 1. Tái sử dụng đối tượng GenerativeModel thay vì tạo mới mỗi lần gọi.
+# 2. Giới hạn tốc độ bằng token bucket cho số request/phút và số token/phút.
+# 3. Giới hạn số lời gọi đồng thời (dùng chung cho mọi phiên Streamlit); một
+#    luồng chat giữ chỗ cho tới khi đọc hết (hoặc bị đóng).
+# 4. Thử lại với backoff lũy thừa khi gặp ResourceExhausted/ServiceUnavailable.
+# 5. Cung cấp API theo lô và bất đồng bộ cho các tính năng cần gọi nhiều lần.
+#
+# `model_factory` có thể được thay bằng một mô hình giả để kiểm thử offline.
+# ==============================================================================
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator
+
+from core.metrics import tracer
+
+logger = logging.getLogger(__name__)
+
+
+def retryable_errors() -> tuple[type[Exception], ...]:
+    """Các lỗi tạm thời đáng thử lại (import khi cần để không làm chậm lúc khởi động)."""
+    from google.api_core import exceptions
+    return exceptions.ResourceExhausted, exceptions.ServiceUnavailable
+
+
+def llm_error_message(error: Exception) -> str:
+    """Chuyển lỗi khi gọi mô hình thành thông báo dễ hiểu cho người dùng."""
+    resource_exhausted, service_unavailable = retryable_errors()
+    if isinstance(error, resource_exhausted):
+        return "Lỗi: Đã vượt hạn mức gọi AI. Vui lòng thử lại sau ít phút."
+    if isinstance(error, service_unavailable):
+        return "Lỗi: Dịch vụ AI đang quá tải hoặc tạm thời không khả dụng. Vui lòng thử lại sau."
+    return f"Lỗi: {error}"
+
+
+class TokenBucket:
+    """Token bucket an toàn luồng: nạp lại `capacity` đơn vị mỗi phút, `acquire` chờ đến khi đủ."""
+
+    def __init__(self, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.capacity = capacity
+        self.rate = capacity / 60.0
+        self.clock = clock
+        self._tokens = capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount: float = 1.0):
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                now = self.clock()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                wait = (amount - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class LLMGateway:
+    def __init__(self, model_factory: Callable, tokenizer, requests_per_minute: int, tokens_per_minute: int,
+                 max_concurrency: int, max_retries: int, backoff_base: float, backoff_max: float):
+        self.model_factory = model_factory
+        self.tokenizer = tokenizer
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._retryable = retryable_errors()
+        self._models: dict[tuple, object] = {}
+        self._models_lock = threading.Lock()
+
+    def _model(self, model_name: str, system_instruction: str | None):
+        key = (model_name, system_instruction)
+        with self._models_lock:
+            if key not in self._models:
+                self._models[key] = self.model_factory(model_name, system_instruction=system_instruction)
+            return self._models[key]
+
+    def _cost(self, *texts: str, history: list | None = None) -> int:
+        """Số token đầu vào của một lời gọi: các đoạn văn bản cùng mọi lượt trong `history`."""
+        texts = [*texts, *(part if isinstance(part, str) else part.get("text", "")
+                           for message in history or [] for part in message.get("parts", []))]
+        return sum(len(self.tokenizer.encode(text)) for text in texts if text)
+
+    def _call(self, fn: Callable, cost: int, keep_slot: bool = False):
+        """
+        Chạy `fn` trong giới hạn tốc độ và đồng thời, thử lại với backoff lũy thừa
+        khi lỗi tạm thời. Với `keep_slot=True`, chỗ đồng thời vẫn bị giữ sau khi
+        `fn` thành công và nơi gọi phải trả lại bằng `self._slots.release()`.
+        """
+        for attempt in range(self.max_retries + 1):
+            self.request_bucket.acquire(1)
+            self.token_bucket.acquire(cost)
+            self._slots.acquire()
+            try:
+                result = fn()
+            except self._retryable as e:
+                self._slots.release()
+                if attempt == self.max_retries:
+                    raise
+                tracer.count("llm_retries", error=type(e).__name__)
+                delay = min(self.backoff_max, self.backoff_base * 2 ** attempt) * random.uniform(0.5, 1.0)
+                logger.warning(f"Lỗi tạm thời khi gọi mô hình ({type(e).__name__}), thử lại sau {delay:.1f}s.")
+            except BaseException:
+                self._slots.release()
+                raise
+            else:
+                if not keep_slot:
+                    self._slots.release()
+                return result
+            time.sleep(delay)
+
+    # --- API ĐỒNG BỘ ---
+    def generate(self, prompt: str, model_name: str, json_output: bool = False,
+                 system_instruction: str | None = None) -> str:
+        """Sinh văn bản cho một prompt; `json_output=True` yêu cầu mô hình trả về JSON."""
+        model = self._model(model_name, system_instruction)
+        kwargs = {"generation_config": {"response_mime_type": "application/json"}} if json_output else {}
+        with tracer.span("llm.generate"):
+            return self._call(lambda: model.generate_content(prompt, **kwargs).text,
+                              self._cost(prompt, system_instruction))
+
+    def stream_chat(self, prompt: str, history: list, model_name: str,
+                    system_instruction: str | None = None) -> Iterator[str]:
+        """
+        Gửi `prompt` trong một phiên chat có `history` và trả về luồng văn bản.
+        Số token tính vào giới hạn gồm cả lịch sử (và tóm tắt nằm trong prompt).
+        Chỉ thử lại khi lỗi xảy ra trước lúc nhận được phần đầu tiên; chỗ đồng
+        thời được giữ cho tới khi luồng kết thúc hoặc bị đóng.
+        """
+        model = self._model(model_name, system_instruction)
+
+        def first_chunk():
+            stream = iter(model.start_chat(history=history).send_message(prompt, stream=True))
+            return stream, next(stream, None)
+
+        with tracer.span("llm.time_to_first_token"):
+            stream, first = self._call(first_chunk, self._cost(prompt, system_instruction, history=history), keep_slot=True)
+        try:
+            with tracer.span("llm.stream"):
+                if first is not None:
+                    yield first.text
+                for chunk in stream:
+                    yield chunk.text
+        finally:
+            self._slots.release()
+
+    # --- API THEO LÔ & BẤT ĐỒNG BỘ ---
+    def generate_batch(self, prompts: list[str], model_name: str, json_output: bool = False,
+                       system_instruction: str | None = None) -> list[str | Exception]:
+        """Gọi nhiều prompt song song (tối đa `max_concurrency`); lỗi của từng prompt được trả về tại vị trí của nó."""
+        def run(prompt: str):
+            try: return self.generate(prompt, model_name, json_output, system_instruction)
+            except Exception as e: return e
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            return list(pool.map(run, prompts))
+
+    async def agenerate(self, prompt: str, model_name: str, json_output: bool = False,
+                        system_instruction: str | None = None) -> str:
+        """Phiên bản bất đồng bộ của `generate` (chạy trong thread pool mặc định của asyncio)."""
+        return await asyncio.to_thread(self.generate, prompt, model_name, json_output, system_instruction)
@@ -0,0 +1,290 @@
+# pnote-ai-app/core/manifest.py
+
+# ==============================================================================
+# DANH MỤC TÀI LIỆU CỦA KHÓA HỌC (MANIFEST)
+#
+# Mỗi khóa học có một file SQLite nhỏ (user_data/<course>/manifest.sqlite3)
+# ghi lại từng tài liệu: hash, tên, loại nguồn, số chunk, số token chính xác
+# và thời điểm nạp. Manifest được cập nhật dần bởi add_doc/delete_doc nên
+# hash_exists, list_docs và thống kê chỉ là các truy vấn có chỉ mục thay vì
+# quét toàn bộ metadata trong ChromaDB. Với nguồn web (URL, YouTube), bảng
+# web_sources lưu thêm ETag/Last-Modified và hash nội dung của lần tải gần nhất
+# để việc làm mới chỉ xử lý những trang thật sự thay đổi, cùng số lần nội dung
+# đã đổi (revision) để dấu vân tay của khóa học đổi theo.
+#
+# Chunk được định danh theo hash nội dung nên chunk giống hệt nhau chỉ được lưu
+# một lần trong khóa học; bảng chunk_refs ghi (tài liệu, vị trí) -> chunk, và một
+# chunk chỉ bị xóa khỏi ChromaDB khi không còn tài liệu nào tham chiếu tới nó.
+# Metadata của chunk dùng chung cũng ghi lại mọi tài liệu tham chiếu tới nó
+# (khóa shared_refs), nên bảng chunk_refs dựng lại từ collection vẫn đầy đủ.
+#
+# Dựng lại manifest từ collection hiện có:
+#   python -m core.manifest rebuild [course_id ...]
+# Làm mới các nguồn web của khóa học:
+#   python -m core.manifest refresh [course_id ...]
+# ==============================================================================
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+MANIFEST_FILENAME = "manifest.sqlite3"
+
+
+def infer_source_type(source_name: str) -> str:
+    """Đoán loại nguồn từ tên tài liệu (dùng khi nơi gọi không cung cấp)."""
+    lowered = source_name.lower()
+    if lowered.endswith('.pdf'): return 'pdf'
+    if lowered.endswith('.docx'): return 'docx'
+    if 'youtube.com' in lowered or 'youtu.be' in lowered or lowered.startswith('youtube_'): return 'youtube'
+    if lowered.startswith(('http://', 'https://')): return 'url'
+    return 'text'
+
+
+class DocumentManifest:
+    def __init__(self, course_dir: str):
+        os.makedirs(course_dir, exist_ok=True)
+        self.path = os.path.join(course_dir, MANIFEST_FILENAME)
+        self.is_new = not os.path.exists(self.path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " hash TEXT PRIMARY KEY, name TEXT NOT NULL, source_type TEXT NOT NULL,"
+            " chunk_count INTEGER NOT NULL, token_count INTEGER NOT NULL, ingested_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS web_sources ("
+            " hash TEXT PRIMARY KEY, url TEXT NOT NULL, etag TEXT, last_modified TEXT, content_hash TEXT,"
+            " checked_at REAL NOT NULL, revision INTEGER NOT NULL DEFAULT 0)"
+        )
+        if "revision" not in {row[1] for row in self._conn.execute("PRAGMA table_info(web_sources)")}:
+            self._conn.execute("ALTER TABLE web_sources ADD COLUMN revision INTEGER NOT NULL DEFAULT 0")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS chunk_refs ("
+            " file_hash TEXT NOT NULL, position INTEGER NOT NULL, chunk_id TEXT NOT NULL,"
+            " page_start INTEGER, page_end INTEGER, PRIMARY KEY (file_hash, position));"
+            "CREATE INDEX IF NOT EXISTS idx_chunk_refs_chunk ON chunk_refs(chunk_id);"
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);"
+        )
+        self._conn.commit()
+
+    def upsert(self, file_hash: str, name: str, source_type: str, chunk_count: int, token_count: int,
+               ingested_at: float | None = None):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?, ?)",
+                (file_hash, name, source_type, chunk_count, token_count, ingested_at or time.time()),
+            )
+            self._conn.commit()
+
+    def replace_all(self, entries: list[dict]):
+        """Thay toàn bộ nội dung manifest (dùng khi dựng lại từ collection)."""
+        with self._lock:
+            self._conn.execute("DELETE FROM documents")
+            self._conn.executemany(
+                "INSERT INTO documents VALUES (:hash, :name, :source_type, :chunk_count, :token_count, :ingested_at)",
+                entries,
+            )
+            self._conn.commit()
+
+    def delete(self, file_hash: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM documents WHERE hash = ?", (file_hash,))
+            self._conn.execute("DELETE FROM web_sources WHERE hash = ?", (file_hash,))
+            self._conn.execute("DELETE FROM chunk_refs WHERE file_hash = ?", (file_hash,))
+            self._conn.commit()
+
+    def exists(self, file_hash: str) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM documents WHERE hash = ?", (file_hash,)).fetchone() is not None
+
+    def get(self, file_hash: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM documents WHERE hash = ?", (file_hash,)).fetchone()
+        return dict(row) if row else None
+
+    # --- THAM CHIẾU TÀI LIỆU -> CHUNK ---
+    def add_refs(self, refs: list[tuple[str, int, str, int | None, int | None]]):
+        """Ghi các tham chiếu (file_hash, vị trí, chunk_id, trang đầu, trang cuối)."""
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO chunk_refs VALUES (?, ?, ?, ?, ?)", refs)
+            self._conn.commit()
+
+    def replace_refs(self, refs: list[tuple[str, int, str, int | None, int | None]]):
+        """Thay toàn bộ bảng tham chiếu (dùng khi dựng lại từ collection)."""
+        with self._lock:
+            self._conn.execute("DELETE FROM chunk_refs")
+            self._conn.executemany("INSERT OR REPLACE INTO chunk_refs VALUES (?, ?, ?, ?, ?)", refs)
+            self._conn.commit()
+
+    def has_refs(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM chunk_refs LIMIT 1").fetchone() is not None
+
+    def existing_chunks(self, chunk_ids: list[str]) -> set[str]:
+        """Các chunk_id trong danh sách đã được ít nhất một tài liệu tham chiếu."""
+        unique = list(set(chunk_ids))
+        found = set()
+        with self._lock:
+            for i in range(0, len(unique), 500):
+                part = unique[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT DISTINCT chunk_id FROM chunk_refs WHERE chunk_id IN ({','.join('?' * len(part))})", part
+                ).fetchall()
+                found.update(row[0] for row in rows)
+        return found
+
+    def doc_chunks(self, file_hash: str) -> list[str]:
+        """Các chunk_id của tài liệu theo thứ tự vị trí."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chunk_id FROM chunk_refs WHERE file_hash = ? ORDER BY position", (file_hash,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def delete_refs(self, file_hash: str):
+        """Xóa mọi tham chiếu của tài liệu (chunk được dọn riêng qua `unreferenced`)."""
+        with self._lock:
+            self._conn.execute("DELETE FROM chunk_refs WHERE file_hash = ?", (file_hash,))
+            self._conn.commit()
+
+    def truncate_refs(self, file_hash: str, count: int):
+        """Bỏ các tham chiếu từ vị trí `count` trở đi (tài liệu được ghi lại ngắn hơn bản cũ)."""
+        with self._lock:
+            self._conn.execute("DELETE FROM chunk_refs WHERE file_hash = ? AND position >= ?", (file_hash, count))
+            self._conn.commit()
+
+    def unreferenced(self, chunk_ids: list[str]) -> list[str]:
+        referenced = self.existing_chunks(chunk_ids)
+        return [chunk_id for chunk_id in dict.fromkeys(chunk_ids) if chunk_id not in referenced]
+
+    def chunk_owners(self, chunk_ids: list[str]) -> dict[str, list[dict]]:
+        """Với mỗi chunk, mọi tham chiếu còn lại kèm tên tài liệu, tài liệu nạp sớm nhất đứng đầu."""
+        refs: dict[str, list[dict]] = {}
+        with self._lock:
+            for i in range(0, len(chunk_ids), 500):
+                part = chunk_ids[i:i + 500]
+                rows = self._conn.execute(
+                    "SELECT r.chunk_id, r.file_hash, r.position, r.page_start, r.page_end, d.name FROM chunk_refs r"
+                    " JOIN documents d ON d.hash = r.file_hash"
+                    f" WHERE r.chunk_id IN ({','.join('?' * len(part))}) ORDER BY d.ingested_at, r.file_hash, r.position", part
+                ).fetchall()
+                for row in rows:
+                    refs.setdefault(row[0], []).append(dict(row))
+        return refs
+
+    def shared_chunks(self, file_hashes: list[str] | None = None) -> list[str]:
+        """Các chunk có nhiều hơn một tham chiếu (chỉ xét chunk của `file_hashes` nếu có)."""
+        query = "SELECT chunk_id FROM chunk_refs"
+        if file_hashes is not None:
+            query += (" WHERE chunk_id IN (SELECT chunk_id FROM chunk_refs"
+                      f" WHERE file_hash IN ({','.join('?' * len(file_hashes))}))")
+        with self._lock:
+            rows = self._conn.execute(f"{query} GROUP BY chunk_id HAVING COUNT(*) > 1", file_hashes or []).fetchall()
+        return [row[0] for row in rows]
+
+    def sample_chunks(self, limit: int) -> list[str]:
+        """
+        Tối đa `limit` chunk_id rải đều trên mọi tài liệu (theo thứ tự nạp rồi vị
+        trí), không chỉ các chunk đầu tiên; chunk dùng chung có thể xuất hiện nhiều lần.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chunk_id FROM (SELECT r.chunk_id, ROW_NUMBER() OVER (ORDER BY d.ingested_at, r.file_hash, r.position) - 1 AS n,"
+                " COUNT(*) OVER () AS total FROM chunk_refs r JOIN documents d ON d.hash = r.file_hash)"
+                " WHERE total <= ? OR (n * ?) / total != ((n + 1) * ?) / total ORDER BY n", (limit, limit, limit)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def ref_totals(self) -> dict:
+        """Số tham chiếu (tổng số chunk của mọi tài liệu) và số chunk thực sự được lưu."""
+        with self._lock:
+            row = self._conn.execute("SELECT COUNT(*), COUNT(DISTINCT chunk_id) FROM chunk_refs").fetchone()
+        return {"refs": row[0], "unique_chunks": row[1]}
+
+    # --- DANH SÁCH, NGUỒN WEB & THỐNG KÊ ---
+    def list(self) -> list[dict]:
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM documents ORDER BY ingested_at").fetchall()
+        return [dict(row) for row in rows]
+
+    def get_web_source(self, file_hash: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM web_sources WHERE hash = ?", (file_hash,)).fetchone()
+        return dict(row) if row else None
+
+    def set_web_source(self, file_hash: str, url: str, etag: str | None, last_modified: str | None,
+                       content_hash: str | None, changed: bool = False):
+        """
+        Ghi trạng thái lần tải gần nhất của nguồn web. Chỉ khi `changed` (nội dung
+        tài liệu đã được ghi lại) thì revision mới tăng; ghi hash lần đầu cho một
+        tài liệu cũ không làm đổi dấu vân tay.
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO web_sources (hash, url, etag, last_modified, content_hash, checked_at, revision)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(hash) DO UPDATE SET url = excluded.url, etag = excluded.etag,"
+                " last_modified = excluded.last_modified, content_hash = excluded.content_hash,"
+                " checked_at = excluded.checked_at, revision = revision + excluded.revision",
+                (file_hash, url, etag, last_modified, content_hash, time.time(), int(changed)),
+            )
+            self._conn.commit()
+
+    def get_meta(self, key: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
+            self._conn.commit()
+
+    def totals(self) -> dict:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(chunk_count), 0), COALESCE(SUM(token_count), 0) FROM documents"
+            ).fetchone()
+        return {"doc_count": row[0], "chunk_count": row[1], "token_count": row[2]}
+
+    def fingerprint(self) -> str:
+        """
+        Dấu vân tay của tập tài liệu hiện tại (không phụ thuộc thứ tự nạp). Nguồn
+        web giữ nguyên hash khi được làm mới nên số lần nội dung đã đổi của chúng
+        cũng được tính vào.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT d.hash, w.revision FROM documents d LEFT JOIN web_sources w ON w.hash = d.hash ORDER BY d.hash"
+            ).fetchall()
+        return hashlib.sha256("\n".join(f"{h}:{r}" if r else h for h, r in rows).encode('utf-8')).hexdigest()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    from core.services import service_manager
+
+    parser = argparse.ArgumentParser(description="Công cụ quản lý manifest tài liệu của khóa học.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rebuild = sub.add_parser("rebuild", help="Dựng lại manifest từ collection ChromaDB.")
+    rebuild.add_argument("course_ids", nargs="*", help="Bỏ trống để dựng lại cho mọi khóa học.")
+    refresh = sub.add_parser("refresh", help="Làm mới các nguồn URL/YouTube (chỉ ghi lại các chunk thay đổi).")
+    refresh.add_argument("course_ids", nargs="*", help="Bỏ trống để làm mới mọi khóa học.")
+    args = parser.parse_args()
+
+    for course_id in args.course_ids or [c["id"] for c in service_manager.list_courses()]:
+        if args.command == "rebuild":
+            count = service_manager.rebuild_manifest(course_id)
+            print(f"{course_id}: {count} tài liệu")
+            continue
+        for result in service_manager.refresh_sources(course_id):
+            detail = result["error"] or f"+{result['added']} -{result['removed']} ={result['kept']}"
+            print(f"{course_id}: {result['status']:<9} {result['name']}  {detail}")
@@ -0,0 +1,205 @@
+# pnote-ai-app/core/metrics.py
+
+# ==============================================================================
+# ĐO ĐỘ TRỄ THEO GIAI ĐOẠN (TRACING) & XUẤT METRICS
+#
+# 1. `tracer.span("chat.retrieve")` đo thời gian một giai đoạn và cộng vào
+#    histogram của giai đoạn đó; `tracer.count(...)` tăng một bộ đếm (cache trúng/trượt...).
+# 2. Khi tắt (METRICS_ENABLED = False), span là một context manager rỗng dùng
+#    chung nên chi phí gần như bằng không.
+# 3. Dữ liệu được xuất theo định dạng văn bản của Prometheus: ghi định kỳ ra file
+#    (textfile collector) và/hoặc phục vụ tại http://127.0.0.1:<cổng>/metrics.
+# 4. `summary()` trả về p50/p95 của các mẫu gần đây cho giao diện Insights.
+# ==============================================================================
+
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+from config import METRICS_ENABLED
+
+logger = logging.getLogger(__name__)
+
+# Biên trên (giây) của các bucket histogram, từ vài mili-giây tới một phút.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+RECENT_SAMPLES = 512
+_NOOP = nullcontext()
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    escape = lambda value: str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in sorted(labels.items())) + "}"
+
+
+def _quantile(ordered: list[float], q: float) -> float:
+    """Phân vị theo phương pháp nearest-rank trên danh sách đã sắp xếp."""
+    return ordered[max(math.ceil(q * len(ordered)) - 1, 0)]
+
+
+class _Histogram:
+    __slots__ = ("counts", "total", "count", "recent")
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.total = 0.0
+        self.count = 0
+        self.recent: deque[float] = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, seconds: float):
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        self.total += seconds
+        self.count += 1
+        self.recent.append(seconds)
+
+
+class _Span:
+    __slots__ = ("tracer", "stage", "started")
+
+    def __init__(self, tracer: "Tracer", stage: str):
+        self.tracer = tracer
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.observe(self.stage, time.perf_counter() - self.started)
+        return False
+
+
+class Tracer:
+    def __init__(self, enabled: bool = True, prefix: str = "pnote"):
+        self.enabled = enabled
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._histograms: dict[str, _Histogram] = {}
+        self._counters: dict[tuple[str, tuple], float] = {}
+        self._collectors: list[Callable[[], list[tuple[str, dict, float]]]] = []
+
+    # --- GHI NHẬN ---
+    def span(self, stage: str):
+        """Context manager đo thời gian của giai đoạn `stage` (vd. "ingest.embed")."""
+        return _Span(self, stage) if self.enabled else _NOOP
+
+    def observe(self, stage: str, seconds: float):
+        if not self.enabled: return
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = _Histogram()
+            histogram.observe(seconds)
+
+    def count(self, name: str, value: float = 1, **labels):
+        """Tăng bộ đếm `<prefix>_<name>_total{labels}`."""
+        if not self.enabled: return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def add_collector(self, collect: Callable[[], list[tuple[str, dict, float]]]):
+        """Đăng ký hàm trả về các bộ đếm tích lũy sẵn ở nơi khác, dạng [(tên, labels, giá trị)]."""
+        self._collectors.append(collect)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    # --- ĐỌC & XUẤT ---
+    def summary(self) -> list[dict]:
+        """Thống kê từng giai đoạn: số lần, thời gian trung bình (toàn bộ) và p50/p95 của các mẫu gần đây (ms)."""
+        with self._lock:
+            items = [(stage, h.count, h.total, sorted(h.recent)) for stage, h in self._histograms.items()]
+        rows = []
+        for stage, count, total, recent in sorted(items):
+            rows.append({"stage": stage, "count": count, "mean_ms": total / count * 1000,
+                         "p50_ms": _quantile(recent, 0.5) * 1000, "p95_ms": _quantile(recent, 0.95) * 1000})
+        return rows
+
+    def counters(self) -> list[tuple[str, dict, float]]:
+        with self._lock:
+            rows = [(name, dict(labels), value) for (name, labels), value in self._counters.items()]
+        for collect in self._collectors:
+            try: rows.extend(collect())
+            except Exception as e: logger.warning(f"Không đọc được metrics từ collector: {e}")
+        return rows
+
+    def render_prometheus(self) -> str:
+        """Toàn bộ metrics theo định dạng văn bản của Prometheus (exposition format 0.0.4)."""
+        name = f"{self.prefix}_stage_duration_seconds"
+        lines = [f"# HELP {name} Thời gian của từng giai đoạn xử lý.", f"# TYPE {name} histogram"]
+        with self._lock:
+            snapshot = [(stage, list(h.counts), h.total, h.count) for stage, h in sorted(self._histograms.items())]
+        for stage, counts, total, count in snapshot:
+            cumulative = 0
+            for bound, bucket in zip(BUCKETS, counts):
+                cumulative += bucket
+                lines.append(f"{name}_bucket{_labels({'stage': stage, 'le': bound})} {cumulative}")
+            lines.append(f"{name}_bucket{_labels({'stage': stage, 'le': '+Inf'})} {count}")
+            lines.append(f"{name}_sum{_labels({'stage': stage})} {total:.6f}")
+            lines.append(f"{name}_count{_labels({'stage': stage})} {count}")
+        by_name: dict[str, list[tuple[dict, float]]] = {}
+        for counter, labels, value in self.counters():
+            by_name.setdefault(counter, []).append((labels, value))
+        for counter, series in sorted(by_name.items()):
+            metric = f"{self.prefix}_{counter}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.extend(f"{metric}{_labels(labels)} {value:g}" for labels, value in series)
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        """Ghi metrics ra file (ghi file tạm rồi đổi tên để bên đọc không thấy file dở dang)."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp_path, path)
+
+    def start_exporters(self, textfile_path: str | None, interval: float, http_port: int | None):
+        """Bật các kênh xuất metrics đã cấu hình (gọi một lần cho mỗi tiến trình)."""
+        if not self.enabled: return
+        if textfile_path:
+            def export_loop():
+                while True:
+                    time.sleep(interval)
+                    try: self.write_prometheus(textfile_path)
+                    except Exception as e: logger.warning(f"Không ghi được file metrics: {e}")
+            threading.Thread(target=export_loop, name="pnote-metrics-file", daemon=True).start()
+        if http_port:
+            tracer = self
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.split("?")[0] != "/metrics":
+                        self.send_error(404); return
+                    body = tracer.render_prometheus().encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, *args):
+                    pass
+
+            try:
+                server = ThreadingHTTPServer(("127.0.0.1", http_port), Handler)
+                threading.Thread(target=server.serve_forever, name="pnote-metrics-http", daemon=True).start()
+                logger.info(f"Metrics Prometheus tại http://127.0.0.1:{http_port}/metrics")
+            except OSError as e:
+                logger.warning(f"Không mở được cổng metrics {http_port}: {e}")
+
+
+tracer = Tracer(enabled=METRICS_ENABLED)
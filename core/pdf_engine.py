@@ -0,0 +1,86 @@
+# pnote-ai-app/core/pdf_engine.py
+
+# ==============================================================================
+# BỘ TRÍCH XUẤT PDF THEO TRANG
+#
+# 1. Mỗi trang chỉ được gọi extract_text() đúng một lần.
+# 2. Tài liệu lớn được chia thành các khoảng trang và xử lý song song trong
+#    các tiến trình con (ProcessPoolExecutor do nơi gọi cung cấp).
+# 3. Kết quả là một luồng (số trang, văn bản) để đưa thẳng vào bộ chia chunk,
+#    không cần nối thành một chuỗi khổng lồ.
+# ==============================================================================
+
+import io
+from collections import deque
+from concurrent.futures import Executor
+from itertools import islice
+from typing import BinaryIO, Iterator
+
+from config import PDF_PAGES_PER_TASK, PDF_RANGES_IN_FLIGHT
+
+
+def _as_bytes(source: bytes | BinaryIO) -> bytes:
+    """Đọc toàn bộ nội dung nhị phân (cần thiết để gửi sang tiến trình con)."""
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source)
+    if hasattr(source, 'getvalue'):
+        return source.getvalue()
+    source.seek(0)
+    return source.read()
+
+
+def _open_reader(source: bytes | BinaryIO):
+    from pypdf import PdfReader  # Import khi dùng lần đầu (pypdf làm chậm lúc khởi động).
+    return PdfReader(io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source)
+
+
+def _iter_reader_pages(reader, start: int, stop: int) -> Iterator[tuple[int, str]]:
+    """Trích xuất các trang [start, stop) của reader; số trang bắt đầu từ 1, bỏ qua trang rỗng."""
+    for index in range(start, stop):
+        text = reader.pages[index].extract_text()
+        if text:
+            yield index + 1, text
+
+
+def page_ranges(num_pages: int, pages_per_task: int = PDF_PAGES_PER_TASK) -> list[tuple[int, int]]:
+    """Chia [0, num_pages) thành các khoảng liên tiếp có tối đa `pages_per_task` trang."""
+    return [(start, min(start + pages_per_task, num_pages)) for start in range(0, num_pages, pages_per_task)]
+
+
+def extract_page_range(data: bytes, start: int, stop: int) -> list[tuple[int, str]]:
+    """Hàm worker cho tiến trình con: trích xuất các trang [start, stop) của một PDF."""
+    return list(_iter_reader_pages(_open_reader(data), start, stop))
+
+
+def _iter_futures(executor: Executor, data: bytes, futures: deque, ranges: Iterator[tuple[int, int]]) -> Iterator[tuple[int, str]]:
+    """Trả kết quả các khoảng theo thứ tự; mỗi khoảng đã lấy xong thì gửi thêm một khoảng mới."""
+    try:
+        while futures:
+            pages = futures.popleft().result()
+            if (next_range := next(ranges, None)) is not None:
+                futures.append(executor.submit(extract_page_range, data, *next_range))
+            yield from pages
+    finally:
+        for future in futures:
+            future.cancel()  # Luồng bị bỏ dở: không trích xuất tiếp các khoảng còn chờ.
+
+
+def iter_pdf_pages(source: bytes | BinaryIO, executor: Executor | None = None,
+                   pages_per_task: int = PDF_PAGES_PER_TASK,
+                   max_in_flight: int = PDF_RANGES_IN_FLIGHT) -> Iterator[tuple[int, str]]:
+    """
+    Trả về luồng (số trang, văn bản) của một PDF theo đúng thứ tự trang.
+
+    Không có `executor`: đọc tuần tự trong tiến trình hiện tại, từng trang một.
+    Có `executor`: tối đa `max_in_flight` khoảng `pages_per_task` trang đầu tiên
+    được gửi cho executor ngay khi gọi hàm (PDF nhỏ là một khoảng duy nhất), các
+    khoảng sau được gửi dần khi luồng được đọc; kết quả trả về theo thứ tự.
+    """
+    reader = _open_reader(source)
+    num_pages = len(reader.pages)
+    if executor is None:
+        return _iter_reader_pages(reader, 0, num_pages)
+    data = _as_bytes(source)
+    ranges = iter(page_ranges(num_pages, pages_per_task))
+    futures = deque(executor.submit(extract_page_range, data, start, stop) for start, stop in islice(ranges, max(1, max_in_flight)))
+    return _iter_futures(executor, data, futures, ranges)
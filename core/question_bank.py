@@ -0,0 +1,279 @@
+# pnote-ai-app/core/question_bank.py
+
+# ==============================================================================
+# NGÂN HÀNG CÂU HỎI CỦA KHÓA HỌC (TRẮC NGHIỆM & TỰ LUẬN)
+#
+# 1. Mỗi tài liệu được chia thành các nhóm chunk liên tiếp vừa ngân sách token;
+#    mỗi nhóm là một lời gọi mô hình sinh vài câu hỏi, và mọi nhóm được gọi song
+#    song, nên câu hỏi phủ toàn bộ tài liệu thay vì chỉ phần đầu khóa học.
+# 2. Chunk trong prompt được đánh số để mô hình cho biết câu hỏi dựa vào đoạn
+#    nào; mỗi câu hỏi được lưu cùng tài liệu nguồn và ID chunk đó trong
+#    user_data/<course>/question_bank.sqlite3.
+# 3. Bộ câu hỏi với số câu bất kỳ được lấy mẫu ngẫu nhiên từ ngân hàng (xen kẽ
+#    giữa các tài liệu) mà không cần gọi mô hình.
+# 4. Chỉ nhóm chunk chưa có câu hỏi (của tài liệu mới thêm, hoặc nội dung đã đổi)
+#    mới phải sinh thêm; đổi prompt hay mô hình tạo ra một "generator" mới và ngân
+#    hàng được sinh lại. Yêu cầu đầu tiên chỉ chờ sinh đủ số nhóm cho số câu được
+#    hỏi (mỗi tài liệu một nhóm ngẫu nhiên); các nhóm còn lại được sinh nốt trong nền.
+# 5. Khi ngân hàng ít câu hơn số câu được yêu cầu (khóa học nhỏ), các tài liệu được
+#    sinh thêm từng lượt, prompt kèm các câu hỏi đã có để mô hình không lặp lại,
+#    tối đa QUESTION_BANK_MAX_ROUNDS lượt cho mỗi tài liệu.
+# ==============================================================================
+
+import hashlib
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+QUESTION_BANK_FILENAME = "question_bank.sqlite3"
+
+
+class QuestionBank:
+    def __init__(self, course_dir: str):
+        os.makedirs(course_dir, exist_ok=True)
+        self.path = os.path.join(course_dir, QUESTION_BANK_FILENAME)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS questions ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, generator TEXT NOT NULL, file_hash TEXT NOT NULL,"
+            " source TEXT NOT NULL, chunk_ids TEXT NOT NULL, question TEXT NOT NULL, payload TEXT NOT NULL,"
+            " created_at REAL NOT NULL, UNIQUE (kind, generator, file_hash, question));"
+            "CREATE INDEX IF NOT EXISTS idx_questions_file ON questions(file_hash);"
+            # Tài liệu đã được sinh câu hỏi (kể cả khi mô hình không trả về câu nào hợp lệ).
+            "CREATE TABLE IF NOT EXISTS coverage ("
+            " kind TEXT NOT NULL, generator TEXT NOT NULL, file_hash TEXT NOT NULL, groups INTEGER NOT NULL,"
+            " created_at REAL NOT NULL, rounds INTEGER NOT NULL DEFAULT 1, PRIMARY KEY (kind, generator, file_hash));"
+            # Các nhóm chunk đã được sinh câu hỏi của tài liệu chưa được phủ hết.
+            "CREATE TABLE IF NOT EXISTS group_coverage ("
+            " kind TEXT NOT NULL, generator TEXT NOT NULL, file_hash TEXT NOT NULL, group_index INTEGER NOT NULL,"
+            " created_at REAL NOT NULL, PRIMARY KEY (kind, generator, file_hash, group_index));"
+        )
+        if "rounds" not in {row[1] for row in self._conn.execute("PRAGMA table_info(coverage)")}:
+            self._conn.execute("ALTER TABLE coverage ADD COLUMN rounds INTEGER NOT NULL DEFAULT 1")
+        self._conn.commit()
+
+    def covered(self, kind: str, generator: str) -> dict[str, int]:
+        """Các tài liệu đã được sinh câu hỏi và số lượt đã sinh cho mỗi tài liệu."""
+        with self._lock:
+            rows = self._conn.execute("SELECT file_hash, rounds FROM coverage WHERE kind = ? AND generator = ?", (kind, generator)).fetchall()
+        return dict(rows)
+
+    def covered_groups(self, kind: str, generator: str, file_hash: str) -> set[int]:
+        """Chỉ số các nhóm chunk của tài liệu đã được sinh câu hỏi."""
+        with self._lock:
+            rows = self._conn.execute("SELECT group_index FROM group_coverage WHERE kind = ? AND generator = ? AND file_hash = ?",
+                                      (kind, generator, file_hash)).fetchall()
+        return {row[0] for row in rows}
+
+    def add_group(self, kind: str, generator: str, file_hash: str, source: str, group_index: int, groups: int,
+                  questions: list[tuple[dict, list[str]]]):
+        """
+        Ghi các câu hỏi của một nhóm chunk (trong `groups` nhóm của tài liệu); tài
+        liệu được đánh dấu đã phủ khi mọi nhóm của nó đã có câu hỏi.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO questions(kind, generator, file_hash, source, chunk_ids, question, payload, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(kind, generator, file_hash, source, json.dumps(chunk_ids), payload["question"].strip(),
+                  json.dumps(payload, ensure_ascii=False), now) for payload, chunk_ids in questions])
+            self._conn.execute("INSERT OR IGNORE INTO group_coverage(kind, generator, file_hash, group_index, created_at) VALUES (?, ?, ?, ?, ?)",
+                               (kind, generator, file_hash, group_index, now))
+            done = self._conn.execute("SELECT COUNT(*) FROM group_coverage WHERE kind = ? AND generator = ? AND file_hash = ?",
+                                      (kind, generator, file_hash)).fetchone()[0]
+            if done >= groups:
+                self._conn.execute("INSERT OR IGNORE INTO coverage(kind, generator, file_hash, groups, created_at) VALUES (?, ?, ?, ?, ?)",
+                                   (kind, generator, file_hash, groups, now))
+            self._conn.commit()
+
+    def add_round(self, kind: str, generator: str, file_hash: str, source: str, questions: list[tuple[dict, list[str]]]) -> int:
+        """Ghi câu hỏi của một lượt sinh thêm cho tài liệu; trả về số câu hỏi mới (không trùng câu đã có)."""
+        now = time.time()
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO questions(kind, generator, file_hash, source, chunk_ids, question, payload, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(kind, generator, file_hash, source, json.dumps(chunk_ids), payload["question"].strip(),
+                  json.dumps(payload, ensure_ascii=False), now) for payload, chunk_ids in questions])
+            added = self._conn.total_changes - before
+            self._conn.execute("UPDATE coverage SET rounds = rounds + 1 WHERE kind = ? AND generator = ? AND file_hash = ?",
+                               (kind, generator, file_hash))
+            self._conn.commit()
+        return added
+
+    def asked(self, kind: str, generator: str, file_hashes: list[str]) -> dict[str, list[tuple[str, list[str]]]]:
+        """Các câu hỏi (nội dung, ID chunk nguồn) đã có của từng tài liệu."""
+        wanted = set(file_hashes)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT file_hash, question, chunk_ids FROM questions WHERE kind = ? AND generator = ? ORDER BY id",
+                (kind, generator)).fetchall()
+        asked: dict[str, list[tuple[str, list[str]]]] = {}
+        for file_hash, question, chunk_ids in rows:
+            if file_hash in wanted:
+                asked.setdefault(file_hash, []).append((question, json.loads(chunk_ids)))
+        return asked
+
+    def sample(self, kind: str, generator: str, file_hashes: list[str], count: int, rng: random.Random | None = None) -> list[dict]:
+        """
+        Lấy ngẫu nhiên `count` câu hỏi của các tài liệu `file_hashes`, lần lượt
+        xen kẽ giữa các tài liệu để bộ câu hỏi trải đều trên cả khóa học.
+        """
+        rng = rng or random.Random()
+        wanted = set(file_hashes)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT file_hash, source, chunk_ids, payload FROM questions WHERE kind = ? AND generator = ?",
+                (kind, generator)).fetchall()
+        by_doc: dict[str, list] = {}
+        for row in rows:
+            if row[0] in wanted:
+                by_doc.setdefault(row[0], []).append(row)
+        pools = list(by_doc.values())
+        rng.shuffle(pools)
+        for pool in pools:
+            rng.shuffle(pool)
+        picked = []
+        while pools and len(picked) < count:
+            for pool in pools:
+                if len(picked) == count: break
+                picked.append(pool.pop())
+            pools = [pool for pool in pools if pool]
+        return [{**json.loads(payload), "file_hash": file_hash, "source": source, "chunk_ids": json.loads(chunk_ids)}
+                for file_hash, source, chunk_ids, payload in picked]
+
+    def count(self, kind: str, generator: str, file_hashes: list[str] | None = None) -> int:
+        """Số câu hỏi trong ngân hàng (chỉ của các tài liệu `file_hashes` nếu có)."""
+        with self._lock:
+            rows = self._conn.execute("SELECT file_hash, COUNT(*) FROM questions WHERE kind = ? AND generator = ? GROUP BY file_hash",
+                                      (kind, generator)).fetchall()
+        wanted = None if file_hashes is None else set(file_hashes)
+        return sum(n for file_hash, n in rows if wanted is None or file_hash in wanted)
+
+    def delete_doc(self, file_hash: str):
+        """Bỏ câu hỏi của một tài liệu đã bị xóa hoặc đổi nội dung (sẽ được sinh lại khi cần)."""
+        with self._lock:
+            self._conn.execute("DELETE FROM questions WHERE file_hash = ?", (file_hash,))
+            self._conn.execute("DELETE FROM coverage WHERE file_hash = ?", (file_hash,))
+            self._conn.execute("DELETE FROM group_coverage WHERE file_hash = ?", (file_hash,))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class QuestionGenerator:
+    """
+    Sinh câu hỏi cho các tài liệu theo nhóm chunk. `generate_batch(prompts)` gọi
+    mô hình song song và trả về JSON (hoặc Exception) tại vị trí của từng prompt.
+    `extra_round_prefix` (có chỗ {questions}) đứng trước prompt của lượt sinh thêm.
+    """
+
+    def __init__(self, generate_batch: Callable[[list[str]], list[str | Exception]], tokenizer, kind: str,
+                 prompt_template: str, questions_per_group: int, group_tokens: int, model_name: str,
+                 extra_round_prefix: str = ""):
+        self.generate_batch = generate_batch
+        self.tokenizer = tokenizer
+        self.kind = kind
+        self.prompt_template = prompt_template
+        self.extra_round_prefix = extra_round_prefix
+        self.questions_per_group = questions_per_group
+        self.group_tokens = group_tokens
+        # Câu hỏi sinh bởi prompt/mô hình khác không được lấy chung với bộ hiện tại.
+        self.generator = hashlib.sha256(f"{model_name}\n{questions_per_group}\n{prompt_template}".encode("utf-8")).hexdigest()[:16]
+
+    def group(self, records: list[tuple[str, str]]) -> list[list[tuple[str, str]]]:
+        """Gom các chunk (ID, văn bản) liên tiếp thành nhóm có tổng số token không vượt ngân sách."""
+        groups, current, used = [], [], 0
+        for record in records:
+            tokens = len(self.tokenizer.encode(record[1]))
+            if current and used + tokens > self.group_tokens:
+                groups.append(current)
+                current, used = [], 0
+            current.append(record)
+            used += tokens
+        if current:
+            groups.append(current)
+        return groups
+
+    def _prompt(self, group: list[tuple[str, str]], asked: list[tuple[str, list[str]]] | None = None) -> str:
+        context = "\n\n".join(f"[{i}]\n{text}" for i, (_, text) in enumerate(group, 1))
+        prompt = self.prompt_template.format(num_questions=self.questions_per_group, context=context)
+        group_ids = {chunk_id for chunk_id, _ in group}
+        if asked and (previous := [question for question, chunk_ids in asked if group_ids.intersection(chunk_ids)]):
+            prompt = self.extra_round_prefix.format(questions="\n".join(f"- {q}" for q in previous)) + prompt
+        return prompt
+
+    def _parse(self, response: str, group: list[tuple[str, str]]) -> list[tuple[dict, list[str]]]:
+        """Các câu hỏi hợp lệ trong câu trả lời JSON, kèm ID chunk nguồn (cả nhóm nếu mô hình không chỉ rõ đoạn)."""
+        items = json.loads(response)
+        if isinstance(items, dict):
+            items = next((value for value in items.values() if isinstance(value, list)), [])
+        questions = []
+        for item in items:
+            if isinstance(item, str):
+                item = {"question": item}
+            if not isinstance(item, dict) or not isinstance(item.get("question"), str) or not item["question"].strip():
+                continue
+            if self.kind == "quiz" and not (isinstance(item.get("options"), list) and len(item["options"]) >= 2
+                                            and item.get("answer") in item["options"]):
+                continue
+            index = item.pop("source_chunk", None)
+            if isinstance(index, int) and 1 <= index <= len(group):
+                chunk_ids = [group[index - 1][0]]
+            else:
+                chunk_ids = [chunk_id for chunk_id, _ in group]
+            questions.append((item, chunk_ids))
+        return questions
+
+    def generate_groups(self, groups: list[list[tuple[str, str]]],
+                        asked: list[list[tuple[str, list[str]]] | None] | None = None) -> list[list[tuple[dict, list[str]]] | Exception]:
+        """
+        Sinh câu hỏi cho các nhóm chunk trong một lô song song. `asked[i]` là các câu
+        hỏi đã có của tài liệu chứa nhóm thứ i (lượt sinh thêm). Trả về câu hỏi (hoặc
+        lỗi) tại vị trí của từng nhóm.
+        """
+        asked = asked or [None] * len(groups)
+        responses = self.generate_batch([self._prompt(group, previous) for group, previous in zip(groups, asked)]) if groups else []
+        results = []
+        for group, response in zip(groups, responses):
+            try:
+                if isinstance(response, Exception): raise response
+                results.append(self._parse(response, group))
+            except Exception as e:
+                logger.warning(f"Không sinh được câu hỏi ({self.kind}) cho một nhóm chunk: {e}")
+                results.append(e)
+        return results
+
+    def generate(self, documents: list[dict], load_records: Callable[[str], list[tuple[str, str]]],
+                 asked: dict[str, list[tuple[str, list[str]]]] | None = None) -> tuple[dict[str, tuple[int, list]], list[Exception]]:
+        """
+        Sinh câu hỏi cho `documents` (danh sách {"hash", "name"}): mọi nhóm chunk của
+        mọi tài liệu được gửi trong một lô song song. `asked` là các câu hỏi đã có của
+        từng tài liệu (lượt sinh thêm). Trả về {hash: (số nhóm, câu hỏi)} cho các tài
+        liệu mà mọi nhóm đều thành công, và danh sách lỗi.
+        """
+        asked = asked or {}
+        tasks = [(doc["hash"], group) for doc in documents for group in self.group(load_records(doc["hash"]))]
+        outcomes = self.generate_groups([group for _, group in tasks], [asked.get(file_hash) for file_hash, _ in tasks])
+        results: dict[str, tuple[int, list]] = {}
+        failed, errors = set(), []
+        for (file_hash, _), outcome in zip(tasks, outcomes):
+            if isinstance(outcome, Exception):
+                failed.add(file_hash)
+                errors.append(outcome)
+                continue
+            groups, questions = results.get(file_hash, (0, []))
+            results[file_hash] = (groups + 1, questions + outcome)
+        return {file_hash: result for file_hash, result in results.items() if file_hash not in failed}, errors
@@ -19,15 +19,8 @@ __import__('pysqlite3')
 import sys
 sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
 
-import google.api_core.exceptions
-import google.generativeai as genai
-import chromadb
-from pypdf import PdfReader
-import docx
-import requests
-from bs4 import BeautifulSoup
-from youtube_transcript_api import YouTubeTranscriptApi
-import tiktoken
+# google.generativeai, chromadb và tiktoken được import khi dùng lần đầu (xem các
+# thuộc tính @lazy_resource của ServiceManager) để trang đầu tiên hiển thị nhanh.
 import time
 import re
 import json
@@ -36,13 +29,47 @@ import hashlib
 import os
 import shutil
 import logging
+import threading
+import multiprocessing
+import subprocess
+import heapq
+import random
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Callable, Iterable, Iterator
 
 # Import cấu hình từ file config.py
 from config import (
     GEMINI_API_KEY, TEXT_CHUNK_SIZE, TEXT_CHUNK_OVERLAP, VECTOR_DB_SEARCH_RESULTS,
-    CHROMA_DB_PATH, USER_DATA_PATH, DEFAULT_MODEL, DEFAULT_SYSTEM_PROMPT,
-    SUMMARY_PROMPT_TEMPLATE, QUIZ_PROMPT_TEMPLATE
+    RETRIEVAL_MODE, HYBRID_CANDIDATES, RRF_K, BM25_MAX_DF_RATIO, CONTEXT_TOKEN_BUDGETS, CHAT_CONTEXT_CANDIDATES, CONTEXT_MMR_LAMBDA, CONTEXT_CANDIDATE_FACTOR, CHUNK_INSERT_BATCH_SIZE, MANIFEST_REBUILD_RETRY_SECONDS, INGEST_PROCESS_WORKERS, INGEST_THREAD_WORKERS, CHROMA_DB_PATH,
+    EMBEDDING_MODEL_NAME, EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES, USER_DATA_PATH, DEFAULT_MODEL, DEFAULT_SYSTEM_PROMPT,
+    QUIZ_PROMPT_TEMPLATE, KEYWORDS_PROMPT_TEMPLATE, STUDY_QUESTIONS_PROMPT_TEMPLATE,
+    SUMMARY_PROMPT_TEMPLATE, PARTIAL_SUMMARY_PROMPT_TEMPLATE,
+    RESULT_CACHE_MEMORY_MAX_BYTES, RESULT_CACHE_DISK_MAX_BYTES,
+    ANSWER_CACHE_SIMILARITY_THRESHOLD, ANSWER_CACHE_MAX_ENTRIES,
+    LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE, LLM_MAX_CONCURRENCY, LLM_MAX_RETRIES,
+    LLM_BACKOFF_BASE_SECONDS, LLM_BACKOFF_MAX_SECONDS,
+    METRICS_TEXTFILE_PATH, METRICS_EXPORT_INTERVAL_SECONDS, METRICS_HTTP_PORT,
+    INGEST_JOBS_PATH, INGEST_JOB_WORKERS, INGEST_JOB_MAX_ATTEMPTS, INGEST_JOB_POLL_SECONDS, INGEST_JOB_BATCH_SIZE,
+    INGEST_JOB_RUNNER, INGEST_WORKER_LOCK_PATH, INGEST_WORKER_IDLE_SECONDS, INGEST_WORKER_METRICS_TEXTFILE_PATH, ROOT_DIR,
+    WEB_REFRESH_MAX_WORKERS, WEB_REFRESH_INTERVAL_SECONDS, FETCH_MAX_BYTES, FETCH_TIMEOUT_SECONDS,
+    CHAT_HISTORY_TOKEN_BUDGET, CHAT_HISTORY_KEEP_RATIO, CHAT_HISTORY_PAGE_SIZE, CHAT_RECENT_CONVERSATIONS, CHAT_HISTORY_SUMMARY_PROMPT_TEMPLATE,
+    QUESTION_BANK_QUESTIONS_PER_GROUP, QUESTION_BANK_MAX_ROUNDS, QUESTION_BANK_FILL_GROUPS, QUESTION_BANK_EXTRA_ROUND_PREFIX, GLOBAL_SEARCH_RESULTS, GLOBAL_SEARCH_MAX_WORKERS, SNAPSHOT_BATCH_SIZE
 )
+from core.chunking import iter_tagged_chunks, iter_chunk_batches
+from core import extractors, pdf_engine, snapshot, vector_index
+from core.embedding_cache import EmbeddingCache
+from core.manifest import DocumentManifest, infer_source_type
+from core.summarizer import MapReduceSummarizer
+from core.cache import ResultCache, make_cache_key
+from core.answer_cache import SemanticAnswerCache, replay_stream
+from core.conversation import ConversationMemory, ConversationStore
+from core.question_bank import QuestionBank, QuestionGenerator
+from core.bm25 import BM25Index, reciprocal_rank_fusion
+from core.context import ContextPacker, representative_order
+from core.llm import LLMGateway, llm_error_message
+from core.singleflight import SingleFlight
+from core.metrics import tracer
+from core.jobs import FileLock, JobQueue, StoredUpload, save_upload
 
 
 # --- CÀI ĐẶT HỆ THỐNG LOGGING ---
@@ -62,6 +89,58 @@ def calculate_file_hash(file_bytes: bytes) -> str:
     """Tính toán mã hash SHA256 cho nội dung của một file để chống trùng lặp."""
     return hashlib.sha256(file_bytes).hexdigest()
 
+def source_key(source_data) -> str:
+    """Khóa chống trùng của một nguồn: hash nội dung với file tải lên, slug với URL."""
+    return calculate_file_hash(source_data.getvalue()) if hasattr(source_data, 'getvalue') else slugify(source_data)
+
+def content_chunk_id(chunk: str) -> str:
+    """ID chunk theo hash nội dung: chunk giống hệt nhau trong một khóa học dùng chung một bản ghi."""
+    return hashlib.sha256(chunk.encode('utf-8')).hexdigest()
+
+def chunk_index(chunk_id: str) -> int:
+    """Lấy chỉ số thứ tự của chunk từ ID kiểu cũ dạng '<tên>-<chỉ số>-<timestamp>' (ID theo nội dung trả về 0)."""
+    parts = chunk_id.rsplit('-', 2)
+    return int(parts[-2]) if len(parts) == 3 and parts[-2].isdigit() else 0
+
+# Các trường của một tham chiếu dùng chung, ghi trong metadata "shared_refs" của chunk dưới dạng JSON.
+SHARED_REF_FIELDS = ("file_hash", "name", "position", "page_start", "page_end")
+# Khóa meta trong manifest: metadata "shared_refs" đã được đồng bộ cho các chunk dùng chung sẵn có.
+SHARED_REFS_SYNCED_KEY = "shared_refs_synced"
+# Khóa meta trong manifest: manifest đã được dựng (lại) từ collection thành công.
+MANIFEST_REBUILT_KEY = "manifest_rebuilt"
+# ID không có thật dùng cho lệnh xóa rỗng buộc ChromaDB đọc lại thay đổi của tiến trình worker.
+INGEST_SYNC_CHUNK_ID = "__pnote_sync__"
+
+def chunk_refs_from_metadata(chunk_id: str, meta: dict | None) -> list[dict]:
+    """
+    Mọi tham chiếu tới chunk ghi trong metadata của nó: tài liệu sở hữu (file_hash,
+    source, position, trang) cùng các tài liệu dùng chung trong "shared_refs".
+    """
+    if not meta or 'file_hash' not in meta: return []
+    owner = {"file_hash": meta['file_hash'], "name": meta.get('source', ''),
+             "position": meta.get('position', chunk_index(chunk_id)),
+             "page_start": meta.get('page_start'), "page_end": meta.get('page_end')}
+    return [owner, *(dict(zip(SHARED_REF_FIELDS, ref)) for ref in json.loads(meta.get('shared_refs') or '[]'))]
+
+class lazy_resource:
+    """
+    Giống functools.cached_property nhưng việc khởi tạo có khóa riêng cho từng
+    thuộc tính, để nhiều phiên Streamlit truy cập cùng lúc chỉ tạo tài nguyên một lần.
+    """
+    def __init__(self, factory: Callable):
+        self.factory = factory
+        self.name = factory.__name__
+        self.lock = threading.Lock()
+        self.__doc__ = factory.__doc__
+
+    def __get__(self, instance, owner=None):
+        if instance is None: return self
+        with self.lock:
+            if self.name not in instance.__dict__:
+                instance.__dict__[self.name] = self.factory(instance)
+        # Từ lần sau, giá trị trong instance.__dict__ được dùng trực tiếp, không qua khóa.
+        return instance.__dict__[self.name]
+
 
 # --- LỚP QUẢN LÝ DỊCH VỤ CHÍNH (SINGLETON) ---
 
@@ -76,80 +155,437 @@ class ServiceManager:
 
     def __init__(self):
         if self._initialized: return
-        self.chroma_client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
-        self.tokenizer = tiktoken.get_encoding("cl100k_base")
-        if GEMINI_API_KEY:
-            genai.configure(api_key=GEMINI_API_KEY)
-        else:
+        # ChromaDB, tokenizer, embedding và Gemini được khởi tạo khi dùng lần đầu (lazy_resource).
+        self.result_cache = ResultCache(USER_DATA_PATH, RESULT_CACHE_MEMORY_MAX_BYTES, RESULT_CACHE_DISK_MAX_BYTES)
+        self.in_flight = SingleFlight()
+        self._manifests: dict[str, DocumentManifest] = {}
+        self._answer_caches: dict[str, SemanticAnswerCache] = {}
+        self._chat_stores: dict[str, ConversationStore] = {}
+        self._question_banks: dict[str, QuestionBank] = {}
+        self._bm25_indexes: dict[str, BM25Index] = {}
+        self._manifests_lock = threading.Lock()
+        self._manifest_retry_at: dict[str, float] = {}
+        self._chunk_locks: dict[str, FileLock] = {}
+        self._versions: dict[str | None, int] = {}
+        self._versions_lock = threading.Lock()
+        self._warm_up_thread: threading.Thread | None = None
+        self._warmed_courses: set[str] = set()
+        self._job_workers: list[threading.Thread] = []
+        self._jobs_wakeup = threading.Event()
+        self._jobs_stop = threading.Event()
+        self._job_worker_process: subprocess.Popen | None = None
+        self._ingest_synced: dict[str, float] = {}
+        self._question_bank_fills: dict[tuple[str, str], threading.Thread] = {}
+        self._question_groups_claimed: dict[tuple[str, str], set[tuple[str, int]]] = {}
+        tracer.add_collector(self._embedding_cache_counters)
+        if not GEMINI_API_KEY:
             logger.warning("GEMINI_API_KEY chưa được cấu hình. Các tính năng AI sẽ không hoạt động.")
         self._initialized = True
         logger.info("ServiceManager đã được khởi tạo.")
 
+    # --- NHÓM TÀI NGUYÊN KHỞI TẠO LƯỜI ---
+    @lazy_resource
+    def chroma_client(self):
+        import chromadb
+        return chromadb.PersistentClient(path=CHROMA_DB_PATH)
+
+    @lazy_resource
+    def tokenizer(self):
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+
+    @lazy_resource
+    def embedder(self) -> EmbeddingCache:
+        """Embedding được tính qua cache dùng chung rồi truyền thẳng cho ChromaDB."""
+        from chromadb.utils import embedding_functions
+        return EmbeddingCache(
+            EMBEDDING_CACHE_PATH, embedding_functions.DefaultEmbeddingFunction(),
+            EMBEDDING_MODEL_NAME, EMBEDDING_CACHE_MAX_ENTRIES
+        )
+
+    @lazy_resource
+    def context_packer(self) -> ContextPacker:
+        return ContextPacker(self.tokenizer)
+
+    @lazy_resource
+    def ingest_pool(self) -> ProcessPoolExecutor:
+        """
+        Process pool trích xuất file dùng chung cho mọi lần nạp. Dùng "spawn" vì
+        pool được dùng từ nhiều luồng (phiên Streamlit, worker hàng đợi): fork một
+        tiến trình nhiều luồng có thể làm tiến trình con kẹt ở khóa đang bị giữ.
+        """
+        return ProcessPoolExecutor(max_workers=INGEST_PROCESS_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+
+    @lazy_resource
+    def llm(self) -> LLMGateway:
+        """Mọi lời gọi Gemini đi qua cổng này: tái sử dụng model, giới hạn tốc độ và thử lại."""
+        import google.generativeai as genai
+        if GEMINI_API_KEY:
+            genai.configure(api_key=GEMINI_API_KEY)
+        return LLMGateway(
+            genai.GenerativeModel, self.tokenizer, LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE,
+            LLM_MAX_CONCURRENCY, LLM_MAX_RETRIES, LLM_BACKOFF_BASE_SECONDS, LLM_BACKOFF_MAX_SECONDS
+        )
+
+    def warm_up(self, background: bool = True) -> threading.Thread | None:
+        """
+        Bật các kênh xuất metrics, nạp trước các tài nguyên nặng (ChromaDB,
+        tokenizer, mô hình embedding, Gemini, thư viện trích xuất) và chạy tiếp hàng
+        đợi nạp tài liệu. Gọi sau khi trang đầu tiên đã hiển thị; chỉ chạy một lần
+        cho mỗi tiến trình.
+        """
+        def run():
+            started = time.perf_counter()
+            tracer.start_exporters(METRICS_TEXTFILE_PATH, METRICS_EXPORT_INTERVAL_SECONDS, METRICS_HTTP_PORT)
+            for name in ("chroma_client", "tokenizer", "context_packer", "llm", "embedder"):
+                try: getattr(self, name)
+                except Exception as e: logger.warning(f"Warm-up: không khởi tạo được {name}: {e}")
+            try:
+                self.embedder.embed_fn(["warm-up"])  # Nạp mô hình ONNX, bỏ qua cache embedding.
+                extractors.preload()
+            except Exception as e: logger.warning(f"Warm-up: {e}")
+            # Các job nạp tài liệu chưa xong từ lần chạy trước được chạy tiếp.
+            if self.jobs.has_pending(): self.start_job_workers()
+            if WEB_REFRESH_INTERVAL_SECONDS:
+                threading.Thread(target=self._refresh_loop, name="pnote-web-refresh", daemon=True).start()
+            logger.info(f"Warm-up hoàn tất sau {time.perf_counter() - started:.2f}s.")
+
+        with self._versions_lock:
+            if self._warm_up_thread is not None: return self._warm_up_thread
+            self._warm_up_thread = threading.Thread(target=run, name="pnote-warm-up", daemon=True)
+        if background:
+            self._warm_up_thread.start()
+        else:
+            self._warm_up_thread.run()
+        return self._warm_up_thread
+
+    def warm_course(self, course_id: str, background: bool = True) -> threading.Thread | None:
+        """
+        Chuẩn bị một khóa học khi nó được chọn lần đầu: chỉnh ef_search theo kích
+        thước corpus, mở manifest và chỉ mục BM25, rồi chạy một truy vấn vector để
+        ChromaDB nạp chỉ mục HNSW vào bộ nhớ (truy vấn đầu tiên của người dùng không
+        phải chờ). Chỉ chạy một lần cho mỗi khóa học trong mỗi tiến trình.
+        """
+        def run():
+            try:
+                with tracer.span("warm_course"):
+                    collection = self.chroma_client.get_collection(name=course_id)
+                    count = collection.count()
+                    vector_index.tune(collection, count)
+                    self._get_manifest(course_id)
+                    self._get_bm25(course_id)
+                    if count:
+                        sample = collection.get(limit=1, include=["embeddings"])["embeddings"]
+                        collection.query(query_embeddings=[sample[0]], n_results=1, include=[])
+            except Exception as e:
+                logger.warning(f"Không warm-up được khóa học {course_id}: {e}")
+
+        with self._versions_lock:
+            if course_id in self._warmed_courses: return None
+            self._warmed_courses.add(course_id)
+        thread = threading.Thread(target=run, name=f"pnote-warm-{course_id}", daemon=True)
+        if background:
+            thread.start()
+        else:
+            thread.run()
+        return thread
+
     # --- NHÓM HÀM QUẢN LÝ CACHE ---
-    def _get_cache_path(self, course_id: str, feature_name: str) -> str:
-        """Tạo đường dẫn cho file cache dựa trên ID khóa học và tên tính năng."""
-        cache_dir = os.path.join(USER_DATA_PATH, course_id, "cache")
-        os.makedirs(cache_dir, exist_ok=True)
-        return os.path.join(cache_dir, f"{feature_name}.json")
-
-    def _save_to_cache(self, path: str, data: any):
-        """Lưu dữ liệu vào file cache dưới dạng JSON."""
-        try:
-            with open(path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=4)
-        except Exception as e:
-            logger.error(f"Không thể lưu cache vào {path}: {e}")
+    def _cache_key(self, course_id: str, template: str, params: dict | None = None) -> str:
+        """
+        Khóa cache gắn với tập tài liệu hiện tại của khóa học: thêm/xóa tài liệu
+        làm khóa thay đổi nên kết quả cũ tự động không còn khớp.
+        """
+        return make_cache_key(self._get_manifest(course_id).fingerprint(), template, DEFAULT_MODEL, params)
 
-    def _load_from_cache(self, path: str) -> any:
-        """Đọc dữ liệu từ file cache nếu nó tồn tại."""
-        if not os.path.exists(path):
-            return None
-        try:
-            with open(path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, IOError) as e:
-            logger.error(f"Không thể đọc cache từ {path}: {e}")
-            return None
-            
-    def _invalidate_cache(self, course_id: str):
-        """Xóa toàn bộ cache của một khóa học khi có sự thay đổi về tài liệu."""
-        cache_dir = os.path.join(USER_DATA_PATH, course_id, "cache")
-        if os.path.isdir(cache_dir):
+    # --- NHÓM HÀM PHIÊN BẢN DỮ LIỆU ---
+    def data_version(self, course_id: str | None = None) -> int:
+        """
+        Bộ đếm phiên bản dữ liệu của khóa học (None: danh sách khóa học), tăng mỗi
+        khi tài liệu/khóa học thay đổi. Giao diện dùng nó làm khóa memoization.
+        """
+        with self._versions_lock:
+            return self._versions.get(course_id, 0)
+
+    def _bump_version(self, *course_ids: str | None):
+        with self._versions_lock:
+            for course_id in course_ids:
+                self._versions[course_id] = self._versions.get(course_id, 0) + 1
+
+    # --- NHÓM HÀM QUẢN LÝ MANIFEST TÀI LIỆU ---
+    def _get_manifest(self, course_id: str) -> DocumentManifest:
+        """
+        Mở (và giữ lại) manifest của khóa học; tự dựng lại nếu khóa học cũ chưa có
+        manifest. Nếu việc dựng lại bị lỗi, nó được thử lại sau
+        MANIFEST_REBUILD_RETRY_SECONDS giây (hoặc ở lần mở sau) cho tới khi thành công.
+        """
+        with self._manifests_lock:
+            manifest = self._manifests.get(course_id)
+            if manifest is None:
+                manifest = self._manifests[course_id] = DocumentManifest(os.path.join(USER_DATA_PATH, course_id))
+                needs_setup = True
+            else:
+                needs_setup = time.time() >= self._manifest_retry_at.get(course_id, float("inf"))
+            if needs_setup:
+                self._manifest_retry_at.pop(course_id, None)
+        if needs_setup:
+            try:
+                self._setup_manifest(course_id, manifest)
+            except Exception as e:
+                logger.error(f"Không thể dựng lại manifest cho khóa học {course_id}: {e}")
+                with self._manifests_lock:
+                    if self._manifests.get(course_id) is manifest:
+                        self._manifest_retry_at[course_id] = time.time() + MANIFEST_REBUILD_RETRY_SECONDS
+        return manifest
+
+    def _setup_manifest(self, course_id: str, manifest: DocumentManifest):
+        """Các bước dựng/bổ sung manifest còn dang dở; mỗi bước ghi mốc vào bảng meta khi xong."""
+        needs_rebuild = manifest.get_meta(MANIFEST_REBUILT_KEY) is None
+        if needs_rebuild and not manifest.is_new and manifest.totals()["doc_count"] > 0:
+            # Manifest có tài liệu từ trước khi có mốc này: đã được dựng/ghi bình thường.
+            manifest.set_meta(MANIFEST_REBUILT_KEY, "1")
+            needs_rebuild = False
+        # Khóa học tạo trước khi có bảng chunk_refs: điền tham chiếu từ metadata của chunk.
+        needs_refs = not needs_rebuild and not manifest.has_refs() and manifest.totals()["doc_count"] > 0
+        # Chunk dùng chung ghi trước khi có metadata shared_refs: ghi bổ sung một lần.
+        needs_owners = manifest.get_meta(SHARED_REFS_SYNCED_KEY) is None
+        if not (needs_rebuild or needs_refs or needs_owners): return
+        collection = self.chroma_client.get_collection(name=course_id)
+        if (needs_rebuild or needs_refs) and collection.count() > 0:
+            self.rebuild_manifest(course_id) if needs_rebuild else self.rebuild_chunk_refs(course_id)
+        if needs_rebuild:
+            manifest.set_meta(MANIFEST_REBUILT_KEY, "1")
+        if needs_owners:
+            self._sync_chunk_owners(course_id, collection, manifest.shared_chunks())
+            manifest.set_meta(SHARED_REFS_SYNCED_KEY, "1")
+
+    def _close_course_stores(self, course_id: str):
+        """Đóng các file SQLite riêng của khóa học (manifest, cache câu trả lời, chỉ mục BM25, lịch sử chat, ngân hàng câu hỏi)."""
+        with self._manifests_lock:
+            for stores in (self._manifests, self._answer_caches, self._bm25_indexes, self._chat_stores, self._question_banks):
+                if store := stores.pop(course_id, None):
+                    store.close()
+            self._manifest_retry_at.pop(course_id, None)
+
+    def _chunk_lock(self, course_id: str) -> FileLock:
+        """
+        Khóa của khóa học bao quanh "kiểm tra chunk đã có + ghi tham chiếu" và "gỡ
+        tham chiếu + xóa chunk không còn ai dùng", để một lần nạp không ghi tham
+        chiếu tới chunk mà lần xóa chạy song song vừa kết luận là mồ côi. Là khóa
+        file nên cũng loại trừ giữa ứng dụng và tiến trình worker nạp tài liệu.
+        """
+        with self._manifests_lock:
+            if course_id not in self._chunk_locks:
+                self._chunk_locks[course_id] = FileLock(os.path.join(USER_DATA_PATH, "locks", f"{course_id}.lock"))
+            return self._chunk_locks[course_id]
+
+    def rebuild_manifest(self, course_id: str) -> int:
+        """
+        Dựng lại manifest từ các chunk đang có trong collection. Số token được
+        tính lại từ số chunk và độ dài chunk cuối cùng của mỗi tài liệu; thời
+        điểm nạp lấy từ timestamp trong ID chunk (ID kiểu cũ). Chunk dùng chung
+        được tính cho mọi tài liệu ghi trong metadata của nó (shared_refs).
+        """
+        collection = self.chroma_client.get_collection(name=course_id)
+        data = collection.get(include=["metadatas", "documents"])
+        docs: dict[str, dict] = {}
+        for chunk_id, meta, text in zip(data['ids'], data['metadatas'], data['documents']):
+            timestamp = chunk_id.rsplit('-', 1)[-1]
+            for ref in chunk_refs_from_metadata(chunk_id, meta):
+                entry = docs.setdefault(ref['file_hash'], {
+                    "hash": ref['file_hash'], "name": ref['name'], "source_type": infer_source_type(ref['name']),
+                    "chunk_count": 0, "ingested_at": int(timestamp) / 1000 if timestamp.isdigit() else time.time(),
+                    "_last": (-1, ""),
+                })
+                entry["chunk_count"] += 1
+                if ref['position'] > entry["_last"][0]:
+                    entry["_last"] = (ref['position'], text)
+        stride = TEXT_CHUNK_SIZE - TEXT_CHUNK_OVERLAP
+        for entry in docs.values():
+            _, last_text = entry.pop("_last")
+            entry["token_count"] = (entry["chunk_count"] - 1) * stride + len(self.tokenizer.encode(last_text))
+        self._get_manifest(course_id).replace_all(list(docs.values()))
+        self.rebuild_chunk_refs(course_id)
+        self._bump_version(course_id)
+        logger.info(f"Đã dựng lại manifest cho khóa học {course_id}: {len(docs)} tài liệu")
+        return len(docs)
+
+    def rebuild_chunk_refs(self, course_id: str) -> int:
+        """Dựng lại bảng tham chiếu tài liệu -> chunk từ metadata của các chunk (đọc theo từng trang)."""
+        collection = self.chroma_client.get_collection(name=course_id)
+        refs, offset, page_size = [], 0, 1000
+        while True:
+            data = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+            if not data['ids']: break
+            refs.extend((ref['file_hash'], ref['position'], chunk_id, ref['page_start'], ref['page_end'])
+                        for chunk_id, meta in zip(data['ids'], data['metadatas'])
+                        for ref in chunk_refs_from_metadata(chunk_id, meta))
+            offset += len(data['ids'])
+        self._get_manifest(course_id).replace_refs(refs)
+        logger.info(f"Đã dựng lại bảng tham chiếu chunk cho khóa học {course_id}: {len(refs)} chunk")
+        return len(refs)
+
+    # --- NHÓM HÀM CHỈ MỤC TỪ VỰNG (BM25) ---
+    def _get_bm25(self, course_id: str) -> BM25Index:
+        """Mở chỉ mục BM25 của khóa học; tự dựng lại nếu khóa học cũ chưa có chỉ mục."""
+        with self._manifests_lock:
+            index = self._bm25_indexes.get(course_id)
+            if index is None:
+                index = self._bm25_indexes[course_id] = BM25Index(os.path.join(USER_DATA_PATH, course_id), max_df_ratio=BM25_MAX_DF_RATIO)
+                needs_rebuild = index.is_new
+            else:
+                needs_rebuild = False
+        if needs_rebuild:
             try:
-                shutil.rmtree(cache_dir)
-                logger.info(f"Đã xóa cache cho khóa học: {course_id}")
+                if self.chroma_client.get_collection(name=course_id).count() > 0:
+                    self.rebuild_bm25(course_id)
             except Exception as e:
-                logger.error(f"Lỗi khi xóa cache cho khóa học {course_id}: {e}")
+                logger.error(f"Không thể dựng lại chỉ mục BM25 cho khóa học {course_id}: {e}")
+        return index
+
+    def rebuild_bm25(self, course_id: str) -> int:
+        """Dựng lại chỉ mục BM25 từ toàn bộ chunk trong collection (đọc theo từng trang)."""
+        collection = self.chroma_client.get_collection(name=course_id)
+        index = self._get_bm25(course_id)
+        index.clear()
+        total, page_size = 0, 1000
+        while True:
+            data = collection.get(include=["documents", "metadatas"], limit=page_size, offset=total)
+            if not data['ids']: break
+            index.add(data['ids'], [meta.get('file_hash', '') for meta in data['metadatas']], data['documents'])
+            total += len(data['ids'])
+        logger.info(f"Đã dựng lại chỉ mục BM25 cho khóa học {course_id}: {total} chunk")
+        return total
+
+    @staticmethod
+    def _chunk_records(ids: list[str], documents: list[str], metadatas: list[dict], embeddings=None) -> list[dict]:
+        """
+        Gom kết quả ChromaDB thành các bản ghi chunk dùng cho việc đóng gói ngữ cảnh;
+        nếu có `embeddings` (đã lưu trong ChromaDB), mỗi bản ghi có thêm "embedding".
+        """
+        records = [{"id": chunk_id, "text": text, "file_hash": (meta or {}).get("file_hash", ""),
+                    "source": (meta or {}).get("source", ""), "index": (meta or {}).get("position", chunk_index(chunk_id))}
+                   for chunk_id, text, meta in zip(ids, documents, metadatas)]
+        if embeddings is not None:
+            for record, embedding in zip(records, embeddings):
+                record["embedding"] = embedding
+        return records
+
+    def retrieve(self, course_id: str, question: str, n_results: int = VECTOR_DB_SEARCH_RESULTS,
+                 mode: str = RETRIEVAL_MODE, query_embedding: list | None = None, with_embeddings: bool = False) -> list[dict]:
+        """
+        Lấy các chunk liên quan nhất tới câu hỏi theo chế độ `mode`:
+        'dense' (ChromaDB), 'lexical' (BM25, quay về 'dense' nếu không có từ nào
+        khớp) hoặc 'hybrid' (RRF trên HYBRID_CANDIDATES kết quả của mỗi bên).
+        Mỗi kết quả là {"id", "text", "file_hash", "source", "index"}, kèm
+        "embedding" đã lưu trong ChromaDB nếu `with_embeddings`.
+        """
+        self._sync_ingested(course_id)
+        collection = self.chroma_client.get_collection(name=course_id)
+        include = ["documents", "metadatas", "embeddings"] if with_embeddings else ["documents", "metadatas"]
+
+        def fetch(data: dict, row: int | None = None) -> list[dict]:
+            # Kết quả collection.get là danh sách phẳng; collection.query có một hàng cho mỗi câu hỏi.
+            pick = (lambda key: data[key]) if row is None else (lambda key: data[key][row])
+            return self._chunk_records(pick("ids"), pick("documents"), pick("metadatas"),
+                                       pick("embeddings") if with_embeddings else None)
+
+        lexical_ids = []
+        if mode in ("lexical", "hybrid"):
+            limit = n_results if mode == "lexical" else max(HYBRID_CANDIDATES, n_results)
+            with tracer.span("retrieve.lexical"):
+                lexical_ids = [chunk_id for chunk_id, _ in self._get_bm25(course_id).search(question, limit)]
+            if mode == "lexical" and lexical_ids:
+                records = {r["id"]: r for r in fetch(collection.get(ids=lexical_ids, include=include))}
+                return [records[i] for i in lexical_ids if i in records]
+        if query_embedding is None:
+            with tracer.span("retrieve.embed_query"):
+                query_embedding = self.embedder.embed([question])
+        with tracer.span("retrieve.dense"):
+            dense = collection.query(query_embeddings=query_embedding, include=include,
+                                     n_results=max(HYBRID_CANDIDATES, n_results) if mode == "hybrid" else n_results)
+        dense_records = fetch(dense, 0)
+        if mode != "hybrid" or not lexical_ids:
+            return dense_records[:n_results]
+        records = {r["id"]: r for r in dense_records}
+        fused = [chunk_id for chunk_id, _ in reciprocal_rank_fusion([dense['ids'][0], lexical_ids], RRF_K)[:n_results]]
+        if missing := [i for i in fused if i not in records]:
+            records.update((r["id"], r) for r in fetch(collection.get(ids=missing, include=include)))
+        return [records[i] for i in fused if i in records]
+
+    # --- NHÓM HÀM TÌM KIẾM TRÊN NHIỀU KHÓA HỌC ---
+    @staticmethod
+    def _similarity(distance: float, space: str) -> float:
+        """Đổi khoảng cách của ChromaDB thành độ tương đồng cosine (embedding đã chuẩn hóa)."""
+        return 1 - distance / 2 if space == "l2" else 1 - distance
+
+    def _search_course(self, course: dict, query_embedding: list, n_results: int) -> list[dict]:
+        self._sync_ingested(course["id"])
+        with tracer.span("search.collection"):
+            collection = self.chroma_client.get_collection(name=course["id"])
+            if (count := collection.count()) == 0: return []
+            data = collection.query(query_embeddings=query_embedding, n_results=min(n_results, count),
+                                    include=["documents", "metadatas", "distances"])
+        space = vector_index.collection_space(collection)
+        records = self._chunk_records(data['ids'][0], data['documents'][0], data['metadatas'][0])
+        return [{**record, "course_id": course["id"], "course_name": course["name"], "score": self._similarity(distance, space)}
+                for record, distance in zip(records, data['distances'][0])]
+
+    def iter_search_all(self, question: str, course_ids: list[str] | None = None, n_results: int = GLOBAL_SEARCH_RESULTS,
+                        max_workers: int = GLOBAL_SEARCH_MAX_WORKERS) -> Iterator[dict]:
+        """
+        Tìm trên mọi khóa học (hoặc các khóa học `course_ids`) song song. Câu hỏi chỉ
+        được embedding một lần; mỗi collection trả về tối đa `n_results` chunk gần
+        nhất và kết quả được gộp theo độ tương đồng. Sau mỗi collection xong, trả về
+        {"done", "total", "course_id", "error", "results"} với "results" là top
+        `n_results` tạm thời, nên giao diện hiển thị được ngay mà không chờ collection chậm nhất.
+        Chỉ dùng truy vấn dense: điểm RRF/BM25 tính theo thứ hạng trong từng
+        collection nên không so sánh được giữa các khóa học.
+        """
+        courses = self.list_courses()
+        if course_ids is not None:
+            wanted = set(course_ids)
+            courses = [course for course in courses if course["id"] in wanted]
+        if not courses: return
+        with tracer.span("search.embed_query"):
+            query_embedding = self.embedder.embed([question])
+        merged: list[dict] = []
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(courses))) as pool:
+            futures = {pool.submit(self._search_course, course, query_embedding, n_results): course for course in courses}
+            for done, future in enumerate(as_completed(futures), 1):
+                course, error = futures[future], None
+                try:
+                    merged = heapq.nlargest(n_results, merged + future.result(), key=lambda r: r["score"])
+                except Exception as e:
+                    logger.warning(f"Lỗi khi tìm trong khóa học {course['id']}: {e}")
+                    error = str(e)
+                yield {"done": done, "total": len(courses), "course_id": course["id"], "error": error, "results": merged}
+        tracer.count("global_searches")
+
+    def search_all(self, question: str, course_ids: list[str] | None = None, n_results: int = GLOBAL_SEARCH_RESULTS) -> list[dict]:
+        """Kết quả cuối cùng của iter_search_all: top `n_results` chunk trên các khóa học, kèm "course_id", "course_name", "score"."""
+        results = []
+        for event in self.iter_search_all(question, course_ids, n_results):
+            results = event["results"]
+        return results
 
     # --- NHÓM HÀM XỬ LÝ TÀI LIỆU ---
     def extract_text_from_source(self, source_type: str, source_data: any) -> tuple[str | None, str]:
         text, original_name = None, "N/A"
         try:
-            if source_type == 'pdf' and hasattr(source_data, 'read'):
-                original_name = source_data.name
-                pdf_reader = PdfReader(source_data)
-                text = "".join(page.extract_text() for page in pdf_reader.pages if page.extract_text())
-            elif source_type == 'docx' and hasattr(source_data, 'read'):
-                original_name = source_data.name
-                doc = docx.Document(source_data)
-                text = "\n".join([para.text for para in doc.paragraphs if para.text])
-            elif source_type == 'url' and isinstance(source_data, str):
-                original_name = source_data
-                headers = {'User-Agent': 'Mozilla/5.0'}
-                response = requests.get(source_data, headers=headers, timeout=15)
-                response.raise_for_status()
-                soup = BeautifulSoup(response.content, 'html.parser')
-                for tag in soup(["script", "style", "nav", "footer", "header", "aside"]):
-                    tag.decompose()
-                text = soup.get_text(separator='\n', strip=True)
-            elif source_type == 'youtube' and isinstance(source_data, str):
-                video_id_match = re.search(r"(?<=v=)[\w-]+|(?<=youtu.be/)[\w-]+", source_data)
-                if not video_id_match:
-                    raise ValueError("URL YouTube không hợp lệ.")
-                video_id = video_id_match.group(0)
-                original_name = f"youtube_{video_id}"
-                transcript = YouTubeTranscriptApi.get_transcript(video_id, languages=['vi', 'en'])
-                text = " ".join([item['text'] for item in transcript])
+            with tracer.span(f"ingest.extract.{source_type}"):
+                if source_type == 'pdf' and hasattr(source_data, 'read'):
+                    original_name = source_data.name
+                    text = extractors.extract_pdf_text(source_data)
+                elif source_type == 'docx' and hasattr(source_data, 'read'):
+                    original_name = source_data.name
+                    text = extractors.extract_docx_text(source_data)
+                elif source_type == 'url' and isinstance(source_data, str):
+                    original_name = source_data
+                    text = extractors.extract_url_text(source_data, FETCH_MAX_BYTES, FETCH_TIMEOUT_SECONDS)
+                elif source_type == 'youtube' and isinstance(source_data, str):
+                    original_name = f"youtube_{extractors.youtube_video_id(source_data)}"
+                    text = extractors.extract_youtube_text(source_data)
             
             if not text or not text.strip():
                 return None, original_name
@@ -161,7 +597,9 @@ class ServiceManager:
     def list_courses(self) -> list[dict]:
         try:
             collections = self.chroma_client.list_collections()
-            return [{"id": col.name, "name": col.metadata.get("display_name", col.name)} for col in collections]
+            # Collection tạm của một lần dựng lại chỉ mục (core/vector_index.py) không phải khóa học.
+            return [{"id": col.name, "name": (col.metadata or {}).get("display_name", col.name)} for col in collections
+                    if vector_index.REBUILD_OF_KEY not in (col.metadata or {})]
         except Exception as e:
             logger.error(f"Lỗi khi liệt kê khóa học: {e}")
             return []
@@ -171,8 +609,10 @@ class ServiceManager:
             return None, "Tên không gian làm việc không được để trống."
         course_id = slugify(display_name)
         try:
-            self.chroma_client.get_or_create_collection(name=course_id, metadata={"display_name": display_name})
+            self.chroma_client.get_or_create_collection(name=course_id, metadata={"display_name": display_name},
+                                                        configuration={"hnsw": vector_index.index_profile(0)})
             os.makedirs(os.path.join(USER_DATA_PATH, course_id), exist_ok=True)
+            self._bump_version(None, course_id)
             return course_id, None
         except Exception as e:
             logger.error(f"Lỗi khi tạo khóa học '{display_name}': {e}")
@@ -184,126 +624,984 @@ class ServiceManager:
         except Exception as e:
             logger.info(f"Không tìm thấy collection '{course_id}' để xóa hoặc có lỗi: {e}")
         try:
-            self._invalidate_cache(course_id) # Xóa cache liên quan
+            self.result_cache.drop_course(course_id) # Xóa cache liên quan
+            self.jobs.delete_course(course_id)
+            self._close_course_stores(course_id)
+            with self._versions_lock: self._warmed_courses.discard(course_id)
             course_data_path = os.path.join(USER_DATA_PATH, course_id)
             if os.path.isdir(course_data_path):
                 shutil.rmtree(course_data_path)
         except Exception as e:
             logger.error(f"Lỗi khi xóa dữ liệu người dùng cho khóa học {course_id}: {e}")
+        self._bump_version(None, course_id)
+
+    def _insert_docs(self, course_id: str, collection, docs: Iterable[tuple[str | Iterable, str, str, str]]) -> dict[str, int]:
+        """
+        Chia chunk theo luồng cho nhiều tài liệu (text, source_name, file_hash,
+        source_type) và ghi theo các lô CHUNK_INSERT_BATCH_SIZE dùng chung giữa
+        các tài liệu, rồi cập nhật manifest. `text` có thể là luồng (page, text)
+        của PDF, khi đó metadata của chunk có thêm page_start/page_end. Chunk đã
+        có trong khóa học (cùng nội dung) chỉ được ghi thêm tham chiếu.
+        Trả về số chunk của từng file_hash.
+        """
+        counts: dict[str, int] = {}
+        entries: list[tuple[str, str, str, dict]] = []
+        timestamp = int(time.time() * 1000)
+
+        def records():
+            for doc_text, source_name, file_hash, source_type in docs:
+                counts.setdefault(file_hash, 0)
+                stats = {"tokens": 0}
+                entries.append((file_hash, source_name, source_type, stats))
+                for chunk, page_start, page_end in iter_tagged_chunks(self.tokenizer, doc_text, TEXT_CHUNK_SIZE, TEXT_CHUNK_OVERLAP, stats=stats):
+                    metadata = {"source": source_name, "file_hash": file_hash, "position": counts[file_hash]}
+                    counts[file_hash] += 1
+                    if page_start is not None:
+                        metadata.update(page_start=page_start, page_end=page_end)
+                    yield chunk, metadata, content_chunk_id(chunk)
+
+        batches = iter_chunk_batches(records(), CHUNK_INSERT_BATCH_SIZE)
+        while True:
+            # Chunker chạy theo luồng nên việc token hóa + chia chunk của mỗi lô được đo khi lấy lô đó.
+            with tracer.span("ingest.chunk"):
+                batch = next(batches, None)
+            if batch is None: break
+            self._store_chunks(course_id, collection, batch)
+        manifest = self._get_manifest(course_id)
+        for file_hash, source_name, source_type, stats in entries:
+            if counts.get(file_hash):
+                manifest.upsert(file_hash, source_name, source_type, counts[file_hash], stats["tokens"], timestamp / 1000)
+        self._sync_chunk_owners(course_id, collection, manifest.shared_chunks([file_hash for file_hash, *_ in entries]))
+        self._bump_version(course_id)
+        return counts
 
-    def add_doc(self, course_id: str, doc_text: str, source_name: str, file_hash: str) -> int:
+    def _store_chunks(self, course_id: str, collection, batch: list[tuple[str, dict, str]]) -> int:
+        """
+        Ghi một lô (chunk, metadata, chunk_id) cùng tham chiếu của nó. Chỉ chunk
+        chưa có trong khóa học mới được embedding và ghi vào ChromaDB/BM25; chunk
+        được ghi trước tham chiếu để tham chiếu không bao giờ trỏ tới chunk chưa có.
+        Embedding được tính ngoài khóa của khóa học; việc kiểm tra lại, ghi chunk và
+        ghi tham chiếu nằm trong khóa. Trả về số chunk mới.
+        """
+        manifest = self._get_manifest(course_id)
+        ids = [chunk_id for _, _, chunk_id in batch]
+        existing = manifest.existing_chunks(ids)
+        embedded = {}
+        if candidates := {chunk_id: chunk for chunk, _, chunk_id in batch if chunk_id not in existing}:
+            with tracer.span("ingest.embed"):
+                embedded = dict(zip(candidates, self.embedder.embed(list(candidates.values()))))
+        with self._chunk_lock(course_id):
+            existing = manifest.existing_chunks(ids)
+            new = {}
+            for chunk, metadata, chunk_id in batch:
+                if chunk_id not in existing and chunk_id not in new:
+                    new[chunk_id] = (chunk, metadata)
+            if new:
+                doc_ids = list(new)
+                chunks, metadatas = [new[i][0] for i in doc_ids], [new[i][1] for i in doc_ids]
+                # Chunk vừa bị một lần xóa song song dọn đi sau lần kiểm tra đầu: tính embedding ngay trong khóa.
+                if missing := [i for i in doc_ids if i not in embedded]:
+                    with tracer.span("ingest.embed"):
+                        embedded.update(zip(missing, self.embedder.embed([new[i][0] for i in missing])))
+                with tracer.span("ingest.add"):
+                    collection.upsert(documents=chunks, metadatas=metadatas, ids=doc_ids,
+                                      embeddings=[embedded[i] for i in doc_ids])
+                    self._get_bm25(course_id).add(doc_ids, [meta["file_hash"] for meta in metadatas], chunks)
+            manifest.add_refs([(meta["file_hash"], meta["position"], chunk_id, meta.get("page_start"), meta.get("page_end"))
+                               for _, meta, chunk_id in batch])
+        if deduplicated := len(batch) - len(new):
+            tracer.count("chunks_deduplicated", deduplicated)
+        return len(new)
+
+    def _release_doc_chunks(self, course_id: str, file_hash: str):
+        """
+        Gỡ tham chiếu của tài liệu tới các chunk: chunk không còn tài liệu nào dùng
+        bị xóa khỏi ChromaDB/BM25, chunk dùng chung được chuyển sang tài liệu còn lại.
+        """
+        manifest = self._get_manifest(course_id)
         collection = self.chroma_client.get_collection(name=course_id)
-        tokens = self.tokenizer.encode(doc_text)
-        chunks = [self.tokenizer.decode(tokens[i:i + TEXT_CHUNK_SIZE]) for i in range(0, len(tokens), TEXT_CHUNK_SIZE - TEXT_CHUNK_OVERLAP)]
-        if not chunks: return 0
-        
-        doc_ids = [f"{slugify(source_name)}-{i}-{int(time.time() * 1000)}" for i in range(len(chunks))]
-        metadatas = [{"source": source_name, "file_hash": file_hash}] * len(chunks)
-        collection.add(documents=chunks, metadatas=metadatas, ids=doc_ids)
-        self._invalidate_cache(course_id)
-        return len(chunks)
+        with self._chunk_lock(course_id):
+            released = manifest.doc_chunks(file_hash)
+            manifest.delete_refs(file_hash)
+            # Chunk đã vào ChromaDB nhưng chưa kịp có tham chiếu (lần nạp bị ngắt) vẫn mang file_hash của tài liệu.
+            released += collection.get(where={"file_hash": file_hash}, include=[])['ids']
+            orphans = manifest.unreferenced(released)
+            if orphans:
+                collection.delete(ids=orphans)
+                vector_index.record_deletes(collection, len(orphans))
+                self._get_bm25(course_id).delete_chunks(orphans)
+        orphaned = set(orphans)
+        self._sync_chunk_owners(course_id, collection, [i for i in dict.fromkeys(released) if i not in orphaned])
 
-    def hash_exists(self, course_id: str, file_hash: str) -> bool:
+    def _sync_chunk_owners(self, course_id: str, collection, chunk_ids: list[str]):
+        """
+        Metadata của chunk (tên nguồn, file_hash, vị trí, trang) ghi theo tài liệu
+        sớm nhất còn tham chiếu tới nó, các tham chiếu còn lại nằm trong
+        "shared_refs"; cập nhật những chunk đang ghi sai.
+        """
+        manifest = self._get_manifest(course_id)
+        for start in range(0, len(chunk_ids), CHUNK_INSERT_BATCH_SIZE):
+            part = chunk_ids[start:start + CHUNK_INSERT_BATCH_SIZE]
+            owners = manifest.chunk_owners(part)
+            data = collection.get(ids=part, include=["metadatas"])
+            ids, metadatas = [], []
+            for chunk_id, meta in zip(data['ids'], data['metadatas']):
+                if not (refs := owners.get(chunk_id)): continue
+                owner, shared = refs[0], refs[1:]
+                wanted = {"source": owner["name"], "file_hash": owner["file_hash"], "position": owner["position"],
+                          "page_start": owner["page_start"], "page_end": owner["page_end"],
+                          "shared_refs": json.dumps([[ref[key] for key in SHARED_REF_FIELDS] for ref in shared],
+                                                    ensure_ascii=False) if shared else None}
+                if any((meta or {}).get(key) != value for key, value in wanted.items()):
+                    ids.append(chunk_id)
+                    metadatas.append(wanted)  # Giá trị None xóa khóa khỏi metadata.
+            if ids:
+                collection.update(ids=ids, metadatas=metadatas)
+
+    def add_doc(self, course_id: str, doc_text: str | Iterable[str], source_name: str, file_hash: str,
+                source_type: str | None = None) -> int:
+        """
+        Chia tài liệu thành chunk theo luồng và ghi vào ChromaDB theo từng lô
+        CHUNK_INSERT_BATCH_SIZE, để bộ nhớ đỉnh không tăng theo độ dài tài liệu.
+        `doc_text` có thể là một chuỗi hoặc một luồng các mảnh văn bản.
+        """
+        collection = self.chroma_client.get_collection(name=course_id)
+        source_type = source_type or infer_source_type(source_name)
+        total = self._insert_docs(course_id, collection, [(doc_text, source_name, file_hash, source_type)]).get(file_hash, 0)
+        return total
+
+    def add_sources(self, course_id: str, sources: list[tuple[str, any]],
+                    on_progress: Callable[[dict], None] | None = None) -> list[dict]:
+        """
+        Nạp nhiều nguồn tài liệu cùng lúc theo 2 giai đoạn:
+        1. Trích xuất file (pdf, docx) trong process pool — PDF lớn được chia theo
+           khoảng trang — và URL/YouTube trong thread pool.
+        2. Ghi toàn bộ chunk vào collection theo lô. Trang PDF được đọc dần từ
+           process pool trong lúc ghi (tối đa PDF_RANGES_IN_FLIGHT khoảng trang chờ
+           mỗi file), không giữ cả tài liệu trong bộ nhớ.
+        `sources` là danh sách (source_type, source_data). Mỗi nguồn có một kết quả
+        {"name", "hash", "source_type", "status", "chunks", "error"} với status là 'added',
+        'skipped' hoặc 'error'; `on_progress` được gọi (trên luồng gọi hàm) mỗi
+        khi một nguồn có kết quả cuối cùng.
+        """
+        collection = self.chroma_client.get_collection(name=course_id)
+        results, pending, seen = [], [], set()
+
+        def report(result: dict):
+            if on_progress: on_progress(result)
+
+        # --- GIAI ĐOẠN 0: TÍNH HASH & LOẠI BỎ TRÙNG LẶP ---
+        for source_type, source_data in sources:
+            name = getattr(source_data, 'name', source_data)
+            file_hash = source_key(source_data)
+            result = {"name": name, "hash": file_hash, "source_type": source_type, "status": None, "chunks": 0, "error": None}
+            results.append(result)
+            if file_hash in seen or self.hash_exists(course_id, file_hash):
+                result["status"] = "skipped"
+                report(result)
+                continue
+            seen.add(file_hash)
+            pending.append((result, source_type, source_data))
+
+        # --- GIAI ĐOẠN 1: TRÍCH XUẤT SONG SONG ---
+        extracted = []
+        file_jobs = [job for job in pending if job[1] in extractors.FILE_SOURCE_TYPES]
+        pdf_jobs = [job for job in file_jobs if job[1] == 'pdf']
+        network_jobs = [job for job in pending if job[1] in extractors.NETWORK_SOURCE_TYPES]
+        # PDF được mở (đọc bảng trang) trong thread pool; kết quả là luồng trang được đọc ở giai đoạn 2.
+        thread_jobs = len(network_jobs) + len(pdf_jobs)
+        process_pool = self.ingest_pool if file_jobs else None
+        thread_pool = ThreadPoolExecutor(max_workers=min(thread_jobs, INGEST_THREAD_WORKERS)) if thread_jobs else None
+
+        def pdf_pages(pages: Iterator[tuple[int, str]], result: dict) -> Iterator[tuple[int, str]]:
+            # Lỗi giữa chừng của một PDF chỉ làm hỏng PDF đó, không dừng cả lần ghi.
+            try:
+                yield from pages
+            except Exception as e:
+                logger.error(f"Lỗi khi trích xuất từ '{result['name']}': {e}")
+                result["error"] = "Không trích xuất được nội dung."
+
+        with tracer.span("ingest.extract"):
+            try:
+                futures = {}
+                for result, source_type, source_data in file_jobs:
+                    if source_type == 'pdf':
+                        futures[thread_pool.submit(pdf_engine.iter_pdf_pages, source_data.getvalue(), process_pool)] = result
+                    else:
+                        futures[process_pool.submit(extractors.extract_file_bytes, source_type, source_data.getvalue())] = result
+                for result, source_type, source_data in network_jobs:
+                    futures[thread_pool.submit(lambda t, d: self.extract_text_from_source(t, d)[0], source_type, source_data)] = result
+                for future in as_completed(futures):
+                    result = futures[future]
+                    try:
+                        text = future.result()
+                    except Exception as e:
+                        logger.error(f"Lỗi khi trích xuất từ '{result['name']}': {e}")
+                        text = None
+                    if result["source_type"] == 'pdf' and text is not None:
+                        extracted.append((pdf_pages(text, result), result))
+                    elif text and text.strip():
+                        extracted.append((text, result))
+                    else:
+                        result["status"], result["error"] = "error", "Không trích xuất được nội dung."
+                        report(result)
+            finally:
+                if thread_pool: thread_pool.shutdown(wait=True)
+
+        # --- GIAI ĐOẠN 2: GHI THEO LÔ ---
+        if extracted:
+            try:
+                docs = [(text, r["name"], r["hash"], r["source_type"]) for text, r in extracted]
+                counts = self._insert_docs(course_id, collection, docs)
+            except Exception as e:
+                logger.error(f"Lỗi khi ghi tài liệu vào khóa học {course_id}: {e}")
+                counts = {}
+            for text, result in extracted:
+                result["chunks"] = counts.get(result["hash"], 0)
+                if result["error"]:
+                    # PDF lỗi giữa chừng: bỏ phần đã ghi để lần nạp lại không bị coi là trùng.
+                    if result["chunks"]: self.delete_doc(course_id, result["hash"])
+                    result["status"], result["chunks"] = "error", 0
+                elif not result["chunks"] and result["source_type"] == 'pdf':
+                    result["status"], result["error"] = "error", "Không trích xuất được nội dung."
+                elif result["chunks"]:
+                    result["status"] = "added"
+                    if result["source_type"] in extractors.NETWORK_SOURCE_TYPES:
+                        # Hash nội dung làm mốc cho lần làm mới sau (xem refresh_source).
+                        self._get_manifest(course_id).set_web_source(result["hash"], result["name"], None, None,
+                                                                     calculate_file_hash(text.encode('utf-8')))
+                else:
+                    result["status"], result["error"] = "error", "Không ghi được tài liệu vào cơ sở dữ liệu."
+                report(result)
+        return results
+
+    # --- NHÓM HÀM SAO LƯU & KHÔI PHỤC KHÔNG GIAN LÀM VIỆC (SNAPSHOT) ---
+    def export_course(self, course_id: str, path: str) -> dict:
+        """
+        Ghi snapshot của khóa học (chunk, embedding, metadata, dữ liệu trong
+        user_data/<course>) vào thư mục mới `path`. Trả về thông tin snapshot kèm "bytes".
+        Không nên nạp/xóa tài liệu của khóa học trong lúc xuất.
+        """
+        collection = self.chroma_client.get_collection(name=course_id)
+        metadata = {k: v for k, v in vector_index.user_metadata(collection).items() if k != vector_index.DELETED_KEY}
+        info = {"name": metadata.get("display_name", course_id), "metadata": metadata,
+                "hnsw": {k: v for k, v in vector_index.hnsw_config(collection).items() if k in (*vector_index.GRAPH_KEYS, "ef_search")},
+                "embedding_model": self.embedder.model_name}
+        with tracer.span("snapshot.export"):
+            return self.in_flight.do((course_id, "export", path), lambda: snapshot.export_snapshot(
+                collection, os.path.join(USER_DATA_PATH, course_id), path, info, SNAPSHOT_BATCH_SIZE))
+
+    def import_course(self, path: str, display_name: str | None = None) -> tuple[str | None, str | None]:
+        """
+        Tạo khóa học mới từ snapshot: dữ liệu trong user_data/<course> được giải nén,
+        chunk và embedding có sẵn được ghi vào collection mới theo lô lớn (không gọi
+        mô hình embedding). Chỉ mục BM25 được dựng từ cùng các lô trong một luồng
+        riêng, song song với ChromaDB. Trả về (course_id, lỗi) như create_course.
+        """
         try:
-            collection = self.chroma_client.get_collection(name=course_id)
-            return len(collection.get(where={"file_hash": file_hash}, limit=1)['ids']) > 0
+            info = snapshot.read_info(path)
+        except ValueError as e:
+            return None, str(e)
+        if info["embedding_model"] != self.embedder.model_name:
+            return None, (f"Snapshot dùng mô hình embedding '{info['embedding_model']}', "
+                          f"khác với mô hình hiện tại '{self.embedder.model_name}'.")
+        display_name = (display_name or info["name"]).strip()
+        if not display_name:
+            return None, "Tên không gian làm việc không được để trống."
+        course_id = slugify(display_name)
+        if any(c["id"] == course_id for c in self.list_courses()):
+            return None, f"Không gian làm việc '{display_name}' đã tồn tại."
+        try:
+            with tracer.span("snapshot.import"):
+                # Dữ liệu còn sót của một khóa học cùng tên đã bị xóa (không còn collection).
+                self._close_course_stores(course_id)
+                shutil.rmtree(os.path.join(USER_DATA_PATH, course_id), ignore_errors=True)
+                snapshot.restore_course_data(path, os.path.join(USER_DATA_PATH, course_id))
+                # Collection được tạo sẵn với cấu hình HNSW theo kích thước cuối cùng.
+                collection = self.chroma_client.create_collection(
+                    name=course_id, metadata={**info["metadata"], "display_name": display_name},
+                    configuration={"hnsw": vector_index.index_profile(info["count"])})
+                bm25 = self._get_bm25(course_id)
+                batch_size = min(SNAPSHOT_BATCH_SIZE, self.chroma_client.get_max_batch_size())
+                with ThreadPoolExecutor(max_workers=1) as pool:
+                    pending = []
+                    for ids, embeddings, documents, metadatas in snapshot.iter_batches(path, batch_size):
+                        pending.append(pool.submit(bm25.add, ids, [m.get("file_hash", "") for m in metadatas], documents))
+                        collection.add(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+                    for future in pending: future.result()
+                if (count := collection.count()) != info["count"]:
+                    raise RuntimeError(f"chỉ nhập được {count}/{info['count']} chunk")
+        except Exception as e:
+            logger.error(f"Lỗi khi nhập snapshot '{path}': {e}")
+            self.delete_course(course_id)
+            return None, f"Không thể nhập snapshot: {e}"
+        tracer.count("snapshot_imports")
+        self._bump_version(None, course_id)
+        return course_id, None
+
+    # --- NHÓM HÀM HÀNG ĐỢI NẠP TÀI LIỆU (CHẠY NỀN) ---
+    @lazy_resource
+    def jobs(self) -> JobQueue:
+        return JobQueue(INGEST_JOBS_PATH, INGEST_JOB_MAX_ATTEMPTS)
+
+    def enqueue_sources(self, course_id: str, sources: list[tuple[str, any]]) -> list[dict]:
+        """
+        Ghi các nguồn vào hàng đợi rồi trả về ngay; worker chạy nền thực hiện
+        trích xuất, chia chunk, embedding và ghi vào collection qua add_sources.
+        Nguồn đã có trong khóa học không được xếp hàng (status 'skipped').
+        """
+        uploads_dir = os.path.join(USER_DATA_PATH, course_id, "uploads")
+        jobs, group = [], []
+        for source_type, source_data in sources:
+            name = getattr(source_data, 'name', source_data)
+            file_hash = source_key(source_data)
+            if self.hash_exists(course_id, file_hash):
+                jobs.append({"name": name, "file_hash": file_hash, "status": "skipped"})
+                continue
+            source = save_upload(uploads_dir, file_hash, source_data.getvalue()) if hasattr(source_data, 'getvalue') else source_data
+            jobs.append(None)
+            group.append((file_hash, name, source_type, source))
+        # Các nguồn của một lần gửi là một nhóm job, được worker nạp chung qua một lần add_sources.
+        queued = iter(self.jobs.enqueue_group(course_id, group) if group else [])
+        jobs = [job or next(queued) for job in jobs]
+        self.start_job_workers()
+        self._jobs_wakeup.set()
+        return jobs
+
+    def list_jobs(self, course_id: str, limit: int = 20) -> list[dict]:
+        self._sync_ingested(course_id)
+        return self.jobs.list(course_id, limit)
+
+    def retry_job(self, job_id: int) -> bool:
+        retried = self.jobs.retry(job_id)
+        self.start_job_workers()
+        self._jobs_wakeup.set()
+        return retried
+
+    def start_job_workers(self):
+        """
+        Bảo đảm có worker chạy các job đang chờ. INGEST_JOB_RUNNER = "process": khởi
+        động tiến trình `python -m core.jobs worker` nếu chưa có worker nào giữ khóa
+        INGEST_WORKER_LOCK_PATH; "thread": khởi động các luồng worker trong tiến trình
+        này (một lần cho mỗi tiến trình) và chạy tiếp các job bị gián đoạn trước đó.
+        """
+        if INGEST_JOB_RUNNER == "process":
+            with self._versions_lock:
+                if self._job_worker_process is not None and self._job_worker_process.poll() is None: return
+                lease = FileLock(INGEST_WORKER_LOCK_PATH)
+                if not lease.acquire(blocking=False): return  # Worker khác đang chạy.
+                lease.release()
+                self._job_worker_process = subprocess.Popen([sys.executable, "-m", "core.jobs", "worker"],
+                                                            cwd=ROOT_DIR, start_new_session=True)
+            logger.info(f"Đã khởi động tiến trình worker nạp tài liệu (pid {self._job_worker_process.pid}).")
+            return
+        with self._versions_lock:
+            if self._job_workers: return
+            if resumed := self.jobs.recover():
+                logger.info(f"Chạy tiếp {resumed} job nạp tài liệu bị gián đoạn.")
+            self._job_workers = [threading.Thread(target=self._job_worker, name=f"pnote-ingest-{i}", daemon=True)
+                                 for i in range(INGEST_JOB_WORKERS)]
+        for worker in self._job_workers:
+            worker.start()
+
+    def run_job_worker(self) -> int:
+        """
+        Vòng lặp của tiến trình worker (python -m core.jobs worker): giữ khóa
+        INGEST_WORKER_LOCK_PATH, chạy tiếp các job bị gián đoạn, chạy INGEST_JOB_WORKERS
+        luồng nhận job và thoát sau INGEST_WORKER_IDLE_SECONDS giây không có job.
+        """
+        lease = FileLock(INGEST_WORKER_LOCK_PATH)
+        if not lease.acquire(blocking=False):
+            logger.info("Đã có một worker nạp tài liệu khác đang chạy.")
+            return 0
+        tracer.prefix = f"{tracer.prefix}_worker"
+        tracer.start_exporters(INGEST_WORKER_METRICS_TEXTFILE_PATH, METRICS_EXPORT_INTERVAL_SECONDS, None)
+        while True:
+            if resumed := self.jobs.recover():
+                logger.info(f"Chạy tiếp {resumed} job nạp tài liệu bị gián đoạn.")
+            self._jobs_stop.clear()
+            workers = [threading.Thread(target=self._job_worker, name=f"pnote-ingest-{i}", daemon=True)
+                       for i in range(INGEST_JOB_WORKERS)]
+            for worker in workers:
+                worker.start()
+            idle_since = time.monotonic()
+            while time.monotonic() - idle_since < INGEST_WORKER_IDLE_SECONDS:
+                time.sleep(INGEST_JOB_POLL_SECONDS)
+                if self.jobs.has_pending(): idle_since = time.monotonic()
+            self._jobs_stop.set()
+            self._jobs_wakeup.set()
+            for worker in workers:
+                worker.join()
+            lease.release()
+            # Job xếp hàng ngay trước khi nhả khóa được chạy tiếp, trừ khi ứng dụng đã khởi động worker mới.
+            if not self.jobs.has_pending() or not lease.acquire(blocking=False):
+                logger.info("Worker nạp tài liệu dừng vì không còn job.")
+                return 0
+
+    def _job_worker(self):
+        while not self._jobs_stop.is_set():
+            jobs = self.jobs.claim(INGEST_JOB_BATCH_SIZE)
+            if not jobs:
+                self._jobs_wakeup.wait(INGEST_JOB_POLL_SECONDS)
+                self._jobs_wakeup.clear()
+                continue
+            self._run_jobs(jobs)
+
+    def _run_jobs(self, jobs: list[dict]):
+        """
+        Chạy một lô job của cùng khóa học qua một lần add_sources (trích xuất song
+        song, chunk của các tài liệu được ghi chung theo lô). Chạy lại là an toàn:
+        tài liệu đã có trong manifest được bỏ qua, còn chunk ghi dở của lần chạy bị
+        ngắt trước đó bị xóa.
+        """
+        course_id = jobs[0]["course_id"]
+        pending, sources = {}, []
+        for job in jobs:
+            try:
+                if not self.hash_exists(course_id, job["file_hash"]):
+                    self._release_doc_chunks(course_id, job["file_hash"])
+                if job["source_type"] in extractors.FILE_SOURCE_TYPES:
+                    with open(job["source"], 'rb') as f:
+                        source_data = StoredUpload(f.read(), job["name"])
+                else:
+                    source_data = job["source"]
+            except Exception as e:
+                logger.error(f"Job nạp tài liệu #{job['id']} ('{job['name']}') thất bại: {e}")
+                self._finish_job(job, {"status": "error", "chunks": 0, "error": str(e)})
+                continue
+            pending[job["file_hash"]] = job
+            sources.append((job["source_type"], source_data))
+        if not sources: return
+
+        def report(result: dict):
+            if job := pending.pop(result["hash"], None):
+                self._finish_job(job, result)
+
+        try:
+            with tracer.span("ingest.job"):
+                self.add_sources(course_id, sources, on_progress=report)
+        except Exception as e:
+            logger.error(f"Lô {len(sources)} job nạp tài liệu của khóa học {course_id} thất bại: {e}")
+            for job in list(pending.values()):
+                report({"hash": job["file_hash"], "status": "error", "chunks": 0, "error": str(e)})
+
+    def _finish_job(self, job: dict, result: dict):
+        self.jobs.finish(job["id"], result["status"], result["chunks"], result["error"])
+        tracer.count("ingest_jobs", status=result["status"])
+        if result["status"] != "error" and job["source_type"] in extractors.FILE_SOURCE_TYPES:
+            try: os.remove(job["source"])
+            except OSError: pass
+
+    def _sync_ingested(self, course_id: str):
+        """
+        Chunk do tiến trình worker ghi/xóa chưa hiện trong chỉ mục vector mà ChromaDB
+        của tiến trình này đang giữ. Khi có job mới kết thúc, một lệnh xóa rỗng làm
+        ChromaDB đọc lại các thay đổi, thống kê BM25 được tính lại và phiên bản dữ
+        liệu tăng để giao diện tải lại danh sách tài liệu.
+        """
+        if INGEST_JOB_RUNNER != "process": return
+        finished = self.jobs.last_finished(course_id)
+        with self._versions_lock:
+            if finished <= self._ingest_synced.get(course_id, 0.0): return
+            self._ingest_synced[course_id] = finished
+        try:
+            self.chroma_client.get_collection(name=course_id).delete(ids=[INGEST_SYNC_CHUNK_ID])
+        except Exception as e:
+            logger.warning(f"Không đồng bộ được chỉ mục vector của khóa học {course_id}: {e}")
+        with self._manifests_lock:
+            index = self._bm25_indexes.get(course_id)
+        if index is not None:
+            index.invalidate()
+        self._bump_version(course_id)
+
+    # --- NHÓM HÀM LÀM MỚI NGUỒN WEB ---
+    def refresh_source(self, course_id: str, file_hash: str) -> dict:
+        """
+        Làm mới một nguồn URL/YouTube: tải có điều kiện theo ETag/Last-Modified, so
+        hash nội dung với lần trước và nếu có thay đổi thì chỉ ghi lại các chunk
+        thay đổi. Kết quả {"name", "hash", "status", "added", "removed", "kept", "error"}
+        với status là 'unchanged', 'updated' hoặc 'error'. Các lời gọi đồng thời
+        cho cùng một nguồn dùng chung một lần làm mới.
+        """
+        return self.in_flight.do((course_id, "refresh", file_hash), lambda: self._refresh_source(course_id, file_hash))
+
+    def _refresh_source(self, course_id: str, file_hash: str) -> dict:
+        manifest = self._get_manifest(course_id)
+        doc = manifest.get(file_hash)
+        result = {"name": doc["name"] if doc else file_hash, "hash": file_hash, "status": "unchanged",
+                  "added": 0, "removed": 0, "kept": 0, "error": None}
+        if doc is None or doc["source_type"] not in extractors.NETWORK_SOURCE_TYPES:
+            result["status"], result["error"] = "error", "Không phải nguồn web."
+            return result
+        url = doc["name"]
+        if url.startswith("youtube_"):  # Tên do phiên bản cũ đặt, chỉ còn video ID.
+            url = f"https://www.youtube.com/watch?v={url[len('youtube_'):]}"
+        state = manifest.get_web_source(file_hash) or {}
+        try:
+            with tracer.span(f"refresh.fetch.{doc['source_type']}"):
+                if doc["source_type"] == 'url':
+                    text, etag, last_modified = extractors.fetch_url_text(
+                        url, state.get("etag"), state.get("last_modified"), FETCH_MAX_BYTES, FETCH_TIMEOUT_SECONDS)
+                else:
+                    # Transcript YouTube không hỗ trợ yêu cầu có điều kiện: chỉ so hash nội dung.
+                    text, etag, last_modified = extractors.extract_youtube_text(url), None, None
+            content_hash = state.get("content_hash")
+            if text is not None and (new_hash := calculate_file_hash(text.encode('utf-8'))) != content_hash:
+                if not text.strip():
+                    raise ValueError("Không trích xuất được nội dung.")
+                with tracer.span("refresh.apply"):
+                    result.update(self._apply_chunk_diff(course_id, doc, text))
+                content_hash = new_hash
+                if result["added"] or result["removed"]:
+                    result["status"] = "updated"
+            manifest.set_web_source(file_hash, url, etag, last_modified, content_hash, changed=result["status"] == "updated")
+        except Exception as e:
+            logger.error(f"Lỗi khi làm mới nguồn '{doc['name']}': {e}")
+            result["status"], result["error"] = "error", str(e)
+        tracer.count("web_refresh", status=result["status"])
+        return result
+
+    def _apply_chunk_diff(self, course_id: str, doc: dict, text: str) -> dict[str, int]:
+        """
+        Ghi phiên bản mới của tài liệu. Chunk được định danh theo nội dung nên chỉ
+        chunk chưa có trong khóa học (kể cả trong bản cũ của chính tài liệu) mới
+        được embedding và ghi; tham chiếu được ghi đè theo vị trí rồi chunk không
+        còn ai tham chiếu bị xóa.
+        """
+        file_hash = doc["hash"]
+        manifest = self._get_manifest(course_id)
+        collection = self.chroma_client.get_collection(name=course_id)
+        old_ids = manifest.doc_chunks(file_hash)
+        timestamp = int(time.time() * 1000)
+        stats, total, added = {"tokens": 0}, 0, 0
+        records = ((chunk, {"source": doc["name"], "file_hash": file_hash, "position": i}, content_chunk_id(chunk))
+                   for i, (chunk, _, _) in enumerate(iter_tagged_chunks(self.tokenizer, text, TEXT_CHUNK_SIZE, TEXT_CHUNK_OVERLAP, stats=stats)))
+        for batch in iter_chunk_batches(records, CHUNK_INSERT_BATCH_SIZE):
+            added += self._store_chunks(course_id, collection, batch)
+            total += len(batch)
+        # Chunk mới được ghi trước rồi mới xóa chunk cũ, để tài liệu không lúc nào bị trống.
+        with self._chunk_lock(course_id):
+            manifest.truncate_refs(file_hash, total)
+            if removed := manifest.unreferenced(old_ids):
+                collection.delete(ids=removed)
+                vector_index.record_deletes(collection, len(removed))
+                self._get_bm25(course_id).delete_chunks(removed)
+        manifest.upsert(file_hash, doc["name"], doc["source_type"], total, stats["tokens"], timestamp / 1000)
+        removed_set = set(removed)
+        kept = [i for i in old_ids if i not in removed_set]
+        self._sync_chunk_owners(course_id, collection, list(dict.fromkeys(kept + manifest.shared_chunks([file_hash]))))
+        self._get_summarizer(course_id).drop_partial(file_hash)
+        self._get_question_bank(course_id).delete_doc(file_hash)
+        self._bump_version(course_id)
+        return {"added": added, "removed": len(removed), "kept": total - added}
+
+    def refresh_sources(self, course_id: str, max_workers: int = WEB_REFRESH_MAX_WORKERS) -> list[dict]:
+        """Làm mới mọi nguồn URL/YouTube của khóa học, tối đa `max_workers` nguồn cùng lúc."""
+        hashes = [d["hash"] for d in self._get_manifest(course_id).list() if d["source_type"] in extractors.NETWORK_SOURCE_TYPES]
+        if not hashes: return []
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(hashes))) as pool:
+            return list(pool.map(lambda file_hash: self.refresh_source(course_id, file_hash), hashes))
+
+    def _refresh_loop(self):
+        """Làm mới định kỳ nguồn web của mọi khóa học (bật bằng WEB_REFRESH_INTERVAL_SECONDS)."""
+        while True:
+            time.sleep(WEB_REFRESH_INTERVAL_SECONDS)
+            for course in self.list_courses():
+                try: self.refresh_sources(course["id"])
+                except Exception as e: logger.warning(f"Không làm mới được nguồn web của khóa học {course['id']}: {e}")
+
+    def hash_exists(self, course_id: str, file_hash: str) -> bool:
+        try: return self._get_manifest(course_id).exists(file_hash)
         except Exception: return False
 
     def list_docs(self, course_id: str) -> list[dict]:
         try:
-            collection = self.chroma_client.get_collection(name=course_id)
-            if collection.count() == 0: return []
-            metadatas = collection.get(include=["metadatas"])['metadatas']
-            unique_docs = {meta['file_hash']: meta['source'] for meta in metadatas if 'file_hash' in meta}
-            return [{"hash": h, "name": n} for h, n in unique_docs.items()]
+            return [{"hash": d['hash'], "name": d['name'], "source_type": d['source_type'], "chunks": d['chunk_count'],
+                     "tokens": d['token_count'], "ingested_at": d['ingested_at']} for d in self._get_manifest(course_id).list()]
         except Exception: return []
 
     def delete_doc(self, course_id: str, file_hash: str):
-        collection = self.chroma_client.get_collection(name=course_id)
-        collection.delete(where={"file_hash": file_hash})
-        self._invalidate_cache(course_id)
+        self._release_doc_chunks(course_id, file_hash)
+        self._get_manifest(course_id).delete(file_hash)
+        self._get_summarizer(course_id).drop_partial(file_hash)
+        self._get_question_bank(course_id).delete_doc(file_hash)
+        self._bump_version(course_id)
         logger.info(f"Đã xóa tài liệu hash={file_hash} khỏi khóa học {course_id}")
 
-    def _get_context(self, course_id: str, max_chunks: int = 30) -> str | None:
+    def _get_context(self, course_id: str, feature: str) -> str | None:
+        """
+        Ngữ cảnh cho một tính năng không có câu hỏi: lấy CONTEXT_CANDIDATE_FACTOR lần
+        số chunk vừa ngân sách, rải đều trên mọi tài liệu, xếp chunk tiêu biểu lên
+        trước (embedding đã lưu trong ChromaDB) rồi đóng gói theo MMR (gộp phần chồng lấp).
+        """
         try:
             collection = self.chroma_client.get_collection(name=course_id)
             if (count := collection.count()) == 0: return None
-            documents = collection.get(limit=min(count, max_chunks))
-            return "\n---\n".join(documents['documents'])
+            budget = CONTEXT_TOKEN_BUDGETS[feature]
+            max_chunks = budget // (TEXT_CHUNK_SIZE - TEXT_CHUNK_OVERLAP) + 1
+            include = ["documents", "metadatas", "embeddings"]
+            if ids := list(dict.fromkeys(self._get_manifest(course_id).sample_chunks(max_chunks * CONTEXT_CANDIDATE_FACTOR))):
+                data = collection.get(ids=ids, include=include)
+            else:  # Khóa học cũ chưa có bảng tham chiếu.
+                data = collection.get(limit=min(count, max_chunks * CONTEXT_CANDIDATE_FACTOR), include=include)
+            records = self._chunk_records(data['ids'], data['documents'], data['metadatas'], data['embeddings'])
+            records = [records[i] for i in representative_order([r["embedding"] for r in records])]
+            embeddings = [r["embedding"] for r in records]
+            return self.context_packer.pack(records, budget, embeddings, CONTEXT_MMR_LAMBDA.get(feature))
         except Exception as e:
             logger.error(f"Lỗi khi lấy ngữ cảnh đầy đủ cho {course_id}: {e}")
             return None
 
-    def get_chat_stream(self, course_id: str, question: str, history: list):
+    def _get_doc_chunk_records(self, course_id: str, file_hash: str) -> list[tuple[str, str]]:
+        """Toàn bộ chunk (ID, văn bản) của một tài liệu theo đúng thứ tự (theo bảng tham chiếu trong manifest)."""
+        chunk_ids = self._get_manifest(course_id).doc_chunks(file_hash)
+        if not chunk_ids: return []
+        data = self.chroma_client.get_collection(name=course_id).get(ids=list(dict.fromkeys(chunk_ids)), include=["documents"])
+        texts = dict(zip(data['ids'], data['documents']))
+        return [(chunk_id, texts[chunk_id]) for chunk_id in chunk_ids if chunk_id in texts]
+
+    def _get_doc_chunks(self, course_id: str, file_hash: str) -> list[str]:
+        return [text for _, text in self._get_doc_chunk_records(course_id, file_hash)]
+
+    def _get_summarizer(self, course_id: str) -> MapReduceSummarizer:
+        generate = lambda prompt: self.llm.generate(prompt, DEFAULT_MODEL)
+        return MapReduceSummarizer(generate, self.tokenizer, os.path.join(USER_DATA_PATH, course_id, "summaries"))
+
+    # --- NHÓM HÀM NGÂN HÀNG CÂU HỎI ---
+    def _get_question_bank(self, course_id: str) -> QuestionBank:
+        with self._manifests_lock:
+            if (bank := self._question_banks.get(course_id)) is None:
+                bank = self._question_banks[course_id] = QuestionBank(os.path.join(USER_DATA_PATH, course_id))
+            return bank
+
+    def _get_question_generator(self, kind: str) -> QuestionGenerator:
+        template = QUIZ_PROMPT_TEMPLATE if kind == "quiz" else STUDY_QUESTIONS_PROMPT_TEMPLATE
+        generate_batch = lambda prompts: self.llm.generate_batch(prompts, DEFAULT_MODEL, json_output=True)
+        return QuestionGenerator(generate_batch, self.tokenizer, kind, template, QUESTION_BANK_QUESTIONS_PER_GROUP[kind],
+                                 CONTEXT_TOKEN_BUDGETS[kind], DEFAULT_MODEL, QUESTION_BANK_EXTRA_ROUND_PREFIX)
+
+    def _generate_question_groups(self, course_id: str, generator: QuestionGenerator, docs: list[dict],
+                                  max_groups: int | None = None) -> tuple[int, list[Exception]]:
+        """
+        Sinh câu hỏi cho các nhóm chunk chưa có trong ngân hàng của các tài liệu
+        chưa được phủ hết: tối đa `max_groups` nhóm (None: tất cả), lấy lần lượt mỗi
+        tài liệu một nhóm ngẫu nhiên để câu hỏi trải đều trên khóa học. Các nhóm được
+        gửi theo lô QUESTION_BANK_FILL_GROUPS nhóm và lưu ngay sau mỗi lô; nhóm đang
+        được một lượt sinh khác xử lý bị bỏ qua. Trả về số nhóm đã sinh và các lỗi.
+        """
+        bank, rng = self._get_question_bank(course_id), random.Random()
+        kind, covered = generator.kind, bank.covered(generator.kind, generator.generator)
+        claimed = self._question_groups_claimed.setdefault((course_id, kind), set())
+        pending = [doc for doc in docs if doc["hash"] not in covered]
+        rng.shuffle(pending)
+        limit = max_groups if max_groups is not None else float("inf")
+        plans, tasks = [], []
+        # Chunk của tài liệu chỉ được đọc khi cần: lượt đầu mỗi tài liệu một nhóm, rồi các lượt sau.
+        for doc in pending:
+            if len(tasks) >= limit: break
+            groups = generator.group(self._get_doc_chunk_records(course_id, doc["hash"]))
+            done = bank.covered_groups(kind, generator.generator, doc["hash"])
+            with self._versions_lock:
+                remaining = [(i, group) for i, group in enumerate(groups) if i not in done and (doc["hash"], i) not in claimed]
+            rng.shuffle(remaining)
+            plans.append((doc, len(groups), remaining))
+            if remaining: tasks.append((doc, len(groups), *remaining.pop()))
+        while len(tasks) < limit and any(remaining for *_, remaining in plans):
+            for doc, total, remaining in plans:
+                if remaining and len(tasks) < limit: tasks.append((doc, total, *remaining.pop()))
+        generated, errors = 0, []
+        # Nhóm chỉ được giữ theo từng lô, để yêu cầu đồng bộ vẫn lấy được các nhóm chưa tới lượt trong nền.
+        for start in range(0, len(tasks), QUESTION_BANK_FILL_GROUPS):
+            part = tasks[start:start + QUESTION_BANK_FILL_GROUPS]
+            with self._versions_lock:
+                # Nhóm được lưu trước khi nhả giữ, nên nhóm không bị giữ và chưa có trong ngân hàng là chưa ai sinh.
+                done = {file_hash: bank.covered_groups(kind, generator.generator, file_hash) for file_hash in {task[0]["hash"] for task in part}}
+                part = [task for task in part if (task[0]["hash"], task[2]) not in claimed and task[2] not in done[task[0]["hash"]]]
+                claimed.update((doc["hash"], index) for doc, _, index, _ in part)
+            try:
+                if not part: continue
+                with tracer.span(f"feature.question_bank.{kind}"):
+                    outcomes = generator.generate_groups([group for *_, group in part])
+                for (doc, total, index, _), outcome in zip(part, outcomes):
+                    if isinstance(outcome, Exception):
+                        errors.append(outcome)
+                        continue
+                    bank.add_group(kind, generator.generator, doc["hash"], doc["name"], index, total, outcome)
+                    generated += 1
+            finally:
+                with self._versions_lock:
+                    claimed.difference_update((doc["hash"], index) for doc, _, index, _ in part)
+        tracer.count("question_bank_groups", generated, kind=kind)
+        return generated, errors
+
+    def _top_up_question_bank(self, course_id: str, generator: QuestionGenerator, docs: list[dict], count: int) -> int:
+        """
+        Bổ sung ngân hàng khi nó còn ít hơn `count` câu: nếu còn tài liệu chưa được phủ
+        hết, chỉ sinh vừa đủ số nhóm chunk cho số câu còn thiếu; ngược lại sinh thêm
+        một lượt cho các tài liệu chưa hết số lượt. Trả về số nhóm/tài liệu được bổ
+        sung. Lỗi chỉ được báo khi ngân hàng vẫn chưa có câu hỏi nào để dùng.
+        """
+        bank = self._get_question_bank(course_id)
+        kind, hashes = generator.kind, [doc["hash"] for doc in docs]
+        have = bank.count(kind, generator.generator, hashes)
+        if have >= count: return 0
+        covered = bank.covered(kind, generator.generator)
+        if any(doc["hash"] not in covered for doc in docs):
+            needed = -(-(count - have) // generator.questions_per_group)
+            extended, errors = self._generate_question_groups(course_id, generator, docs, needed)
+        else:
+            if not (extra := [doc for doc in docs if covered[doc["hash"]] < QUESTION_BANK_MAX_ROUNDS]): return 0
+            load_records = lambda file_hash: self._get_doc_chunk_records(course_id, file_hash)
+            with tracer.span(f"feature.question_bank.{kind}"):
+                results, errors = generator.generate(extra, load_records, bank.asked(kind, generator.generator, hashes))
+            for doc in extra:
+                if doc["hash"] in results:
+                    bank.add_round(kind, generator.generator, doc["hash"], doc["name"], results[doc["hash"]][1])
+            extended = len(results)
+            tracer.count("question_bank_docs", extended, kind=kind)
+        if errors and bank.count(kind, generator.generator, hashes) == 0:
+            raise errors[0]
+        return extended
+
+    def fill_question_bank(self, course_id: str, kind: str, background: bool = True) -> threading.Thread | None:
+        """
+        Sinh nốt câu hỏi cho mọi nhóm chunk chưa có trong ngân hàng `kind` của khóa
+        học (tài liệu mới thêm, phần còn lại sau yêu cầu đầu tiên). Mỗi khóa học và
+        loại câu hỏi chỉ có một lượt chạy: gọi khi lượt đó đang chạy trả về luồng
+        của nó. Trả về None nếu mọi tài liệu đã được phủ.
+        """
+        docs, generator = self.list_docs(course_id), self._get_question_generator(kind)
+        covered = self._get_question_bank(course_id).covered(kind, generator.generator)
+        key = (course_id, kind)
+
+        def run():
+            try:
+                self._generate_question_groups(course_id, generator, docs)
+            except Exception as e:
+                logger.warning(f"Không sinh nốt được ngân hàng câu hỏi ({kind}) của khóa học {course_id}: {e}")
+            finally:
+                with self._versions_lock:
+                    self._question_bank_fills.pop(key, None)
+
+        with self._versions_lock:
+            if (thread := self._question_bank_fills.get(key)) is not None: return thread
+            if all(doc["hash"] in covered for doc in docs): return None
+            thread = self._question_bank_fills[key] = threading.Thread(target=run, name=f"pnote-question-bank-{course_id}", daemon=True)
+        if background:
+            thread.start()
+        else:
+            thread.run()
+        return thread
+
+    def _sample_questions(self, course_id: str, kind: str, count: int) -> list | str:
+        """
+        `count` câu hỏi lấy mẫu ngẫu nhiên từ ngân hàng của khóa học. Chỉ khi ngân
+        hàng chưa đủ `count` câu mới phải chờ mô hình (chỉ các nhóm chunk cần thiết);
+        các phiên cùng lúc dùng chung một lượt sinh, và phần còn lại của khóa học được
+        sinh nốt trong nền. Có thể trả về ít hơn `count` câu khi mọi tài liệu đã hết
+        số lượt sinh.
+        """
+        if not (docs := self.list_docs(course_id)): return "Không có dữ liệu."
+        generator = self._get_question_generator(kind)
+        bank, hashes = self._get_question_bank(course_id), [doc["hash"] for doc in docs]
+        try:
+            # Phiên đi cùng một lượt sinh cho số câu nhỏ hơn sẽ tự sinh tiếp ở vòng sau.
+            while True:
+                extended = self.in_flight.do((course_id, "question_bank", kind),
+                                             lambda: self._top_up_question_bank(course_id, generator, docs, count))
+                if not extended or bank.count(kind, generator.generator, hashes) >= count: break
+        except Exception as e: return llm_error_message(e)
+        self.fill_question_bank(course_id, kind)
+        questions = bank.sample(kind, generator.generator, hashes, count)
+        return questions or "Không có dữ liệu."
+
+    # --- NHÓM HÀM CACHE CÂU TRẢ LỜI CHAT ---
+    def _get_answer_cache(self, course_id: str) -> SemanticAnswerCache:
+        with self._manifests_lock:
+            if (answer_cache := self._answer_caches.get(course_id)) is None:
+                answer_cache = self._answer_caches[course_id] = SemanticAnswerCache(
+                    os.path.join(USER_DATA_PATH, course_id), ANSWER_CACHE_SIMILARITY_THRESHOLD, ANSWER_CACHE_MAX_ENTRIES,
+                    self.embedder.model_name
+                )
+            return answer_cache
+
+    def is_answer_cache_enabled(self, course_id: str) -> bool:
+        try: return bool((self.chroma_client.get_collection(name=course_id).metadata or {}).get("answer_cache", False))
+        except Exception: return False
+
+    def set_answer_cache_enabled(self, course_id: str, enabled: bool):
+        """Bật/tắt cache câu trả lời cho một khóa học (lưu trong metadata của collection)."""
+        collection = self.chroma_client.get_collection(name=course_id)
+        vector_index.update_metadata(collection, answer_cache=bool(enabled))
+        self._bump_version(course_id)
+
+    def get_answer_cache_stats(self, course_id: str) -> dict:
+        """Tỉ lệ trúng và tổng thời gian sinh câu trả lời đã tiết kiệm được (giây) của khóa học."""
+        return self._get_answer_cache(course_id).stats()
+
+    # --- NHÓM HÀM LỊCH SỬ & BỘ NHỚ HỘI THOẠI ---
+    def _get_chat_store(self, course_id: str) -> ConversationStore:
+        with self._manifests_lock:
+            if (store := self._chat_stores.get(course_id)) is None:
+                store = self._chat_stores[course_id] = ConversationStore(os.path.join(USER_DATA_PATH, course_id))
+            return store
+
+    def _get_conversation_memory(self, course_id: str) -> ConversationMemory:
+        summarize = lambda prompt: self.llm.generate(prompt, DEFAULT_MODEL)
+        return ConversationMemory(self._get_chat_store(course_id), self.tokenizer, summarize, CHAT_HISTORY_TOKEN_BUDGET,
+                                  CHAT_HISTORY_KEEP_RATIO, CHAT_HISTORY_SUMMARY_PROMPT_TEMPLATE)
+
+    def load_chat_page(self, course_id: str, conversation_id: int, before_id: int | None = None,
+                       limit: int = CHAT_HISTORY_PAGE_SIZE) -> tuple[list[dict], bool]:
+        """Một trang tin nhắn của cuộc trò chuyện (mới nhất, hoặc ngay trước `before_id`) và còn trang cũ hơn không."""
+        return self._get_chat_store(course_id).page(conversation_id, before_id, limit)
+
+    def list_conversations(self, course_id: str, limit: int = CHAT_RECENT_CONVERSATIONS) -> list[dict]:
+        """Các cuộc trò chuyện gần đây của khóa học (mới nhất trước), để mở lại."""
+        return self._get_chat_store(course_id).recent(limit)
+
+    def new_conversation(self, course_id: str) -> int:
+        """
+        Mở một cuộc trò chuyện mới và trả về ID của nó. Mỗi phiên giữ ID cuộc trò
+        chuyện của mình; lịch sử các cuộc cũ vẫn được lưu.
+        """
+        return self._get_chat_store(course_id).new()
+
+    def get_chat_stream(self, course_id: str, question: str, conversation_id: int,
+                        on_record: Callable[[list[dict]], None] | None = None):
+        """
+        Trả lời câu hỏi dựa trên các chunk liên quan nhất và bộ nhớ của cuộc trò
+        chuyện `conversation_id` (bản tóm tắt các lượt cũ + các tin nhắn gần nhất);
+        lượt hỏi - đáp được lưu lại khi trả lời xong và `on_record` nhận hai tin nhắn
+        đã lưu (kèm "id", như load_chat_page). Nếu khóa học bật cache câu trả
+        lời và đây là câu hỏi mở đầu (chưa có lịch sử, nên câu trả lời không phụ
+        thuộc ngữ cảnh hội thoại), câu hỏi đủ giống một câu đã hỏi với cùng tập
+        tài liệu sẽ được phát lại câu trả lời cũ.
+        """
         if not GEMINI_API_KEY: yield "Lỗi: API Key chưa được cấu hình."; return
         try:
-            model = genai.GenerativeModel(DEFAULT_MODEL, system_instruction=DEFAULT_SYSTEM_PROMPT)
-            collection = self.chroma_client.get_collection(name=course_id)
-            context_results = collection.query(query_texts=[question], n_results=VECTOR_DB_SEARCH_RESULTS)
-            context = "\n---\n".join(context_results['documents'][0])
+            memory = self._get_conversation_memory(course_id)
+            with tracer.span("chat.memory"):
+                # Các lượt gửi trùng nhau của cùng một cuộc trò chuyện chỉ gộp lịch sử một lần.
+                summary, history = self.in_flight.do((course_id, "chat_memory", conversation_id),
+                                                     lambda: memory.context(conversation_id))
+            fresh = not history and summary is None
+            answer_cache = self._get_answer_cache(course_id) if fresh and self.is_answer_cache_enabled(course_id) else None
+            # Chế độ 'lexical' không cần embedding câu hỏi, trừ khi cache câu trả lời cần đến nó.
+            query_embedding = None
+            if answer_cache or RETRIEVAL_MODE != "lexical":
+                with tracer.span("chat.embed_query"):
+                    query_embedding = self.embedder.embed([question])
+            if answer_cache:
+                fingerprint = self._get_manifest(course_id).fingerprint()
+                cached = answer_cache.lookup(fingerprint, query_embedding[0])
+                tracer.count("cache_events", cache="answer", result="hit" if cached is not None else "miss")
+                if cached is not None:
+                    yield from replay_stream(cached)
+                    recorded = memory.record_turn(conversation_id, question, cached)
+                    if on_record: on_record(recorded)
+                    return
+            started = time.perf_counter()
+            mmr_lambda = CONTEXT_MMR_LAMBDA.get("chat")
+            with tracer.span("chat.retrieve"):
+                # MMR dùng embedding đã lưu cùng chunk trong ChromaDB, không tính lại.
+                records = self.retrieve(course_id, question, CHAT_CONTEXT_CANDIDATES, query_embedding=query_embedding,
+                                        with_embeddings=mmr_lambda is not None)
+            with tracer.span("chat.pack_context"):
+                embeddings = [r["embedding"] for r in records] if mmr_lambda is not None and records else None
+                context = self.context_packer.pack(records, CONTEXT_TOKEN_BUDGETS["chat"], embeddings, mmr_lambda)
             prompt = f"NGỮ CẢNH:\n{context}\n\nCÂU HỎI: {question}"
-            chat_session = model.start_chat(history=history)
-            for chunk in chat_session.send_message(prompt, stream=True): yield chunk.text
-        except Exception as e: yield f"Lỗi: {e}"
+            if summary:
+                prompt = f"TÓM TẮT CUỘC TRÒ CHUYỆN TRƯỚC ĐÓ:\n{summary}\n\n{prompt}"
+            parts = []
+            for text in self.llm.stream_chat(prompt, history, DEFAULT_MODEL, system_instruction=DEFAULT_SYSTEM_PROMPT):
+                parts.append(text)
+                yield text
+            if parts:
+                recorded = memory.record_turn(conversation_id, question, "".join(parts))
+                if on_record: on_record(recorded)
+            if answer_cache and parts:
+                answer_cache.store(fingerprint, question, query_embedding[0], "".join(parts), time.perf_counter() - started)
+        except Exception as e: yield llm_error_message(e)
+
+    def _run_feature(self, feature: str, course_id: str, key: str, compute: Callable[[], any]) -> any:
+        """
+        Trả kết quả từ cache nếu có; nếu không, chạy `compute` qua single-flight để
+        các phiên cùng yêu cầu (khóa học, tính năng, tham số) lúc đó chỉ tốn một
+        lần tính. Lỗi được trả cho mọi phiên đang chờ và không được cache.
+        """
+        if cached := self.result_cache.get(course_id, key):
+            tracer.count("cache_events", cache="result", result="hit")
+            return cached
+        tracer.count("cache_events", cache="result", result="miss")
+
+        def run():
+            # Có thể lượt tính trước vừa xong ngay trước khi lượt này bắt đầu.
+            if cached := self.result_cache.get(course_id, key): return cached
+            with tracer.span(f"feature.{feature}"):
+                result = compute()
+            if result is not None:
+                self.result_cache.set(course_id, key, result)
+            return result
 
-    def summarize(self, course_id: str) -> str:
-        path = self._get_cache_path(course_id, "summary")
-        if cached := self._load_from_cache(path): return cached
-        if not (context := self._get_context(course_id)): return "Không có dữ liệu."
         try:
-            model = genai.GenerativeModel(DEFAULT_MODEL)
-            response = model.generate_content(SUMMARY_PROMPT_TEMPLATE.format(context=context))
-            text = response.text
-            self._save_to_cache(path, text)
-            return text
-        except Exception as e: return f"Lỗi: {e}"
+            result = self.in_flight.do((course_id, key), run)
+        except Exception as e: return llm_error_message(e)
+        return "Không có dữ liệu." if result is None else result
+
+    def summarize(self, course_id: str) -> str:
+        key = self._cache_key(course_id, SUMMARY_PROMPT_TEMPLATE + PARTIAL_SUMMARY_PROMPT_TEMPLATE)
+
+        def compute():
+            if not (docs := self.list_docs(course_id)): return None
+            return self._get_summarizer(course_id).summarize(docs, lambda h: self._get_doc_chunks(course_id, h))
+        return self._run_feature("summarize", course_id, key, compute)
 
     def generate_quiz(self, course_id: str, num_q: int) -> list | str:
-        path = self._get_cache_path(course_id, f"quiz_{num_q}")
-        if cached := self._load_from_cache(path): return cached
-        if not (context := self._get_context(course_id)): return "Không có dữ liệu."
-        try:
-            model = genai.GenerativeModel(DEFAULT_MODEL)
-            response = model.generate_content(QUIZ_PROMPT_TEMPLATE.format(num_questions=num_q, context=context), generation_config={"response_mime_type": "application/json"})
-            data = json.loads(response.text)
-            self._save_to_cache(path, data)
-            return data
-        except Exception as e: return f"Lỗi: {e}"
+        return self._sample_questions(course_id, "quiz", num_q)
 
     def extract_keywords(self, course_id: str) -> list | str:
-        path = self._get_cache_path(course_id, "keywords")
-        if cached := self._load_from_cache(path): return cached
-        if not (context := self._get_context(course_id, 20)): return "Không có dữ liệu."
-        prompt = f"""Trích xuất 10-15 từ khóa/cụm từ khóa quan trọng từ ngữ cảnh. Trả về dưới dạng danh sách JSON. NGỮ CẢNH:\n{context}\n\nDANH SÁCH JSON:"""
-        try:
-            model = genai.GenerativeModel(DEFAULT_MODEL)
-            response = model.generate_content(prompt, generation_config={"response_mime_type": "application/json"})
-            data = json.loads(response.text)
-            self._save_to_cache(path, data)
-            return data
-        except Exception as e: return f"Lỗi: {e}"
+        key = self._cache_key(course_id, KEYWORDS_PROMPT_TEMPLATE)
+
+        def compute():
+            if not (context := self._get_context(course_id, "keywords")): return None
+            prompt = KEYWORDS_PROMPT_TEMPLATE.format(context=context)
+            return json.loads(self.llm.generate(prompt, DEFAULT_MODEL, json_output=True))
+        return self._run_feature("keywords", course_id, key, compute)
 
     def generate_study_questions(self, course_id: str, num_q: int = 5) -> list | str:
-        path = self._get_cache_path(course_id, f"study_q_{num_q}")
-        if cached := self._load_from_cache(path): return cached
-        if not (context := self._get_context(course_id)): return "Không có dữ liệu."
-        prompt = f"""Tạo {num_q} câu hỏi mở, sâu sắc từ ngữ cảnh để hỗ trợ học tập. Trả về dưới dạng danh sách JSON. NGỮ CẢNH:\n{context}\n\nDANH SÁCH JSON:"""
-        try:
-            model = genai.GenerativeModel(DEFAULT_MODEL)
-            response = model.generate_content(prompt, generation_config={"response_mime_type": "application/json"})
-            data = json.loads(response.text)
-            self._save_to_cache(path, data)
-            return data
-        except Exception as e: return f"Lỗi: {e}"
+        return self._sample_questions(course_id, "study_questions", num_q)
 
     def get_course_statistics(self, course_id: str) -> dict | None:
         try:
-            collection = self.chroma_client.get_collection(name=course_id)
-            chunks = collection.count()
-            docs = self.list_docs(course_id)
-            return {"doc_count": len(docs), "chunk_count": chunks, "token_est": chunks * TEXT_CHUNK_SIZE}
+            return self._get_manifest(course_id).totals()
         except Exception as e:
             logger.error(f"Lỗi lấy thống kê {course_id}: {e}")
             return None
 
-service_manager = ServiceManager()
+    def _embedding_cache_counters(self) -> list[tuple[str, dict, float]]:
+        # Chỉ đọc khi embedder đã được khởi tạo, để việc xuất metrics không kéo theo nạp chromadb.
+        if "embedder" not in self.__dict__: return []
+        stats = self.embedder.stats()
+        return [("cache_events", {"cache": "embedding", "result": "hit"}, stats["hits"]),
+                ("cache_events", {"cache": "embedding", "result": "miss"}, stats["misses"])]
+
+    def get_metrics_summary(self) -> list[dict]:
+        """Độ trễ theo giai đoạn (số lần, trung bình, p50/p95 gần đây) cho giao diện."""
+        return tracer.summary()
+
+    def get_metrics_text(self) -> str:
+        """Metrics theo định dạng văn bản của Prometheus."""
+        return tracer.render_prometheus()
+
+    def get_embedding_cache_stats(self) -> dict:
+        """Thống kê cache embedding dùng chung (tỉ lệ trúng, số mục đang lưu)."""
+        return self.embedder.stats()
+
+
+def __getattr__(name: str):
+    # `service_manager` được tạo ở lần truy cập đầu tiên (kể cả `from core.services import
+    # service_manager`), nên import module này không mở file hay khởi chạy luồng nào.
+    if name == "service_manager":
+        return ServiceManager()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,48 @@
+# pnote-ai-app/core/singleflight.py
+
+# ==============================================================================
+# GỘP CÁC YÊU CẦU TRÙNG LẶP ĐANG CHẠY (SINGLE-FLIGHT)
+#
+# service_manager được mọi phiên Streamlit dùng chung. Khi nhiều sinh viên cùng
+# bấm "Tạo tóm tắt" trên cùng một khóa học, chỉ phiên đầu tiên thực sự tính toán;
+# các phiên đến sau với cùng khóa chờ và nhận chung kết quả (hoặc chung lỗi).
+# Kết quả không được giữ lại sau khi lời gọi kết thúc — việc cache là của ResultCache.
+# ==============================================================================
+
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Hashable
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, Future] = {}
+        self.shared = 0  # Số lời gọi đã dùng chung kết quả thay vì tự tính.
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Chạy `fn` nếu chưa có lời gọi nào cùng `key` đang chạy, ngược lại chờ kết quả của lời gọi đó."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+            else:
+                self.shared += 1
+        if not leader:
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,171 @@
+# pnote-ai-app/core/snapshot.py
+
+# ==============================================================================
+# SNAPSHOT KHÔNG GIAN LÀM VIỆC (SAO LƯU / CHUYỂN SANG MÁY KHÁC)
+#
+# Một snapshot là một thư mục gồm:
+# - snapshot.json: phiên bản định dạng, tên khóa học, metadata và cấu hình HNSW
+#   của collection, mô hình embedding, số chiều và số chunk.
+# - chunks.jsonl.gz: mỗi dòng một chunk {"id", "text", "metadata"}, nén gzip.
+# - embeddings.npy: ma trận float32 [số chunk, số chiều] cùng thứ tự với
+#   chunks.jsonl.gz, đọc bằng np.load(mmap_mode="r") nên không phải nạp hết vào RAM.
+# - course_data.tar.gz: thư mục user_data/<course> (manifest, cache câu trả lời,
+#   lịch sử chat, ngân hàng câu hỏi, cache kết quả AI, tóm tắt từng phần).
+#   File SQLite được chép qua backup API nên nhất quán kể cả khi đang được mở.
+#   Chỉ mục BM25 (lớn gấp vài lần văn bản) được dựng lại từ chunk khi nhập; file
+#   tải lên đang chờ trong hàng đợi (uploads/) không được đưa vào snapshot.
+# Khi nhập, embedding có sẵn được ghi thẳng vào collection mới theo lô lớn, không
+# phải trích xuất, chia chunk hay gọi mô hình embedding lại.
+#
+#   python -m core.snapshot export kinh-te-vi-mo backups/kinh-te-vi-mo.snapshot
+#   python -m core.snapshot import backups/kinh-te-vi-mo.snapshot [--name "Tên mới"]
+# ==============================================================================
+
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+import tarfile
+import tempfile
+import time
+from typing import TYPE_CHECKING, Iterator
+
+if TYPE_CHECKING:
+    import numpy as np
+
+from core.bm25 import BM25_FILENAME
+
+SNAPSHOT_FORMAT = 1
+INFO_FILENAME = "snapshot.json"
+CHUNKS_FILENAME = "chunks.jsonl.gz"
+EMBEDDINGS_FILENAME = "embeddings.npy"
+COURSE_DATA_FILENAME = "course_data.tar.gz"
+# Thư mục con và file của user_data/<course> không đưa vào snapshot.
+EXCLUDED_DIRS = ("uploads",)
+EXCLUDED_FILES = (BM25_FILENAME,)
+SQLITE_SIDE_FILES = ("-wal", "-shm", "-journal")
+
+
+def _archive_course_dir(course_dir: str, archive_path: str):
+    with tarfile.open(archive_path, "w:gz") as tar, tempfile.TemporaryDirectory() as tmp:
+        if not os.path.isdir(course_dir): return
+        for root, dirs, files in os.walk(course_dir):
+            if root == course_dir:
+                dirs[:] = [d for d in dirs if d not in EXCLUDED_DIRS]
+            for name in sorted(files):
+                path, arcname = os.path.join(root, name), os.path.relpath(os.path.join(root, name), course_dir)
+                if name.endswith(SQLITE_SIDE_FILES) or (root == course_dir and name.startswith(EXCLUDED_FILES)): continue
+                if name.endswith(".sqlite3"):
+                    copy = os.path.join(tmp, "copy.sqlite3")
+                    src, dst = sqlite3.connect(path), sqlite3.connect(copy)
+                    try: src.backup(dst)
+                    finally: src.close(); dst.close()
+                    tar.add(copy, arcname=arcname)
+                    os.remove(copy)
+                else:
+                    tar.add(path, arcname=arcname)
+
+
+def export_snapshot(collection, course_dir: str, path: str, info: dict, batch_size: int) -> dict:
+    """
+    Ghi snapshot của `collection` và thư mục dữ liệu `course_dir` vào thư mục `path`
+    (chưa tồn tại). `info` là các trường mô tả thêm ("name", "metadata", "hnsw",
+    "embedding_model"). Thư mục được ghi dưới tên tạm rồi đổi tên khi xong.
+    Trả về nội dung snapshot.json kèm "bytes" (tổng dung lượng).
+    """
+    import numpy as np  # Import khi dùng lần đầu (numpy làm chậm lúc khởi động).
+    if os.path.exists(path):
+        raise FileExistsError(f"'{path}' đã tồn tại.")
+    partial = f"{path}.partial"
+    shutil.rmtree(partial, ignore_errors=True)
+    os.makedirs(partial)
+    try:
+        count = collection.count()
+        first = collection.get(limit=1, include=["embeddings"])["embeddings"] if count else []
+        dim = len(first[0]) if len(first) else 0
+        embeddings = np.lib.format.open_memmap(os.path.join(partial, EMBEDDINGS_FILENAME), mode="w+",
+                                               dtype=np.float32, shape=(count, dim))
+        written = 0
+        with gzip.open(os.path.join(partial, CHUNKS_FILENAME), "wt", encoding="utf-8") as f:
+            for offset in range(0, count, batch_size):
+                data = collection.get(include=["embeddings", "documents", "metadatas"], limit=batch_size, offset=offset)
+                n = len(data["ids"])
+                if written + n > count: break
+                embeddings[written:written + n] = np.asarray(data["embeddings"], dtype=np.float32)
+                for chunk_id, text, metadata in zip(data["ids"], data["documents"], data["metadatas"]):
+                    f.write(json.dumps({"id": chunk_id, "text": text, "metadata": metadata}, ensure_ascii=False) + "\n")
+                written += n
+        embeddings.flush()
+        del embeddings
+        if written != count or collection.count() != count:
+            raise RuntimeError("Collection thay đổi trong lúc xuất snapshot; hãy thử lại.")
+        _archive_course_dir(course_dir, os.path.join(partial, COURSE_DATA_FILENAME))
+        manifest = {"format": SNAPSHOT_FORMAT, **info, "dim": dim, "count": count, "created_at": time.time()}
+        with open(os.path.join(partial, INFO_FILENAME), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(partial, path)
+    except BaseException:
+        shutil.rmtree(partial, ignore_errors=True)
+        raise
+    size = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+    return {**manifest, "bytes": size}
+
+
+def read_info(path: str) -> dict:
+    """Nội dung snapshot.json; ValueError nếu không phải snapshot hoặc định dạng không hỗ trợ."""
+    try:
+        with open(os.path.join(path, INFO_FILENAME), encoding="utf-8") as f:
+            info = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        raise ValueError(f"'{path}' không phải snapshot hợp lệ: {e}") from e
+    if info.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"Định dạng snapshot {info.get('format')} không được hỗ trợ.")
+    return info
+
+
+def iter_batches(path: str, batch_size: int) -> Iterator[tuple[list[str], "np.ndarray", list[str], list[dict]]]:
+    """Các lô (ids, embeddings, documents, metadatas); embedding được đọc qua memory map."""
+    import numpy as np
+    embeddings = np.load(os.path.join(path, EMBEDDINGS_FILENAME), mmap_mode="r")
+    ids, documents, metadatas = [], [], []
+    start = 0
+    with gzip.open(os.path.join(path, CHUNKS_FILENAME), "rt", encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            ids.append(record["id"]); documents.append(record["text"]); metadatas.append(record["metadata"])
+            if len(ids) == batch_size:
+                yield ids, np.asarray(embeddings[start:start + len(ids)]), documents, metadatas
+                start += len(ids)
+                ids, documents, metadatas = [], [], []
+    if ids:
+        yield ids, np.asarray(embeddings[start:start + len(ids)]), documents, metadatas
+
+
+def restore_course_data(path: str, course_dir: str):
+    """Giải nén thư mục dữ liệu của khóa học vào `course_dir` (bỏ qua đường dẫn nằm ngoài thư mục đích)."""
+    os.makedirs(course_dir, exist_ok=True)
+    with tarfile.open(os.path.join(path, COURSE_DATA_FILENAME), "r:gz") as tar:
+        tar.extractall(course_dir, filter="data")
+
+
+if __name__ == "__main__":
+    import argparse
+    from core.services import service_manager
+
+    parser = argparse.ArgumentParser(description="Xuất/nhập snapshot của không gian làm việc.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="Ghi snapshot của một khóa học vào thư mục mới.")
+    export.add_argument("course_id")
+    export.add_argument("path")
+    restore = sub.add_parser("import", help="Tạo khóa học mới từ một snapshot.")
+    restore.add_argument("path")
+    restore.add_argument("--name", help="Tên không gian làm việc mới (mặc định: tên trong snapshot).")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        result = service_manager.export_course(args.course_id, args.path)
+        print(f"{args.course_id}: {result['count']} chunk, {result['bytes'] / 1e6:.1f} MB -> {args.path}")
+    else:
+        course_id, error = service_manager.import_course(args.path, args.name)
+        print(error or f"Đã nhập thành khóa học '{course_id}'.")
@@ -0,0 +1,132 @@
+# pnote-ai-app/core/summarizer.py
+
+# ==============================================================================
+# TÓM TẮT PHÂN CẤP (MAP-REDUCE) TRÊN TOÀN BỘ TÀI LIỆU
+#
+# 1. Map: mỗi tài liệu được chia thành các nhóm chunk vừa ngân sách token và
+#    tóm tắt song song (giới hạn số lời gọi mô hình đồng thời).
+# 2. Bản tóm tắt từng phần được lưu theo hash tài liệu trong
+#    user_data/<course>/summaries/, nằm ngoài thư mục cache nên không bị xóa khi
+#    thêm/xóa tài liệu khác — chỉ tài liệu mới cần gọi mô hình.
+# 3. Reduce: gộp các bản tóm tắt từng phần (gộp nhiều tầng nếu quá dài) và tạo
+#    kết quả cuối cùng bằng SUMMARY_PROMPT_TEMPLATE.
+# ==============================================================================
+
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from config import (
+    DEFAULT_MODEL, SUMMARY_PROMPT_TEMPLATE, PARTIAL_SUMMARY_PROMPT_TEMPLATE,
+    SUMMARY_MAX_PARALLEL_CALLS, CONTEXT_TOKEN_BUDGETS, SUMMARY_REDUCE_MAX_TOKENS
+)
+from core.context import ContextPacker
+
+logger = logging.getLogger(__name__)
+
+
+class MapReduceSummarizer:
+    def __init__(self, generate: Callable[[str], str], tokenizer, partials_dir: str,
+                 max_parallel: int = SUMMARY_MAX_PARALLEL_CALLS, group_tokens: int = CONTEXT_TOKEN_BUDGETS["summary"],
+                 reduce_max_tokens: int = SUMMARY_REDUCE_MAX_TOKENS, model_name: str = DEFAULT_MODEL):
+        self.generate = generate
+        self.tokenizer = tokenizer
+        self.packer = ContextPacker(tokenizer)
+        self.partials_dir = partials_dir
+        self.max_parallel = max_parallel
+        self.group_tokens = group_tokens
+        self.reduce_max_tokens = reduce_max_tokens
+        self.model_name = model_name
+
+    # --- LƯU TRỮ BẢN TÓM TẮT TỪNG PHẦN ---
+    def _partial_path(self, file_hash: str) -> str:
+        return os.path.join(self.partials_dir, f"{file_hash}.json")
+
+    def load_partial(self, file_hash: str) -> str | None:
+        try:
+            with open(self._partial_path(file_hash), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data["summary"] if data.get("model") == self.model_name else None
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            return None
+
+    def save_partial(self, file_hash: str, name: str, summary: str):
+        os.makedirs(self.partials_dir, exist_ok=True)
+        path = self._partial_path(file_hash)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"model": self.model_name, "name": name, "summary": summary}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def drop_partial(self, file_hash: str):
+        try: os.remove(self._partial_path(file_hash))
+        except FileNotFoundError: pass
+
+    # --- CÁC BƯỚC MAP / REDUCE ---
+    def _group(self, texts: list[str], budget: int) -> list[list[str]]:
+        """Gom các đoạn văn bản liên tiếp thành nhóm có tổng số token không vượt `budget`."""
+        groups, current, used = [], [], 0
+        for text in texts:
+            tokens = len(self.tokenizer.encode(text))
+            if current and used + tokens > budget:
+                groups.append(current)
+                current, used = [], 0
+            current.append(text)
+            used += tokens
+        if current:
+            groups.append(current)
+        return groups
+
+    def _summarize_parts(self, pool: ThreadPoolExecutor, parts: list[str]) -> list[str]:
+        """Tóm tắt song song từng phần (mỗi phần một lời gọi mô hình)."""
+        prompts = [PARTIAL_SUMMARY_PROMPT_TEMPLATE.format(context=part) for part in parts]
+        return list(pool.map(self.generate, prompts))
+
+    def _summarize_document(self, pool: ThreadPoolExecutor, load_chunks: Callable[[str], list[str]], file_hash: str) -> str | None:
+        """Tóm tắt một tài liệu; chunk chỉ được nạp khi tác vụ chạy. None nếu tài liệu không có chunk nào."""
+        if not (chunks := load_chunks(file_hash)):
+            return None
+        groups = [self.packer.merge_texts(group) for group in self._group(chunks, self.group_tokens)]
+        partials = self._summarize_parts(pool, groups)
+        # Tài liệu dài: gộp các nhóm lại cho đến khi chỉ còn một bản tóm tắt.
+        while len(partials) > 1:
+            merged = ["\n\n".join(group) for group in self._group(partials, self.group_tokens)]
+            if len(merged) == len(partials):
+                merged = ["\n\n".join(partials)]
+            partials = self._summarize_parts(pool, merged)
+        return partials[0]
+
+    def summarize(self, documents: list[dict], load_chunks: Callable[[str], list[str]]) -> str | None:
+        """
+        Tóm tắt toàn bộ `documents` (danh sách {"hash", "name"}); `load_chunks`
+        chỉ được gọi cho những tài liệu chưa có bản tóm tắt từng phần, bên trong tác
+        vụ của tài liệu đó. Tài liệu không có chunk nào (thiếu tham chiếu, lần nạp bị
+        ngắt) bị bỏ qua và được thử lại ở lần sau; trả về None nếu không còn tài liệu nào.
+        """
+        partials = {doc['hash']: self.load_partial(doc['hash']) for doc in documents}
+        missing = [doc for doc in documents if partials[doc['hash']] is None]
+        if missing:
+            logger.info(f"Tóm tắt mới {len(missing)}/{len(documents)} tài liệu.")
+        with ThreadPoolExecutor(max_workers=self.max_parallel) as pool:
+            # Các tài liệu được xử lý đồng thời; mỗi tài liệu lại gửi các nhóm chunk vào cùng pool.
+            with ThreadPoolExecutor(max_workers=self.max_parallel) as doc_pool:
+                futures = {doc['hash']: doc_pool.submit(self._summarize_document, pool, load_chunks, doc['hash'])
+                           for doc in missing}
+                for doc in missing:
+                    partials[doc['hash']] = summary = futures[doc['hash']].result()
+                    if summary is None:
+                        logger.warning(f"Bỏ qua tài liệu '{doc['name']}' khi tóm tắt: không tìm thấy chunk nào.")
+                    else:
+                        self.save_partial(doc['hash'], doc['name'], summary)
+
+            sections = [f"### {doc['name']}\n{partials[doc['hash']]}" for doc in documents if partials[doc['hash']] is not None]
+            if not sections:
+                return None
+            while sum(len(self.tokenizer.encode(s)) for s in sections) > self.reduce_max_tokens and len(sections) > 1:
+                groups = ["\n\n".join(group) for group in self._group(sections, self.reduce_max_tokens)]
+                if len(groups) == len(sections):
+                    break
+                sections = self._summarize_parts(pool, groups)
+        return self.generate(SUMMARY_PROMPT_TEMPLATE.format(context="\n\n".join(sections)))
@@ -0,0 +1,177 @@
+# pnote-ai-app/core/vector_index.py
+
+# ==============================================================================
+# CẤU HÌNH & BẢO TRÌ CHỈ MỤC VECTOR (HNSW) CỦA CÁC KHÓA HỌC
+#
+# 1. Mỗi collection dùng khoảng cách cosine và cấu hình HNSW (max_neighbors,
+#    ef_construction, ef_search) theo bậc kích thước corpus trong VECTOR_INDEX_PROFILES.
+#    Collection mới được tạo với bậc nhỏ nhất.
+# 2. ef_search chỉ ảnh hưởng lúc truy vấn nên được chỉnh tại chỗ (tune) khi corpus
+#    lớn lên; giá trị mới có hiệu lực khi chỉ mục được nạp lại (lần khởi động sau).
+#    space, max_neighbors và ef_construction gắn với đồ thị đã dựng nên chỉ đổi
+#    được bằng cách dựng lại collection (rebuild).
+# 3. HNSW chỉ đánh dấu phần tử bị xóa; số chunk đã xóa được đếm trong metadata của
+#    collection để biết khi nào nên rebuild cho gọn chỉ mục.
+# 4. Rebuild chép ID, embedding, văn bản và metadata theo lô sang một collection tạm,
+#    rồi xóa collection cũ và đổi tên collection tạm (không phải tính lại embedding).
+#    Nếu bị gián đoạn sau khi đã xóa collection cũ, lần chạy sau hoàn tất việc đổi tên.
+#
+# Công cụ dòng lệnh (nên chạy khi ứng dụng đang tắt):
+#   python -m core.vector_index status [course_id ...]
+#   python -m core.vector_index tune [course_id ...]
+#   python -m core.vector_index rebuild [--force] [course_id ...]
+# ==============================================================================
+
+import argparse
+import logging
+
+from config import VECTOR_INDEX_PROFILES, VECTOR_INDEX_REBUILD_DELETED_RATIO, VECTOR_INDEX_COPY_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+DELETED_KEY = "vector_index:deleted"
+REBUILD_OF_KEY = "rebuild_of"
+GRAPH_KEYS = ("space", "max_neighbors", "ef_construction")
+
+
+def index_profile(count: int) -> dict:
+    """Cấu hình HNSW cho một corpus có `count` chunk (bậc đầu tiên đủ chứa nó)."""
+    for max_chunks, profile in VECTOR_INDEX_PROFILES:
+        if max_chunks is None or count <= max_chunks:
+            return dict(profile)
+    return dict(VECTOR_INDEX_PROFILES[-1][1])
+
+
+def hnsw_config(collection) -> dict:
+    return dict((collection.configuration or {}).get("hnsw") or {})
+
+
+def collection_space(collection) -> str:
+    """Hàm khoảng cách của collection (collection tạo trước khi có cấu hình HNSW dùng "l2")."""
+    return hnsw_config(collection).get("space", "l2")
+
+
+def user_metadata(collection) -> dict:
+    """
+    Metadata của collection không kèm các khóa "hnsw:*" cũ: ChromaDB từ chối
+    modify(metadata=...) nếu các khóa này có mặt, còn cấu hình HNSW vẫn được giữ riêng.
+    """
+    return {k: v for k, v in (collection.metadata or {}).items() if not k.startswith("hnsw:")}
+
+
+def update_metadata(collection, **changes):
+    """Ghi đè một số khóa metadata (modify thay toàn bộ metadata, nên phải gộp với giá trị cũ)."""
+    collection.modify(metadata={**user_metadata(collection), **changes})
+
+
+def record_deletes(collection, count: int):
+    """Cộng dồn số chunk đã xóa khỏi chỉ mục kể từ lần dựng gần nhất."""
+    if count > 0:
+        update_metadata(collection, **{DELETED_KEY: int((collection.metadata or {}).get(DELETED_KEY, 0)) + count})
+
+
+def status(collection) -> dict:
+    """Tình trạng chỉ mục: số chunk, cấu hình hiện tại và cấu hình nên dùng, tỉ lệ đã xóa, việc cần làm."""
+    count = collection.count()
+    current, wanted = hnsw_config(collection), index_profile(count)
+    deleted = int((collection.metadata or {}).get(DELETED_KEY, 0))
+    deleted_ratio = deleted / (count + deleted) if count + deleted else 0.0
+    return {
+        "name": collection.name, "count": count, "deleted": deleted, "deleted_ratio": deleted_ratio,
+        "current": {key: current.get(key) for key in (*GRAPH_KEYS, "ef_search")}, "wanted": wanted,
+        "needs_tune": current.get("ef_search") != wanted["ef_search"],
+        "needs_rebuild": any(current.get(key) != wanted[key] for key in GRAPH_KEYS)
+        or (deleted > 0 and deleted_ratio >= VECTOR_INDEX_REBUILD_DELETED_RATIO),
+    }
+
+
+def tune(collection, count: int | None = None) -> bool:
+    """
+    Đặt ef_search theo kích thước corpus hiện tại. Trả về True nếu có thay đổi;
+    chỉ mục đang nạp trong bộ nhớ vẫn dùng giá trị cũ cho tới khi được nạp lại.
+    """
+    ef_search = index_profile(collection.count() if count is None else count)["ef_search"]
+    if hnsw_config(collection).get("ef_search") == ef_search:
+        return False
+    collection.modify(configuration={"hnsw": {"ef_search": ef_search}})
+    logger.info(f"Chỉ mục vector '{collection.name}': ef_search = {ef_search}.")
+    return True
+
+
+def _temp_name(name: str) -> str:
+    return f"{name}-rebuild"
+
+
+def rebuild(client, name: str, batch_size: int = VECTOR_INDEX_COPY_BATCH_SIZE) -> dict:
+    """
+    Dựng lại collection `name` với cấu hình HNSW theo kích thước hiện tại, bỏ các
+    phần tử đã xóa khỏi đồ thị. Trả về {"name", "count", "profile"}.
+    """
+    temp_name = _temp_name(name)
+    existing = {c.name: c for c in client.list_collections()}
+    if name not in existing:
+        # Lần chạy trước đã xóa collection cũ nhưng chưa kịp đổi tên collection tạm.
+        temp = existing.get(temp_name)
+        if temp is None or (temp.metadata or {}).get(REBUILD_OF_KEY) != name:
+            raise ValueError(f"Không tìm thấy collection '{name}'.")
+        return _finish(temp, name)
+    if temp_name in existing:
+        client.delete_collection(temp_name)  # Bản chép dở của lần chạy trước.
+
+    source = existing[name]
+    count = source.count()
+    profile = index_profile(count)
+    metadata = {k: v for k, v in user_metadata(source).items() if k != DELETED_KEY}
+    temp = client.create_collection(temp_name, metadata={**metadata, REBUILD_OF_KEY: name},
+                                    configuration={"hnsw": profile}, embedding_function=None)
+    for offset in range(0, count, batch_size):
+        data = source.get(include=["embeddings", "documents", "metadatas"], limit=batch_size, offset=offset)
+        if data["ids"]:
+            temp.add(ids=data["ids"], embeddings=data["embeddings"], documents=data["documents"], metadatas=data["metadatas"])
+    if temp.count() != count:
+        client.delete_collection(temp_name)
+        raise RuntimeError(f"Chép collection '{name}' không đầy đủ ({temp.count()}/{count} chunk); giữ nguyên bản cũ.")
+    client.delete_collection(name)
+    return _finish(temp, name)
+
+
+def _finish(temp, name: str) -> dict:
+    temp.modify(name=name, metadata={k: v for k, v in user_metadata(temp).items() if k != REBUILD_OF_KEY})
+    profile = {key: value for key, value in hnsw_config(temp).items() if key in (*GRAPH_KEYS, "ef_search")}
+    logger.info(f"Đã dựng lại chỉ mục vector '{name}' ({temp.count()} chunk, {profile}).")
+    return {"name": name, "count": temp.count(), "profile": profile}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Xem, chỉnh và dựng lại chỉ mục vector của các khóa học.")
+    parser.add_argument("command", choices=("status", "tune", "rebuild"))
+    parser.add_argument("course_ids", nargs="*", help="Các khóa học cần xử lý (mặc định: tất cả).")
+    parser.add_argument("--force", action="store_true", help="rebuild: dựng lại cả khi chưa cần.")
+    args = parser.parse_intermixed_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    import chromadb
+    from config import CHROMA_DB_PATH
+    client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
+    collections = {c.name: c for c in client.list_collections() if REBUILD_OF_KEY not in (c.metadata or {})}
+    names = args.course_ids or sorted(collections)
+    for name in names:
+        if name not in collections and args.command != "rebuild":
+            print(f"{name}: không tồn tại")
+            continue
+        if args.command == "status":
+            s = status(collections[name])
+            actions = [action for action, needed in (("tune", s["needs_tune"]), ("rebuild", s["needs_rebuild"])) if needed]
+            print(f"{name}: {s['count']} chunk, đã xóa {s['deleted']} ({s['deleted_ratio']:.0%}),"
+                  f" hiện tại {s['current']}, nên dùng {s['wanted']}, cần: {', '.join(actions) or 'không'}")
+        elif args.command == "tune":
+            print(f"{name}: {'đã chỉnh ef_search (có hiệu lực khi khởi động lại)' if tune(collections[name]) else 'không đổi'}")
+        elif args.force or name not in collections or status(collections[name])["needs_rebuild"]:
+            result = rebuild(client, name)
+            print(f"{name}: đã dựng lại {result['count']} chunk với {result['profile']}")
+        else:
+            print(f"{name}: chưa cần dựng lại (dùng --force để dựng lại)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# pnote-ai-app/pages/search.py
+import streamlit as st
+from ui import utils, sidebar
+from core.services import service_manager
+
+# --- BƯỚC 1: KHỞI TẠO TRANG VÀ CÁC THÀNH PHẦN GIAO DIỆN CHUNG ---
+utils.page_init("Tìm kiếm")
+sidebar.display()
+
+st.header("🔎 Tìm kiếm trên mọi không gian làm việc", divider="orange")
+
+# --- BƯỚC 2: KIỂM TRA ĐIỀU KIỆN - CẦN CÓ ÍT NHẤT MỘT WORKSPACE ---
+courses = st.session_state.courses
+if not courses:
+    st.info("Chưa có không gian làm việc nào. Hãy tạo một không gian làm việc từ sidebar.")
+    st.stop()
+names = {c['id']: c['name'] for c in courses}
+
+
+def show_results(results: list[dict], with_links: bool):
+    """Hiển thị kết quả đã gộp; nút mở workspace chỉ được vẽ ở lần hiển thị cuối (khóa widget không được trùng)."""
+    if not results:
+        st.info("Không tìm thấy đoạn tài liệu phù hợp.")
+    for i, r in enumerate(results):
+        with st.container(border=True):
+            col_text, col_link = st.columns([0.82, 0.18])
+            col_text.markdown(f"**{r['course_name']}** · 📄 {r['source']} · độ tương đồng {r['score']:.2f}")
+            col_text.caption(r['text'][:500] + ("…" if len(r['text']) > 500 else ""))
+            if with_links and col_link.button("Mở workspace", key=f"open_{i}_{r['course_id']}", use_container_width=True):
+                st.session_state.cid = r['course_id']
+                st.switch_page("pages/workspace.py")
+
+
+# --- BƯỚC 3: FORM TÌM KIẾM ---
+with st.form("global_search"):
+    query = st.text_input("Câu hỏi hoặc từ khóa", placeholder="Vd: Định luật Ohm phát biểu như thế nào?")
+    selected = st.multiselect("Chỉ tìm trong", options=list(names), format_func=names.get,
+                              placeholder="Tất cả không gian làm việc")
+    submitted = st.form_submit_button("Tìm kiếm", type="secondary", use_container_width=True)
+
+# --- BƯỚC 4: TÌM SONG SONG VÀ HIỂN THỊ DẦN KẾT QUẢ ---
+# Kết quả tạm thời được vẽ lại sau mỗi workspace trả lời, nên người dùng thấy kết quả
+# ngay khi workspace nhanh nhất xong thay vì chờ tất cả.
+if submitted and query.strip():
+    progress, partial = st.empty(), st.empty()
+    results, errors = [], []
+    for event in st.session_state.get("sm", service_manager).iter_search_all(query, selected or None):
+        results = event["results"]
+        if event["error"]: errors.append(names.get(event["course_id"], event["course_id"]))
+        progress.caption(f"Đã tìm {event['done']}/{event['total']} không gian làm việc")
+        with partial.container():
+            show_results(results, with_links=False)
+    partial.empty()
+    st.session_state.global_search_results = {"query": query, "results": results, "errors": errors}
+
+if search := st.session_state.get("global_search_results"):
+    if search["errors"]:
+        st.warning(f"Không tìm được trong: {', '.join(search['errors'])}")
+    show_results(search["results"], with_links=True)
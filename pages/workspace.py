@@ -1,7 +1,7 @@
 # pnote-ai-app/pages/workspace.py
 import streamlit as st
-from ui import utils, sidebar, onboarding
-from core.services import service_manager, slugify, calculate_file_hash
+from ui import utils, sidebar, onboarding, data
+from core.services import service_manager
 
 # --- BƯỚC 1: KHỞI TẠO TRANG VÀ CÁC THÀNH PHẦN GIAO DIỆN CHUNG ---
 utils.page_init("Workspace")
@@ -25,172 +25,272 @@ name = next((c['name'] for c in st.session_state.courses if c['id'] == cid), "Kh
 st.header(f"Workspace: {name}", divider="orange")
 
 # --- BƯỚC 3: KHỞI TẠO CÁC TAB CHỨC NĂNG ---
+# on_change="rerun" bật chế độ chạy lười: chỉ nội dung của tab đang mở (tab.open)
+# được tính, nên trò chuyện không phải chờ danh sách tài liệu hay thống kê.
 tab_chat, tab_docs, tab_summary, tab_analysis, tab_learning = st.tabs([
     "💬 Trò chuyện (RAG)", 
     "📚 Quản lý Tài liệu", 
     "✨ Tóm tắt AI", 
     "📊 Phân tích & Insights", 
     "🧠 Học tập AI"
-])
+], key="workspace_tabs", on_change="rerun")
 
 
 # --- TAB 1: TRÒ CHUYỆN (RAG) ---
 with tab_chat:
-    # Khởi tạo lịch sử chat cho không gian làm việc này nếu chưa có
-    if cid not in st.session_state.history:
-        st.session_state.history[cid] = []
-    
-    # Hiển thị các tin nhắn đã có
-    for msg in st.session_state.history[cid]:
-        with st.chat_message(msg["role"]):
-            st.markdown(msg["parts"][0])
+    if tab_chat.open:
+        sm = st.session_state.sm
+        # Tin nhắn được lưu trong service; phiên chỉ giữ ID cuộc trò chuyện đang mở và các
+        # trang đã tải. Lần đầu mở tab, phiên tiếp tục cuộc trò chuyện gần nhất của workspace.
+        conversations = sm.list_conversations(cid)
+
+        def open_conversation(conversation_id):
+            messages, has_more = sm.load_chat_page(cid, conversation_id) if conversation_id else ([], False)
+            st.session_state.history[cid] = {"conversation_id": conversation_id, "messages": messages, "has_more": has_more}
+            return st.session_state.history[cid]
+
+        if cid not in st.session_state.history:
+            open_conversation(conversations[0]["id"] if conversations else None)
+        chat = st.session_state.history[cid]
+
+        col_pick, col_new = st.columns([0.7, 0.3])
+        if conversations:
+            ids = [c["id"] for c in conversations]
+            titles = {c["id"]: f"{' '.join(c['title'].split())[:60]} ({c['messages']} tin nhắn)" for c in conversations}
+            # Ô chọn luôn hiển thị cuộc trò chuyện đang mở; chọn cuộc khác sẽ mở lại cuộc đó.
+            st.session_state[f"conversation_{cid}"] = chat["conversation_id"] if chat["conversation_id"] in ids else None
+            col_pick.selectbox("Cuộc trò chuyện", ids, format_func=titles.get, label_visibility="collapsed",
+                               key=f"conversation_{cid}", placeholder="Mở lại một cuộc trò chuyện gần đây...",
+                               on_change=lambda: open_conversation(st.session_state[f"conversation_{cid}"]))
+        col_new.button("🆕 Cuộc trò chuyện mới", use_container_width=True, disabled=not chat["messages"],
+                       on_click=open_conversation, args=(None,))
+
+        # Cache câu trả lời: dùng lại câu trả lời cho các câu hỏi tương tự trong workspace
+        answer_cache_on = data.is_answer_cache_enabled(cid)
+        if st.toggle("♻️ Dùng lại câu trả lời cho câu hỏi tương tự", value=answer_cache_on, key=f"answer_cache_{cid}") != answer_cache_on:
+            sm.set_answer_cache_enabled(cid, not answer_cache_on)
+
+        # Tải thêm một trang tin nhắn cũ hơn khi người dùng yêu cầu
+        if chat["has_more"] and st.button("⬆️ Xem tin nhắn cũ hơn", use_container_width=True):
+            older, chat["has_more"] = sm.load_chat_page(cid, chat["conversation_id"], before_id=chat["messages"][0]["id"])
+            chat["messages"] = older + chat["messages"]
+
+        # Hiển thị các tin nhắn đã có
+        for msg in chat["messages"]:
+            with st.chat_message("user" if msg["role"] == "user" else "assistant"):
+                st.markdown(msg["text"])
     
-    # Nhận input mới từ người dùng
-    if prompt := st.chat_input("Hỏi điều gì đó về tài liệu của bạn..."):
-        # Thêm và hiển thị tin nhắn của người dùng
-        st.session_state.history[cid].append({"role":"user", "parts":[prompt]})
-        st.chat_message("user").markdown(prompt)
-
-        # Lấy và hiển thị phản hồi từ AI
-        with st.chat_message("assistant"):
-            with st.spinner("AI đang tìm kiếm câu trả lời..."):
-                stream = st.session_state.sm.get_chat_stream(cid, prompt, st.session_state.history[cid][:-1])
-                response = st.write_stream(stream)
-        
-        # Lưu lại phản hồi của AI vào lịch sử
-        st.session_state.history[cid].append({"role":"model", "parts":[response]})
+        # Nhận input mới từ người dùng
+        if prompt := st.chat_input("Hỏi điều gì đó về tài liệu của bạn..."):
+            # Hiển thị tin nhắn của người dùng
+            st.chat_message("user").markdown(prompt)
+
+            # Lấy và hiển thị phản hồi từ AI (lượt hỏi - đáp được lưu lại trong service)
+            recorded = []
+            with st.chat_message("assistant"):
+                with st.spinner("AI đang tìm kiếm câu trả lời..."):
+                    if chat["conversation_id"] is None:
+                        chat["conversation_id"] = sm.new_conversation(cid)
+                    stream = sm.get_chat_stream(cid, prompt, chat["conversation_id"], on_record=recorded.extend)
+                    st.write_stream(stream)
+
+            # Chỉ lượt đã được lưu mới vào lịch sử (kèm ID, dùng để tải các trang cũ hơn).
+            chat["messages"].extend(recorded)
 
 
 # --- TAB 2: QUẢN LÝ TÀI LIỆU ---
 with tab_docs:
-    col1, col2 = st.columns(2)
-    with col1:
-        st.subheader("➕ Thêm tài liệu mới")
-        with st.form("add_doc", clear_on_submit=True):
-            source_type = st.radio("Loại nguồn:", ["File", "Web", "YouTube"], horizontal=True, label_visibility="collapsed")
-            if source_type == "File":
-                files = st.file_uploader("Chọn file PDF, DOCX", type=["pdf", "docx"], accept_multiple_files=True, label_visibility="collapsed")
-            else:
-                url = st.text_input("Dán đường dẫn URL", label_visibility="collapsed")
+    if tab_docs.open:
+        col1, col2 = st.columns(2)
+        with col1:
+            st.subheader("➕ Thêm tài liệu mới")
+            with st.form("add_doc", clear_on_submit=True):
+                source_type = st.radio("Loại nguồn:", ["File", "Web", "YouTube"], horizontal=True, label_visibility="collapsed")
+                if source_type == "File":
+                    files = st.file_uploader("Chọn file PDF, DOCX", type=["pdf", "docx"], accept_multiple_files=True, label_visibility="collapsed")
+                else:
+                    url = st.text_input("Dán đường dẫn URL", label_visibility="collapsed")
             
-            submitted = st.form_submit_button("Thêm vào Workspace", type="secondary", use_container_width=True)
+                submitted = st.form_submit_button("Thêm vào Workspace", type="secondary", use_container_width=True)
 
-        if submitted:
-            sources = files if source_type == "File" and files else ([url] if source_type != "File" and url else [])
-            if not sources:
-                st.warning("Vui lòng cung cấp nguồn tài liệu.")
-            else:
-                stype_map = {"File": lambda f: 'pdf' if f.type=="application/pdf" else 'docx', "Web": "url", "YouTube": "youtube"}
-                progress_bar = st.progress(0, "Bắt đầu...")
-                for i, sdata in enumerate(sources):
-                    name = getattr(sdata, 'name', sdata)
-                    progress_bar.progress((i + 1) / len(sources), f"Xử lý: {name}")
-                    
-                    stype_key = stype_map[source_type](sdata) if source_type=="File" else stype_map[source_type]
-                    file_hash = calculate_file_hash(sdata.getvalue()) if hasattr(sdata, 'getvalue') else slugify(sdata)
-                    
-                    if st.session_state.sm.hash_exists(cid, file_hash):
-                        st.toast(f"Bỏ qua: '{name}' đã tồn tại.", icon="⚠️")
-                        continue
-                        
-                    text, _ = st.session_state.sm.extract_text_from_source(stype_key, sdata)
-                    if text:
-                        st.session_state.sm.add_doc(cid, text, name, file_hash)
-                        st.toast(f"Đã thêm '{name}'.", icon="✅")
-                    else:
-                        st.toast(f"Lỗi trích xuất '{name}'.", icon="❌")
-                progress_bar.empty()
-                st.rerun()
-
-    with col2:
-        st.subheader("📖 Tài liệu hiện có")
-        docs = st.session_state.sm.list_docs(cid)
-        if not docs:
-            st.info("Không gian này chưa có tài liệu nào. Hãy thêm một vài tài liệu để bắt đầu!")
-        else:
-            for doc in docs:
-                c1, c2 = st.columns([0.9, 0.1])
-                c1.markdown(f"📄 `{doc['name']}`")
-                if c2.button("🗑️", key=f"del_{doc['hash']}", help="Xóa tài liệu này"):
-                    st.session_state.sm.delete_doc(cid, doc['hash'])
+            if submitted:
+                sources = files if source_type == "File" and files else ([url] if source_type != "File" and url else [])
+                if not sources:
+                    st.warning("Vui lòng cung cấp nguồn tài liệu.")
+                else:
+                    stype_map = {"File": lambda f: 'pdf' if f.type=="application/pdf" else 'docx', "Web": "url", "YouTube": "youtube"}
+                    batch = [(stype_map[source_type](sdata) if source_type=="File" else stype_map[source_type], sdata) for sdata in sources]
+                    # Chỉ xếp hàng rồi trả về ngay; worker chạy nền thực hiện việc nạp tài liệu.
+                    for job in st.session_state.sm.enqueue_sources(cid, batch):
+                        if job["status"] == "skipped":
+                            st.toast(f"Bỏ qua: '{job['name']}' đã tồn tại.", icon="⚠️")
                     st.rerun()
 
+            jobs = st.session_state.sm.list_jobs(cid)
+            if jobs:
+                # Chỉ thăm dò trạng thái khi còn job chưa xong; khi có tài liệu mới được
+                # ghi (data_version đổi) thì chạy lại cả trang để cập nhật danh sách.
+                active = any(job["status"] in ("queued", "running") for job in jobs)
+
+                @st.fragment(run_every=2 if active else None)
+                def ingest_jobs():
+                    sm = st.session_state.sm
+                    version = sm.data_version(cid)
+                    if st.session_state.setdefault(f"jobs_version_{cid}", version) != version:
+                        st.session_state[f"jobs_version_{cid}"] = version
+                        st.rerun(scope="app")
+                    current = sm.list_jobs(cid)
+                    if active and not any(job["status"] in ("queued", "running") for job in current):
+                        st.rerun(scope="app")
+                    st.caption("Hàng đợi nạp tài liệu")
+                    icons = {"queued": "⏳", "running": "⚙️", "added": "✅", "skipped": "⚠️", "error": "❌"}
+                    for job in current[:8]:
+                        c1, c2 = st.columns([0.85, 0.15])
+                        detail = {"queued": "đang chờ", "running": "đang xử lý", "added": f"{job['chunks']} chunk",
+                                  "skipped": "đã tồn tại", "error": job["error"] or "lỗi"}[job["status"]]
+                        c1.markdown(f"{icons[job['status']]} `{job['name']}` — {detail}")
+                        if job["status"] == "error" and c2.button("↻", key=f"retry_job_{job['id']}", help="Thử lại"):
+                            sm.retry_job(job["id"])
+                            st.rerun(scope="app")
+
+                ingest_jobs()
+
+        with col2:
+            st.subheader("📖 Tài liệu hiện có")
+            docs = data.list_docs(cid)
+            if not docs:
+                st.info("Không gian này chưa có tài liệu nào. Hãy thêm một vài tài liệu để bắt đầu!")
+            else:
+                if any(doc["source_type"] in ("url", "youtube") for doc in docs):
+                    if st.button("🔄 Làm mới nguồn web", help="Tải lại các trang web/YouTube và chỉ cập nhật phần thay đổi"):
+                        with st.spinner("Đang kiểm tra các nguồn web..."):
+                            results = st.session_state.sm.refresh_sources(cid)
+                        updated = [r for r in results if r["status"] == "updated"]
+                        for r in results:
+                            if r["status"] == "error":
+                                st.toast(f"Lỗi làm mới '{r['name']}': {r['error']}", icon="❌")
+                        st.toast(f"Đã cập nhật {len(updated)}/{len(results)} nguồn web.", icon="✅" if updated else "ℹ️")
+                for doc in docs:
+                    c1, c2 = st.columns([0.9, 0.1])
+                    c1.markdown(f"📄 `{doc['name']}`")
+                    if c2.button("🗑️", key=f"del_{doc['hash']}", help="Xóa tài liệu này"):
+                        st.session_state.sm.delete_doc(cid, doc['hash'])
+                        st.rerun()
+
 
 # --- TAB 3: TÓM TẮT AI ---
 with tab_summary:
-    st.subheader("Tóm tắt & Phân tích tổng quan")
-    if st.button("✨ Tạo tóm tắt ngay", use_container_width=True, type="secondary"):
-        with st.spinner("AI đang đọc và phân tích toàn bộ tài liệu..."):
-            summary = st.session_state.sm.summarize(cid)
-        st.markdown(summary)
+    if tab_summary.open:
+        st.subheader("Tóm tắt & Phân tích tổng quan")
+        if st.button("✨ Tạo tóm tắt ngay", use_container_width=True, type="secondary"):
+            with st.spinner("AI đang đọc và phân tích toàn bộ tài liệu..."):
+                summary = st.session_state.sm.summarize(cid)
+            st.markdown(summary)
 
 
 # --- TAB 4: PHÂN TÍCH & INSIGHTS ---
 with tab_analysis:
-    st.subheader("Thông số & Các chủ đề chính")
+    if tab_analysis.open:
+        st.subheader("Thông số & Các chủ đề chính")
     
-    col_stats, col_keywords = st.columns(2)
+        col_stats, col_keywords = st.columns(2)
     
-    with col_stats:
-        st.markdown("#### Thống kê không gian")
-        stats = st.session_state.sm.get_course_statistics(cid)
-        if stats:
-            st.metric("Số lượng tài liệu", stats.get("doc_count", 0))
-            st.metric("Số chunk văn bản trong DB", f"{stats.get('chunk_count', 0):,}")
-            st.metric("Tổng số token ước tính", f"{stats.get('token_est', 0):,}")
-        else:
-            st.warning("Không thể tải thống kê.")
+        with col_stats:
+            st.markdown("#### Thống kê không gian")
+            stats = data.get_course_statistics(cid)
+            if stats:
+                st.metric("Số lượng tài liệu", stats.get("doc_count", 0))
+                st.metric("Số chunk văn bản trong DB", f"{stats.get('chunk_count', 0):,}")
+                st.metric("Tổng số token", f"{stats.get('token_count', 0):,}")
+                emb = st.session_state.sm.get_embedding_cache_stats()
+                st.caption(f"Cache embedding: {emb['hit_rate']:.0%} trúng ({emb['hits']:,}/{emb['hits'] + emb['misses']:,} chunk), {emb['entries']:,} mục đã lưu.")
+                if st.session_state.sm.is_answer_cache_enabled(cid):
+                    ans = st.session_state.sm.get_answer_cache_stats(cid)
+                    st.caption(f"Cache câu trả lời: {ans['hit_rate']:.0%} trúng ({ans['hits']:,}/{ans['hits'] + ans['misses']:,} câu hỏi), tiết kiệm {ans['saved_seconds']:.1f} giây.")
+            else:
+                st.warning("Không thể tải thống kê.")
             
-    with col_keywords:
-        st.markdown("#### Trích xuất từ khóa")
-        if st.button("Phân tích từ khóa", use_container_width=True):
-            with st.spinner("AI đang tìm các từ khóa quan trọng..."):
-                keywords = st.session_state.sm.extract_keywords(cid)
+        with col_keywords:
+            st.markdown("#### Trích xuất từ khóa")
+            if st.button("Phân tích từ khóa", use_container_width=True):
+                with st.spinner("AI đang tìm các từ khóa quan trọng..."):
+                    keywords = st.session_state.sm.extract_keywords(cid)
             
-            if isinstance(keywords, list):
-                tags_html = "".join(f"<span style='background-color: var(--secondary-bg); border: 1px solid var(--border-color); border-radius: 8px; padding: 5px 10px; margin: 3px; display: inline-block;'>{kw}</span>" for kw in keywords)
-                st.markdown(tags_html, unsafe_allow_html=True)
-            else:
-                st.error(f"Không thể trích xuất từ khóa: {keywords}")
+                if isinstance(keywords, list):
+                    tags_html = "".join(f"<span style='background-color: var(--secondary-bg); border: 1px solid var(--border-color); border-radius: 8px; padding: 5px 10px; margin: 3px; display: inline-block;'>{kw}</span>" for kw in keywords)
+                    st.markdown(tags_html, unsafe_allow_html=True)
+                else:
+                    st.error(f"Không thể trích xuất từ khóa: {keywords}")
+
+        # Độ trễ theo giai đoạn: tự làm mới mỗi 5 giây, chỉ khi tab này đang mở.
+        st.markdown("#### ⏱️ Độ trễ theo giai đoạn")
+
+        @st.fragment(run_every=5)
+        def stage_latency():
+            rows = st.session_state.sm.get_metrics_summary()
+            if not rows:
+                st.caption("Chưa có số liệu. Hãy trò chuyện hoặc thêm tài liệu để bắt đầu đo.")
+                return
+            st.dataframe(
+                [{"Giai đoạn": r["stage"], "Số lần": r["count"], "TB (ms)": round(r["mean_ms"], 1),
+                  "p50 (ms)": round(r["p50_ms"], 1), "p95 (ms)": round(r["p95_ms"], 1)} for r in rows],
+                hide_index=True, use_container_width=True,
+            )
+            st.download_button("Tải metrics (Prometheus)", st.session_state.sm.get_metrics_text(),
+                               file_name="pnote-metrics.prom", mime="text/plain")
+
+        stage_latency()
 
 
 # --- TAB 5: HỌC TẬP AI ---
 with tab_learning:
-    st.subheader("Công cụ học tập được hỗ trợ bởi AI")
+    if tab_learning.open:
+        st.subheader("Công cụ học tập được hỗ trợ bởi AI")
     
-    with st.expander("📝 **Tạo câu hỏi trắc nghiệm (Quiz)**", expanded=True):
-        num_quiz_q = st.slider("Số lượng câu hỏi trắc nghiệm:", 1, 10, 5, key="quiz_slider")
-        if st.button("Tạo bộ Quiz", use_container_width=True, type="secondary"):
-            with st.spinner("AI đang soạn đề thi trắc nghiệm..."):
-                quiz_data = st.session_state.sm.generate_quiz(cid, num_quiz_q)
+        with st.expander("📝 **Tạo câu hỏi trắc nghiệm (Quiz)**", expanded=True):
+            num_quiz_q = st.slider("Số lượng câu hỏi trắc nghiệm:", 1, 10, 5, key="quiz_slider")
+            # Câu hỏi được lấy ngẫu nhiên từ ngân hàng câu hỏi của workspace; AI chỉ soạn thêm cho tài liệu mới.
+            if st.button("Tạo bộ Quiz", use_container_width=True, type="secondary"):
+                with st.spinner("AI đang soạn đề thi trắc nghiệm..."):
+                    quiz_data = st.session_state.sm.generate_quiz(cid, num_quiz_q)
             
-            if isinstance(quiz_data, list):
-                st.session_state.quiz_data = quiz_data
-            else:
-                st.error(f"Lỗi tạo quiz: {quiz_data}")
-                if 'quiz_data' in st.session_state: del st.session_state['quiz_data']
+                if isinstance(quiz_data, list):
+                    st.session_state.quiz_data = quiz_data
+                    if len(quiz_data) < num_quiz_q:
+                        st.info(f"Tài liệu hiện có chỉ đủ nội dung cho {len(quiz_data)} câu hỏi trắc nghiệm.")
+                else:
+                    st.error(f"Lỗi tạo quiz: {quiz_data}")
+                    if 'quiz_data' in st.session_state: del st.session_state['quiz_data']
         
-        if 'quiz_data' in st.session_state:
-            st.divider()
-            for i, q in enumerate(st.session_state.quiz_data):
-                with st.container(border=True):
-                    st.radio(f"**Câu {i+1}:** {q['question']}", q['options'], index=None, key=f"q_{i}")
-                    if st.toggle("Hiển thị đáp án", key=f"ans_toggle_{i}"):
-                        st.success(f"**Đáp án đúng:** {q['answer']}")
+            if 'quiz_data' in st.session_state:
+                st.divider()
+                for i, q in enumerate(st.session_state.quiz_data):
+                    with st.container(border=True):
+                        st.radio(f"**Câu {i+1}:** {q['question']}", q['options'], index=None, key=f"q_{i}")
+                        if st.toggle("Hiển thị đáp án", key=f"ans_toggle_{i}"):
+                            st.success(f"**Đáp án đúng:** {q['answer']}")
+                            st.caption(f"📄 Nguồn: {q['source']}")
     
-    with st.expander("🤔 **Tạo câu hỏi học tập (Tự luận)**"):
-        num_study_q = st.slider("Số lượng câu hỏi tự luận:", 1, 8, 3, key="study_q_slider")
-        if st.button("Tạo câu hỏi tự luận", use_container_width=True):
-            with st.spinner("AI đang tạo các câu hỏi gợi mở..."):
-                study_questions = st.session_state.sm.generate_study_questions(cid, num_study_q)
+        with st.expander("🤔 **Tạo câu hỏi học tập (Tự luận)**"):
+            num_study_q = st.slider("Số lượng câu hỏi tự luận:", 1, 8, 3, key="study_q_slider")
+            if st.button("Tạo câu hỏi tự luận", use_container_width=True):
+                with st.spinner("AI đang tạo các câu hỏi gợi mở..."):
+                    study_questions = st.session_state.sm.generate_study_questions(cid, num_study_q)
             
-            if isinstance(study_questions, list):
-                st.session_state.study_questions = study_questions
-            else:
-                st.error(f"Lỗi tạo câu hỏi: {study_questions}")
-                if 'study_questions' in st.session_state: del st.session_state['study_questions']
+                if isinstance(study_questions, list):
+                    st.session_state.study_questions = study_questions
+                    if len(study_questions) < num_study_q:
+                        st.info(f"Tài liệu hiện có chỉ đủ nội dung cho {len(study_questions)} câu hỏi tự luận.")
+                else:
+                    st.error(f"Lỗi tạo câu hỏi: {study_questions}")
+                    if 'study_questions' in st.session_state: del st.session_state['study_questions']
+
+            if 'study_questions' in st.session_state:
+                st.success("Dưới đây là các câu hỏi giúp bạn suy ngẫm sâu hơn:")
+                for i, q in enumerate(st.session_state.study_questions, 1):
+                    st.markdown(f"**{i}.** {q['question']}")
+                    st.caption(f"📄 Nguồn: {q['source']}")
+
 
-        if 'study_questions' in st.session_state:
-            st.success("Dưới đây là các câu hỏi giúp bạn suy ngẫm sâu hơn:")
-            for i, q in enumerate(st.session_state.study_questions, 1):
-                st.markdown(f"**{i}.** {q}")
+# --- BƯỚC 4: NẠP TRƯỚC CÁC THƯ VIỆN NẶNG (CHẠY NỀN, MỘT LẦN MỖI TIẾN TRÌNH) ---
+service_manager.warm_up()
@@ -0,0 +1,50 @@
+# pnote-ai-app/tests/conftest.py
+
+# ==============================================================================
+# FIXTURE DÙNG CHUNG CHO BỘ TEST
+# Test chạy offline: dùng cl100k_base nếu đã có trong cache của tiktoken, ngược
+# lại một tokenizer BPE nhỏ (cùng biểu thức tách từ với cl100k_base) có các phép
+# gộp cho những từ thường gặp, để token có thể vắt qua nhiều ký tự như thật.
+# ServiceManager dùng chung cho cả phiên test được cô lập trong thư mục tạm như
+# benchmark (embedding băm, Gemini giả), vì core.services chỉ được import một lần.
+# ==============================================================================
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = ("xin chào thế giới học tập máy tính kinh tế vi mô là gì và được dùng như thế nào"
+         " the quick brown fox jumps over lazy dog 123 456").split()
+
+
+def offline_tokenizer():
+    import tiktoken
+    from benchmarks.suite import CL100K_PAT_STR
+    ranks = {bytes([i]): i for i in range(256)}
+    prefixes = set()
+    for word in WORDS:
+        for encoded in (word.encode("utf-8"), f" {word}".encode("utf-8")):
+            prefixes.update(encoded[:i] for i in range(2, len(encoded) + 1))
+    for prefix in sorted(prefixes, key=lambda p: (len(p), p)):
+        ranks[prefix] = len(ranks)
+    return tiktoken.Encoding("offline-test", pat_str=CL100K_PAT_STR, mergeable_ranks=ranks, special_tokens={})
+
+
+@pytest.fixture(scope="session")
+def tokenizer():
+    import tiktoken
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return offline_tokenizer()
+
+
+@pytest.fixture(scope="session")
+def service_manager(tmp_path_factory):
+    from benchmarks.fake_gemini import FakeGemini
+    from benchmarks.suite import make_service_manager
+    sm, _ = make_service_manager(str(tmp_path_factory.mktemp("pnote")), FakeGemini())
+    return sm
@@ -0,0 +1,75 @@
+# pnote-ai-app/tests/test_answer_cache.py
+
+import pytest
+
+from core.answer_cache import SemanticAnswerCache
+
+
+@pytest.fixture()
+def cache(tmp_path):
+    cache = SemanticAnswerCache(str(tmp_path), threshold=0.9, max_entries=3, model_name="model-a")
+    yield cache
+    cache.close()
+
+
+def test_threshold_hit_and_miss(cache):
+    cache.store("fp", "câu hỏi", [1.0, 0.0, 0.0], "trả lời", 2.0)
+    assert cache.lookup("fp", [0.95, 0.05, 0.0]) == "trả lời"
+    assert cache.lookup("fp", [0.6, 0.8, 0.0]) is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["saved_seconds"]) == (1, 1, 2.0)
+
+
+def test_fingerprint_change_invalidates(cache):
+    cache.store("fp-1", "câu hỏi", [1.0, 0.0], "cũ", 1.0)
+    assert cache.lookup("fp-2", [1.0, 0.0]) is None
+    cache.store("fp-2", "câu hỏi", [1.0, 0.0], "mới", 1.0)
+    assert cache.lookup("fp-2", [1.0, 0.0]) == "mới"
+
+
+def test_eviction_keeps_newest_entries(cache):
+    for i in range(4):
+        vector = [0.0] * 4
+        vector[i] = 1.0
+        cache.store("fp", f"q{i}", vector, f"a{i}", 1.0)
+    assert cache.lookup("fp", [1.0, 0.0, 0.0, 0.0]) is None
+    assert cache.lookup("fp", [0.0, 0.0, 0.0, 1.0]) == "a3"
+
+
+def test_embedding_model_change_misses(cache, tmp_path):
+    cache.store("fp", "câu hỏi", [1.0, 0.0, 0.0], "trả lời", 1.0)
+    other = SemanticAnswerCache(str(tmp_path), threshold=0.9, max_entries=3, model_name="model-b")
+    try:
+        assert other.lookup("fp", [1.0, 0.0]) is None
+        other.store("fp", "câu hỏi", [1.0, 0.0], "trả lời b", 1.0)
+        assert other.lookup("fp", [1.0, 0.0]) == "trả lời b"
+    finally:
+        other.close()
+    assert cache.lookup("fp", [1.0, 0.0, 0.0]) == "trả lời"
+
+
+def test_dimension_change_under_same_model_misses(cache):
+    cache.store("fp", "câu hỏi", [1.0, 0.0, 0.0], "3 chiều", 1.0)
+    assert cache.lookup("fp", [1.0, 0.0]) is None
+    cache.store("fp", "câu hỏi", [1.0, 0.0], "2 chiều", 1.0)
+    assert cache.lookup("fp", [1.0, 0.0]) == "2 chiều"
+    cache._matrices.clear()  # Nạp lại từ SQLite: chỉ giữ các mục cùng số chiều với mục mới nhất.
+    assert cache.lookup("fp", [1.0, 0.0]) == "2 chiều"
+    assert cache.lookup("fp", [1.0, 0.0, 0.0]) is None
+
+
+def test_service_answers_are_replayed_until_documents_change(service_manager):
+    sm = service_manager
+    course_id, _ = sm.create_course("Answer cache")
+    try:
+        sm.add_doc(course_id, "Lạm phát là sự tăng mức giá chung. " * 20, "lam-phat.txt", "h-lam-phat")
+        sm.set_answer_cache_enabled(course_id, True)
+        ask = lambda: "".join(sm.get_chat_stream(course_id, "Lạm phát là gì?", sm.new_conversation(course_id)))
+        calls = sm.llm.model_factory.calls
+        first = ask()
+        assert ask() == first and sm.llm.model_factory.calls == calls + 1
+        sm.add_doc(course_id, "Tăng trưởng kinh tế. " * 20, "tang-truong.txt", "h-tang-truong")
+        ask()
+        assert sm.llm.model_factory.calls == calls + 2
+    finally:
+        sm.delete_course(course_id)
@@ -0,0 +1,34 @@
+# pnote-ai-app/tests/test_bm25.py
+
+import pytest
+
+from benchmarks.corpus import make_text
+from core.bm25 import BM25Index
+
+
+@pytest.fixture()
+def index(tmp_path):
+    index = BM25Index(str(tmp_path))
+    texts = [make_text(200, seed=i) for i in range(200)]
+    texts[17] += " Công thức Black-Scholes định giá quyền chọn."
+    texts[42] += " Học máy là một nhánh của trí tuệ nhân tạo."
+    index.add([f"c{i}" for i in range(len(texts))], ["doc"] * len(texts), texts)
+    yield index
+    index.close()
+
+
+def test_common_words_do_not_change_ranking(index):
+    assert index.search("Black-Scholes là gì và được dùng như thế nào?", 3)[0][0] == "c17"
+    assert index.search("black scholes", 3)[0][0] == "c17"
+    # Hư từ và term quá phổ biến không được tra posting.
+    assert index._query_terms("Black-Scholes là gì và được dùng như thế nào?", 200) == ["black", "scholes"]
+
+
+def test_unaccented_query(index):
+    assert index.search("tri tue nhan tao la gi", 3)[0][0] == "c42"
+
+
+def test_query_of_only_common_words(index):
+    # Không còn term chọn lọc nào: vẫn tìm bằng toàn bộ các term của câu hỏi.
+    assert len(index.search("là gì và được", 5)) == 5
+    assert index.search("", 5) == []
@@ -0,0 +1,65 @@
+# pnote-ai-app/tests/test_cache.py
+
+import json
+import os
+
+from core.cache import ResultCache, make_cache_key
+
+
+def entry_size(value) -> int:
+    return len(json.dumps(value, ensure_ascii=False, indent=4).encode("utf-8"))
+
+
+def test_memory_lru_evicts_least_recently_used(tmp_path):
+    value = {"text": "x" * 100}
+    cache = ResultCache(str(tmp_path), memory_max_bytes=2 * entry_size(value), disk_max_bytes=1 << 20)
+    cache.set("c1", "a", value)
+    cache.set("c1", "b", value)
+    assert cache.get("c1", "a") == value  # "a" thành mục dùng gần nhất
+    cache.set("c1", "c", value)
+    assert list(cache._memory) == [("c1", "a"), ("c1", "c")]
+    # Mục bị loại khỏi bộ nhớ vẫn đọc được từ đĩa và được nạp lại vào bộ nhớ.
+    assert cache.get("c1", "b") == value and ("c1", "b") in cache._memory
+    cache.drop_course("c1")
+    assert not cache._memory and cache._memory_bytes == 0
+
+
+def test_disk_cap_keeps_recently_read_entries(tmp_path):
+    value = {"text": "y" * 100}
+    cache = ResultCache(str(tmp_path), memory_max_bytes=0, disk_max_bytes=2 * entry_size(value))
+    cache_dir = os.path.join(str(tmp_path), "c1", "cache")
+    for i, key in enumerate(("a", "b")):
+        cache.set("c1", key, value)
+        os.utime(os.path.join(cache_dir, f"{key}.json"), (1_000 + i, 1_000 + i))
+    assert cache.get("c1", "a") == value  # đọc trúng cập nhật mtime của "a"
+    cache.set("c1", "c", value)
+    assert sorted(os.listdir(cache_dir)) == ["a.json", "c.json"]
+    assert cache.get("c1", "b") is None
+
+
+def test_cache_key_depends_on_every_input():
+    base = make_cache_key("fp", "template", "model", {"n": 5})
+    assert base == make_cache_key("fp", "template", "model", {"n": 5})
+    assert len({base, make_cache_key("fp2", "template", "model", {"n": 5}), make_cache_key("fp", "template2", "model", {"n": 5}),
+                make_cache_key("fp", "template", "model2", {"n": 5}), make_cache_key("fp", "template", "model", {"n": 6})}) == 5
+
+
+def test_rollback_to_previous_documents_hits_cache(service_manager):
+    sm = service_manager
+    course_id, _ = sm.create_course("Cache theo dấu vân tay")
+    try:
+        sm.add_doc(course_id, "Cung và cầu quyết định giá thị trường. " * 40, "cung-cau.txt", "h-cung-cau")
+        calls = sm.llm.model_factory.calls
+        keywords = sm.extract_keywords(course_id)
+        assert sm.llm.model_factory.calls == calls + 1
+
+        sm.add_doc(course_id, "Lạm phát là sự tăng mức giá chung. " * 40, "lam-phat.txt", "h-lam-phat")
+        sm.extract_keywords(course_id)
+        assert sm.llm.model_factory.calls == calls + 2
+        # Xóa tài liệu mới: dấu vân tay trở lại như trước nên kết quả cũ được dùng lại.
+        sm.delete_doc(course_id, "h-lam-phat")
+        sm.result_cache.drop_course(course_id)  # chỉ còn tầng đĩa
+        assert sm.extract_keywords(course_id) == keywords
+        assert sm.llm.model_factory.calls == calls + 2
+    finally:
+        sm.delete_course(course_id)
@@ -0,0 +1,40 @@
+# pnote-ai-app/tests/test_chunk_refs.py
+
+import json
+
+TEXT = "Tiền tệ là phương tiện trao đổi, đơn vị tính toán và phương tiện cất trữ giá trị. " * 60
+
+
+def test_shared_chunks_survive_until_last_owner_is_deleted(service_manager):
+    sm = service_manager
+    course_id, _ = sm.create_course("Chunk dùng chung")
+    try:
+        collection = sm.chroma_client.get_collection(name=course_id)
+        manifest = sm._get_manifest(course_id)
+        sm.add_doc(course_id, TEXT, "tien-te.txt", "h-a")
+        sm.add_doc(course_id, TEXT, "tien-te (bản sao).txt", "h-b")
+        chunk_ids = manifest.doc_chunks("h-a")
+        assert manifest.doc_chunks("h-b") == chunk_ids and collection.count() == len(chunk_ids) > 1
+        assert manifest.ref_totals() == {"refs": 2 * len(chunk_ids), "unique_chunks": len(chunk_ids)}
+        assert sm._get_bm25(course_id).search("tiền tệ", 5)
+        meta = collection.get(ids=chunk_ids[:1], include=["metadatas"])["metadatas"][0]
+        assert meta["file_hash"] == "h-a" and [ref[0] for ref in json.loads(meta["shared_refs"])] == ["h-b"]
+
+        # Bảng tham chiếu dựng lại từ metadata vẫn giữ cả hai tài liệu.
+        manifest.replace_refs([])
+        sm.rebuild_chunk_refs(course_id)
+        assert manifest.doc_chunks("h-a") == manifest.doc_chunks("h-b") == chunk_ids
+
+        # Xóa tài liệu đầu: chunk được giữ và chuyển sang tài liệu còn lại.
+        sm.delete_doc(course_id, "h-a")
+        assert collection.count() == len(chunk_ids) and manifest.doc_chunks("h-b") == chunk_ids
+        meta = collection.get(ids=chunk_ids[:1], include=["metadatas"])["metadatas"][0]
+        assert meta["file_hash"] == "h-b" and meta["source"] == "tien-te (bản sao).txt" and "shared_refs" not in meta
+        assert sm.retrieve(course_id, "phương tiện trao đổi")
+
+        # Xóa người dùng cuối cùng: chunk bị dọn khỏi ChromaDB và BM25.
+        sm.delete_doc(course_id, "h-b")
+        assert collection.count() == 0 and manifest.ref_totals() == {"refs": 0, "unique_chunks": 0}
+        assert not sm._get_bm25(course_id).search("tiền tệ", 5)
+    finally:
+        sm.delete_course(course_id)
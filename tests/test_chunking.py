@@ -0,0 +1,94 @@
+# pnote-ai-app/tests/test_chunking.py
+
+import random
+
+import pytest
+
+from core.chunking import PENDING_MAX_SEGMENTS, iter_chunks, iter_tagged_chunks, iter_token_segments
+from tests.conftest import WORDS
+
+PUNCTUATION = [",", ".", "!", "?", "(", ")", "\n", "\n\n", "  ", "it's", "2024", "3.14", "–", "“trích”"]
+
+
+def make_text(words: int, seed: int) -> str:
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS + PUNCTUATION) for _ in range(words))
+
+
+def old_chunks(tokenizer, text: str, size: int, overlap: int) -> list[str]:
+    """Cách chia cũ: encode cả tài liệu rồi cắt theo cửa sổ."""
+    tokens = tokenizer.encode(text)
+    return [tokenizer.decode(tokens[i:i + size]) for i in range(0, len(tokens), size - overlap)]
+
+
+def split_randomly(text: str, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    cuts = sorted(rng.sample(range(1, len(text)), 40))
+    return [text[a:b] for a, b in zip([0, *cuts], [*cuts, len(text)])]
+
+
+@pytest.mark.parametrize("size, overlap", [(64, 8), (100, 0), (37, 36)])
+@pytest.mark.parametrize("seed", range(3))
+def test_matches_old_windows(tokenizer, size, overlap, seed):
+    text = make_text(3000, seed)
+    expected = old_chunks(tokenizer, text, size, overlap)
+    assert list(iter_chunks(tokenizer, text, size, overlap, segment_chars=200)) == expected
+    # Luồng các mảnh cắt ngẫu nhiên (kể cả giữa từ) cho cùng kết quả.
+    assert list(iter_chunks(tokenizer, split_randomly(text, seed), size, overlap, segment_chars=200)) == expected
+
+
+def test_short_and_empty_text(tokenizer):
+    assert list(iter_chunks(tokenizer, "", 64, 8)) == []
+    assert list(iter_chunks(tokenizer, "xin chào", 64, 8)) == ["xin chào"]
+
+
+def test_counts_tokens(tokenizer):
+    text = make_text(500, 7)
+    stats = {}
+    list(iter_tagged_chunks(tokenizer, text, 64, 8, segment_chars=100, stats=stats))
+    assert stats["tokens"] == len(tokenizer.encode(text))
+
+
+def test_rejects_overlap_not_smaller_than_size(tokenizer):
+    with pytest.raises(ValueError):
+        list(iter_chunks(tokenizer, "xin chào", 8, 8))
+
+
+def test_page_tags(tokenizer):
+    pages = [(page, make_text(200, page) + "\n") for page in range(1, 6)]
+    chunks = list(iter_tagged_chunks(tokenizer, pages, 64, 8, segment_chars=100))
+    assert [text for text, _, _ in chunks] == old_chunks(tokenizer, "".join(text for _, text in pages), 64, 8)
+    assert chunks[0][1] == 1 and chunks[-1][2] == 5
+    assert all(start <= end for _, start, end in chunks)
+    assert [start for _, start, _ in chunks] == sorted(start for _, start, _ in chunks)
+
+
+def test_page_tags_follow_text(tokenizer):
+    # Hai trang dùng hai tập chữ cái rời nhau nên biết được mỗi chunk thuộc trang nào.
+    pages = [(1, "the quick " * 200), (2, "lazy dog " * 200)]
+    chunks = list(iter_tagged_chunks(tokenizer, pages, 32, 0, segment_chars=64))
+    assert {(start, end) for _, start, end in chunks} == {(1, 1), (1, 2), (2, 2)}
+    for text, start, end in chunks:
+        if not (letters := set(text) - {" "}): continue
+        if letters <= set("thequick"):
+            assert (start, end) == (1, 1)
+        elif letters <= set("lazydog"):
+            assert (start, end) == (2, 2)
+        else:
+            assert (start, end) == (1, 2)
+
+
+@pytest.mark.parametrize("text", [
+    "x" * 5000,                                    # không có dấu cách
+    " ".join(str(i % 10) for i in range(3000)),    # dấu cách luôn đứng trước chữ số
+    "chào" * 2000,                                 # chữ có dấu, không có dấu cách
+])
+def test_text_without_split_point(tokenizer, text):
+    segment_chars = 100
+    segments = list(iter_token_segments(tokenizer, [text[i:i + 10] for i in range(0, len(text), 10)], segment_chars))
+    # Đoạn chờ bị buộc cắt thay vì lớn dần theo độ dài tài liệu.
+    assert len(segments) > 1
+    assert all(len(tokenizer.decode(tokens)) <= (PENDING_MAX_SEGMENTS + 1) * segment_chars for tokens, _ in segments)
+    assert "".join(tokenizer.decode(tokens) for tokens, _ in segments) == text
+    # Không chồng lấp: nối các chunk lại được đúng văn bản gốc.
+    assert "".join(iter_chunks(tokenizer, text, 50, 0, segment_chars=segment_chars)) == text
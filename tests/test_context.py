@@ -0,0 +1,34 @@
+# pnote-ai-app/tests/test_context.py
+
+from benchmarks.corpus import make_text
+from core.context import representative_order
+
+
+def test_representative_order_puts_central_chunks_first():
+    embeddings = [[0.0, 1.0], [1.0, 0.0], [0.9, 0.1], [0.8, 0.2]]
+    assert representative_order(embeddings) == [3, 2, 1, 0]
+    assert representative_order([[1.0, 0.0]]) == [0]
+
+
+def test_context_uses_stored_embeddings_and_spans_documents(service_manager, monkeypatch):
+    sm = service_manager
+    course_id, _ = sm.create_course("Context")
+    try:
+        for i in range(4):
+            sm.add_doc(course_id, make_text(3000, seed=100 + i), f"doc-{i}.txt", f"h-context-{i}")
+        embedded = []
+        embed = sm.embedder.embed
+        monkeypatch.setattr(sm.embedder, "embed", lambda texts: (embedded.append(list(texts)), embed(texts))[1])
+
+        records = sm.retrieve(course_id, make_text(12, seed=101), 8, with_embeddings=True)
+        assert records and all(len(r["embedding"]) for r in records)
+        "".join(sm.get_chat_stream(course_id, make_text(12, seed=101), sm.new_conversation(course_id)))
+        # Chỉ câu hỏi được embedding; MMR dùng embedding của chunk lưu trong ChromaDB.
+        assert all(len(texts) == 1 for texts in embedded)
+
+        sampled = sm._get_manifest(course_id).sample_chunks(8)
+        metadatas = sm.chroma_client.get_collection(name=course_id).get(ids=sampled)["metadatas"]
+        assert len(sampled) == 8 and {m["file_hash"] for m in metadatas} == {f"h-context-{i}" for i in range(4)}
+        assert sm._get_context(course_id, "keywords")
+    finally:
+        sm.delete_course(course_id)
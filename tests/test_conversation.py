@@ -0,0 +1,49 @@
+# pnote-ai-app/tests/test_conversation.py
+
+from core.conversation import ConversationMemory, ConversationStore
+
+
+def test_pages_walk_back_through_history(tmp_path, tokenizer):
+    store = ConversationStore(str(tmp_path))
+    memory = ConversationMemory(store, tokenizer, lambda prompt: "tóm tắt", 4_000, 0.5, "{summary}\n{turns}")
+    conversation_id, other = store.new(), store.new()
+    recorded = []
+    for i in range(12):
+        recorded += memory.record_turn(conversation_id, f"câu hỏi {i}", f"trả lời {i}")
+    memory.record_turn(other, "câu hỏi khác", "trả lời khác")
+    assert [m["role"] for m in recorded[:2]] == ["user", "model"] and all("id" in m for m in recorded)
+
+    messages, has_more = store.page(conversation_id, limit=10)
+    assert messages == recorded[-10:] and has_more
+    while has_more:
+        older, has_more = store.page(conversation_id, before_id=messages[0]["id"], limit=10)
+        messages = older + messages
+    assert messages == recorded
+
+    # Cuộc trò chuyện có tin nhắn mới nhất đứng đầu; cuộc chưa có tin nhắn không được liệt kê.
+    store.new()
+    assert [(c["id"], c["title"], c["messages"]) for c in store.recent()] == [
+        (other, "câu hỏi khác", 2), (conversation_id, "câu hỏi 0", 24)]
+    memory.record_turn(conversation_id, "câu hỏi tiếp", "trả lời tiếp")
+    assert store.recent(1)[0]["id"] == conversation_id
+    store.close()
+
+
+def test_resume_latest_conversation(service_manager):
+    sm = service_manager
+    course_id, _ = sm.create_course("Tiếp tục trò chuyện")
+    try:
+        sm.add_doc(course_id, "Lạm phát là sự tăng mức giá chung. " * 20, "lam-phat.txt", "h-lam-phat")
+        conversation_id, recorded = sm.new_conversation(course_id), []
+        for question in ("Lạm phát là gì?", "Vì sao giá tăng?"):
+            answer = "".join(sm.get_chat_stream(course_id, question, conversation_id, on_record=recorded.extend))
+            assert recorded[-1]["text"] == answer
+        # Phiên mới: mở lại cuộc trò chuyện gần nhất và tải lùi từng trang theo ID tin nhắn.
+        [latest] = sm.list_conversations(course_id, limit=1)
+        assert latest["id"] == conversation_id and latest["title"] == "Lạm phát là gì?"
+        page, has_more = sm.load_chat_page(course_id, latest["id"], limit=2)
+        assert page == recorded[2:] and has_more
+        older, has_more = sm.load_chat_page(course_id, latest["id"], before_id=page[0]["id"], limit=2)
+        assert older == recorded[:2] and not has_more
+    finally:
+        sm.delete_course(course_id)
@@ -0,0 +1,84 @@
+# pnote-ai-app/tests/test_jobs.py
+
+import os
+import subprocess
+import sys
+
+from benchmarks.corpus import make_docx
+
+
+def test_claim_batches_same_course(tmp_path):
+    from core.jobs import JobQueue
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), max_attempts=3)
+    for course_id, file_hash in [("aaa", "h1"), ("bbb", "h2"), ("aaa", "h3"), ("aaa", "h4")]:
+        queue.enqueue(course_id, file_hash, file_hash, "url", f"http://example.com/{file_hash}")
+    assert [job["file_hash"] for job in queue.claim(2)] == ["h1", "h3"]
+    assert [job["file_hash"] for job in queue.claim(8)] == ["h2"]
+    assert [job["file_hash"] for job in queue.claim(8)] == ["h4"]
+    assert queue.claim(8) == []
+    assert {job["status"] for job in queue.list()} == {"running"}
+    # Tiến trình dừng giữa chừng: lần khởi động sau đưa các job về hàng đợi.
+    assert queue.recover() == 4 and len(queue.claim(8)) == 3
+    queue.close()
+
+
+def test_claim_takes_whole_group(tmp_path):
+    from core.jobs import JobQueue
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), max_attempts=3)
+    first = queue.enqueue_group("aaa", [(f"g{i}", f"g{i}", "url", f"http://example.com/g{i}") for i in range(5)])
+    assert len({job["batch_id"] for job in first}) == 1
+    queue.enqueue("bbb", "other", "other", "url", "http://example.com/other")
+    second = queue.enqueue_group("aaa", [(f"s{i}", f"s{i}", "url", f"http://example.com/s{i}") for i in range(3)])
+    assert second[0]["batch_id"] != first[0]["batch_id"]
+    # Cả nhóm đầu được lấy dù lớn hơn `limit`; nhóm nhỏ được thêm job của cùng khóa học cho đủ `limit`.
+    assert [job["file_hash"] for job in queue.claim(3)] == [f"g{i}" for i in range(5)]
+    assert [job["file_hash"] for job in queue.claim(3)] == ["other"]
+    assert [job["file_hash"] for job in queue.claim(2)] == ["s0", "s1", "s2"]
+    # Gửi lại một nguồn đang chờ không tạo job mới.
+    assert queue.enqueue_group("aaa", [("s0", "s0", "url", "http://example.com/s0")])[0]["id"] == second[0]["id"]
+    queue.close()
+
+
+def test_file_lock_across_processes(tmp_path):
+    from core.jobs import FileLock
+    path = str(tmp_path / "locks" / "worker.lock")
+    holder, other = FileLock(path), FileLock(path)
+    probe = [sys.executable, "-c", "import sys; from core.jobs import FileLock; print(FileLock(sys.argv[1]).acquire(blocking=False))", path]
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    assert holder.acquire(blocking=False)
+    assert not other.acquire(blocking=False)
+    assert subprocess.run(probe, cwd=root, capture_output=True, text=True).stdout.strip() == "False"
+    holder.release()
+    assert subprocess.run(probe, cwd=root, capture_output=True, text=True).stdout.strip() == "True"
+    with other:
+        assert not holder.acquire(blocking=False)
+
+
+def test_submitted_group_uses_one_add_sources_call(service_manager, monkeypatch):
+    import config
+    from benchmarks.suite import NamedBytesIO
+    from core.services import calculate_file_hash
+    sm = service_manager
+    course_id, _ = sm.create_course("Hàng đợi nạp tài liệu")
+    uploads_dir = os.path.join(config.USER_DATA_PATH, course_id, "uploads")
+    files = [(f"bai-{i}.docx", make_docx(300, seed=i)) for i in range(3)] + [("hong.docx", b"not a docx")]
+    sm.add_doc(course_id, "Tài liệu đã có sẵn trong khóa học.", "co-san.docx", calculate_file_hash(b"co-san"), "docx")
+    calls = []
+    add_sources = sm.add_sources
+    monkeypatch.setattr(sm, "add_sources", lambda cid, sources, **kw: calls.append(len(sources)) or add_sources(cid, sources, **kw))
+    monkeypatch.setattr(sm, "start_job_workers", lambda: None)
+
+    queued = sm.enqueue_sources(course_id, [("docx", NamedBytesIO(data, name)) for name, data in files[:2]]
+                                + [("docx", NamedBytesIO(b"co-san", "co-san.docx"))]
+                                + [("docx", NamedBytesIO(data, name)) for name, data in files[2:]])
+    assert [job["status"] for job in queued] == ["queued", "queued", "skipped", "queued", "queued"]
+    assert len({job["batch_id"] for job in queued if job["status"] == "queued"}) == 1
+    sm._run_jobs(sm.jobs.claim(2))
+    assert calls == [4]
+    jobs = {job["name"]: job for job in sm.list_jobs(course_id)}
+    assert [jobs[name]["status"] for name, _ in files] == ["added", "added", "added", "error"]
+    assert all(jobs[name]["chunks"] > 0 for name, _ in files[:3])
+    assert sorted(doc["name"] for doc in sm.list_docs(course_id)) == ["bai-0.docx", "bai-1.docx", "bai-2.docx", "co-san.docx"]
+    # Chỉ file của job lỗi được giữ lại để thử lại.
+    assert os.listdir(uploads_dir) == [calculate_file_hash(files[3][1])]
+    sm.delete_course(course_id)
@@ -0,0 +1,159 @@
+# pnote-ai-app/tests/test_llm.py
+
+import threading
+import time
+
+import pytest
+from google.api_core import exceptions
+
+from core import llm
+from core.llm import LLMGateway, TokenBucket
+
+
+class Chunk:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeModel:
+    """Mô hình giả: `failures` lỗi đầu tiên được ném ra, sau đó trả lời; đếm số lời gọi đang chạy cùng lúc."""
+
+    def __init__(self, failures: list[Exception] | None = None, latency: float = 0.0):
+        self.failures = list(failures or [])
+        self.latency = latency
+        self.calls = 0
+        self.active = self.peak = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, model_name: str, system_instruction: str | None = None):
+        return self
+
+    def generate_content(self, prompt: str, **kwargs):
+        with self._lock:
+            self.calls += 1
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            failure = self.failures.pop(0) if self.failures else None
+        try:
+            time.sleep(self.latency)
+            if failure: raise failure
+            return Chunk(f"trả lời: {prompt}")
+        finally:
+            with self._lock:
+                self.active -= 1
+
+    def start_chat(self, history: list):
+        return self
+
+    def send_message(self, prompt: str, stream: bool = False):
+        self.generate_content(prompt)
+        return iter([Chunk("một "), Chunk("hai "), Chunk("ba")])
+
+
+class RecordingBucket:
+    def __init__(self):
+        self.amounts = []
+
+    def acquire(self, amount: float = 1.0):
+        self.amounts.append(amount)
+
+
+def make_gateway(tokenizer, model, concurrency: int = 4, retries: int = 2) -> LLMGateway:
+    return LLMGateway(model, tokenizer, 10**6, 10**9, concurrency, retries, 0.001, 0.002)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_token_bucket(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(llm.time, "sleep", clock.sleep)
+    bucket = TokenBucket(60, clock=clock)  # 1 đơn vị mỗi giây.
+    bucket.acquire(60)
+    assert clock.sleeps == []
+    bucket.acquire(3)
+    assert sum(clock.sleeps) == pytest.approx(3)
+    clock.now += 30
+    bucket.acquire(30)
+    assert sum(clock.sleeps) == pytest.approx(3)
+    # Yêu cầu lớn hơn dung lượng được giới hạn ở dung lượng, không chờ mãi.
+    clock.now += 60
+    bucket.acquire(1000)
+    assert sum(clock.sleeps) == pytest.approx(3)
+
+
+def test_retries_transient_errors(tokenizer):
+    model = FakeModel([exceptions.ResourceExhausted("quota"), exceptions.ServiceUnavailable("busy")])
+    assert make_gateway(tokenizer, model, retries=2).generate("xin chào", "m") == "trả lời: xin chào"
+    assert model.calls == 3
+
+    model = FakeModel([exceptions.ResourceExhausted("quota")] * 3)
+    with pytest.raises(exceptions.ResourceExhausted):
+        make_gateway(tokenizer, model, retries=2).generate("xin chào", "m")
+    assert model.calls == 3
+
+
+def test_does_not_retry_other_errors(tokenizer):
+    model = FakeModel([ValueError("prompt bị chặn")])
+    gateway = make_gateway(tokenizer, model)
+    with pytest.raises(ValueError):
+        gateway.generate("xin chào", "m")
+    assert model.calls == 1
+    # Chỗ đồng thời đã được trả lại sau lỗi.
+    assert all(gateway._slots.acquire(blocking=False) for _ in range(gateway.max_concurrency))
+
+
+def test_concurrency_limit(tokenizer):
+    model = FakeModel(latency=0.05)
+    results = make_gateway(tokenizer, model, concurrency=2).generate_batch([f"câu {i}" for i in range(8)], "m")
+    assert results == [f"trả lời: câu {i}" for i in range(8)]
+    assert model.peak == 2
+
+
+def test_batch_returns_errors_in_place(tokenizer):
+    model = FakeModel([ValueError("lỗi")])
+    results = make_gateway(tokenizer, model, concurrency=1).generate_batch(["a", "b"], "m")
+    assert isinstance(results[0], ValueError) and results[1] == "trả lời: b"
+
+
+def test_stream_holds_slot_until_finished(tokenizer):
+    model = FakeModel()
+    gateway = make_gateway(tokenizer, model, concurrency=1)
+    stream = gateway.stream_chat("xin chào", [], "m")
+    assert next(stream) == "một "
+    done = threading.Event()
+    worker = threading.Thread(target=lambda: (gateway.generate("khác", "m"), done.set()))
+    worker.start()
+    assert not done.wait(0.2)  # Luồng chat vẫn giữ chỗ duy nhất.
+    assert "".join(stream) == "hai ba"
+    worker.join(1)
+    assert done.is_set()
+
+    # Đóng luồng giữa chừng cũng trả lại chỗ.
+    stream = gateway.stream_chat("xin chào", [], "m")
+    next(stream)
+    stream.close()
+    assert gateway._slots.acquire(blocking=False)
+    gateway._slots.release()
+
+
+def test_stream_cost_counts_history(tokenizer):
+    gateway = make_gateway(tokenizer, FakeModel())
+    gateway.token_bucket = RecordingBucket()
+    history = [{"role": "user", "parts": ["câu hỏi trước đó khá dài"]},
+               {"role": "model", "parts": [{"text": "câu trả lời trước đó còn dài hơn nữa"}]}]
+    prompt = "TÓM TẮT CUỘC TRÒ CHUYỆN TRƯỚC ĐÓ:\nhọc máy\n\nCÂU HỎI: là gì?"
+    list(gateway.stream_chat(prompt, history, "m", system_instruction="Bạn là trợ lý học tập."))
+    expected = sum(len(tokenizer.encode(text)) for text in
+                   (prompt, "Bạn là trợ lý học tập.", "câu hỏi trước đó khá dài", "câu trả lời trước đó còn dài hơn nữa"))
+    assert gateway.token_bucket.amounts == [expected]
@@ -0,0 +1,86 @@
+# pnote-ai-app/tests/test_manifest.py
+
+import os
+
+from core.manifest import DocumentManifest
+
+
+def test_fingerprint_tracks_documents_and_web_revisions(tmp_path):
+    first, second = DocumentManifest(str(tmp_path / "a")), DocumentManifest(str(tmp_path / "b"))
+    for manifest, order in ((first, ("h1", "h2")), (second, ("h2", "h1"))):
+        for file_hash in order:
+            manifest.upsert(file_hash, f"{file_hash}.txt", "txt", 3, 100)
+    # Không phụ thuộc thứ tự nạp.
+    assert first.fingerprint() == second.fingerprint()
+    before = first.fingerprint()
+
+    # Ghi trạng thái lần đầu không đổi dấu vân tay; nội dung web đổi thì đổi.
+    first.set_web_source("h1", "https://example.com", None, None, "c1")
+    assert first.fingerprint() == before
+    first.set_web_source("h1", "https://example.com", None, None, "c2", changed=True)
+    changed = first.fingerprint()
+    assert changed != before
+
+    first.delete("h2")
+    assert first.fingerprint() not in (before, changed)
+    first.upsert("h2", "h2.txt", "txt", 3, 100)
+    assert first.fingerprint() == changed
+    first.close()
+    second.close()
+
+
+def add_docs(sm, course_id: str):
+    sm.add_doc(course_id, "Cung và cầu quyết định giá thị trường. " * 80, "cung-cau.txt", "h-cung-cau")
+    sm.add_doc(course_id, "Lạm phát là sự tăng mức giá chung. " * 60, "lam-phat.md", "h-lam-phat")
+
+
+def drop_manifest(sm, course_id: str):
+    manifest = sm._get_manifest(course_id)
+    sm._close_course_stores(course_id)
+    os.remove(manifest.path)
+
+
+def test_rebuild_from_collection(service_manager):
+    sm = service_manager
+    course_id, _ = sm.create_course("Dựng lại manifest")
+    try:
+        add_docs(sm, course_id)
+        manifest = sm._get_manifest(course_id)
+        docs, fingerprint = sm.list_docs(course_id), manifest.fingerprint()
+        chunks = {doc["hash"]: manifest.doc_chunks(doc["hash"]) for doc in docs}
+
+        drop_manifest(sm, course_id)
+        rebuilt = sm._get_manifest(course_id)
+        assert rebuilt.is_new and rebuilt.fingerprint() == fingerprint
+        key = lambda doc: (doc["hash"], doc["name"], doc["source_type"], doc["chunks"])
+        assert sorted(map(key, sm.list_docs(course_id))) == sorted(map(key, docs))
+        assert {file_hash: rebuilt.doc_chunks(file_hash) for file_hash in chunks} == chunks
+        assert sm.hash_exists(course_id, "h-lam-phat")
+    finally:
+        sm.delete_course(course_id)
+
+
+def test_failed_rebuild_is_retried(service_manager, monkeypatch):
+    from core import services
+    sm = service_manager
+    course_id, _ = sm.create_course("Thử lại dựng manifest")
+    try:
+        add_docs(sm, course_id)
+        drop_manifest(sm, course_id)
+        rebuild, failures = sm.rebuild_manifest, []
+
+        def flaky_rebuild(cid):
+            if not failures:
+                failures.append(cid)
+                raise RuntimeError("collection tạm thời không đọc được")
+            return rebuild(cid)
+
+        monkeypatch.setattr(sm, "rebuild_manifest", flaky_rebuild)
+        assert sm.list_docs(course_id) == [] and failures == [course_id]
+        assert sm._get_manifest(course_id).get_meta(services.MANIFEST_REBUILT_KEY) is None
+        # Hết thời gian chờ: lần mở sau dựng lại thành công và ghi mốc.
+        sm._manifest_retry_at[course_id] = 0
+        assert {doc["hash"] for doc in sm.list_docs(course_id)} == {"h-cung-cau", "h-lam-phat"}
+        assert sm._get_manifest(course_id).get_meta(services.MANIFEST_REBUILT_KEY) == "1"
+    finally:
+        sm.delete_course(course_id)
@@ -0,0 +1,61 @@
+# pnote-ai-app/tests/test_question_bank.py
+
+import random
+
+from core.question_bank import QuestionBank
+
+
+def quiz_item(text: str) -> dict:
+    return {"question": text, "options": ["a", "b"], "answer": "a"}
+
+
+def test_sample_interleaves_documents_without_model(tmp_path):
+    bank = QuestionBank(str(tmp_path))
+    for doc, groups in (("a", 2), ("b", 1), ("c", 1)):
+        for index in range(groups):
+            bank.add_group("quiz", "g1", doc, f"{doc}.txt", index, groups,
+                           [(quiz_item(f"{doc}{index}-{i}"), [f"{doc}-chunk"]) for i in range(4)])
+    assert bank.covered("quiz", "g1") == {"a": 1, "b": 1, "c": 1}
+    assert bank.covered_groups("quiz", "g1", "a") == {0, 1}
+
+    questions = bank.sample("quiz", "g1", ["a", "b", "c"], 6, random.Random(0))
+    assert len(questions) == 6 and len({q["question"] for q in questions}) == 6
+    # Mỗi tài liệu góp hai câu trước khi tài liệu nào có câu thứ ba.
+    assert sorted(q["question"][0] for q in questions) == ["a", "a", "b", "b", "c", "c"]
+    assert bank.sample("quiz", "other-generator", ["a", "b", "c"], 6) == []
+    bank.close()
+
+
+def test_first_request_waits_only_for_needed_groups(service_manager, monkeypatch):
+    from core import services
+    sm = service_manager
+    # Mỗi chunk là một nhóm riêng, để mỗi tài liệu có nhiều nhóm.
+    monkeypatch.setitem(services.CONTEXT_TOKEN_BUDGETS, "quiz", 50)
+    # Lượt sinh nốt trong nền được ghi lại rồi chạy đồng bộ trong test.
+    fill, started = sm.fill_question_bank, []
+    monkeypatch.setattr(sm, "fill_question_bank", lambda cid, kind: started.append(kind))
+    course_id, _ = sm.create_course("Ngân hàng câu hỏi")
+    try:
+        for i in range(3):
+            sm.add_doc(course_id, f"Chương {i}: cung và cầu quyết định giá thị trường. " * 120, f"chuong-{i}.txt", f"h-chuong-{i}")
+        groups = {doc["hash"]: len(sm._get_question_generator("quiz").group(sm._get_doc_chunk_records(course_id, doc["hash"])))
+                  for doc in sm.list_docs(course_id)}
+        assert min(groups.values()) > 1
+
+        calls = sm.llm.model_factory.calls
+        questions = sm.generate_quiz(course_id, 7)
+        # 7 câu cần hai nhóm (5 câu mỗi nhóm), không phải mọi nhóm của khóa học.
+        assert len(questions) == 7 and sm.llm.model_factory.calls == calls + 2 and started == ["quiz"]
+        fill(course_id, "quiz", background=False)
+        assert sm.llm.model_factory.calls == calls + sum(groups.values())
+        assert fill(course_id, "quiz") is None
+
+        # Tài liệu mới: chỉ các nhóm của nó được sinh, ngân hàng cũ được giữ nguyên.
+        sm.add_doc(course_id, "Lạm phát là sự tăng mức giá chung. " * 150, "lam-phat.txt", "h-lam-phat")
+        new_groups = len(sm._get_question_generator("quiz").group(sm._get_doc_chunk_records(course_id, "h-lam-phat")))
+        calls = sm.llm.model_factory.calls
+        assert len(sm.generate_quiz(course_id, 7)) == 7 and sm.llm.model_factory.calls == calls
+        fill(course_id, "quiz", background=False)
+        assert sm.llm.model_factory.calls == calls + new_groups
+    finally:
+        sm.delete_course(course_id)
@@ -0,0 +1,70 @@
+# pnote-ai-app/tests/test_singleflight.py
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from core.singleflight import SingleFlight
+
+
+def run_concurrently(flight: SingleFlight, key, fn, callers: int = 4) -> list:
+    """Gọi `flight.do` từ nhiều luồng; `fn` chỉ được thả ra khi mọi phiên đến sau đã chờ."""
+    release, started = threading.Event(), threading.Event()
+
+    def blocked():
+        started.set()
+        assert release.wait(5)
+        return fn()
+
+    def call():
+        try:
+            return flight.do(key, blocked)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(callers) as pool:
+        leader = pool.submit(call)
+        assert started.wait(5)
+        shared = flight.shared
+        followers = [pool.submit(call) for _ in range(callers - 1)]
+        deadline = time.monotonic() + 5
+        while flight.shared < shared + callers - 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        release.set()
+        return [leader.result()] + [f.result() for f in followers]
+
+
+def test_concurrent_calls_share_one_result():
+    flight, calls = SingleFlight(), []
+    results = run_concurrently(flight, ("c1", "summary"), lambda: calls.append(1) or {"summary": "ok"})
+    assert calls == [1] and flight.shared == 3
+    assert all(result is results[0] for result in results)
+    # Kết quả không được giữ lại: lời gọi sau khi xong phải tính lại.
+    assert flight.in_flight() == 0
+    assert flight.do(("c1", "summary"), lambda: "again") == "again"
+
+
+def test_error_reaches_every_waiting_caller():
+    flight = SingleFlight()
+
+    def fail():
+        raise RuntimeError("mô hình lỗi")
+
+    results = run_concurrently(flight, "key", fail)
+    assert all(isinstance(result, RuntimeError) and result is results[0] for result in results)
+    assert flight.in_flight() == 0
+    with pytest.raises(ValueError):
+        flight.do("key", lambda: int("không phải số"))
+
+
+def test_different_keys_do_not_wait_for_each_other():
+    flight, release = SingleFlight(), threading.Event()
+    with ThreadPoolExecutor(1) as pool:
+        slow = pool.submit(flight.do, "a", lambda: release.wait(5) and "a")
+        while flight.in_flight() == 0:
+            time.sleep(0.01)
+        assert flight.do("b", lambda: "b") == "b"
+        release.set()
+        assert slow.result() == "a" and flight.shared == 0
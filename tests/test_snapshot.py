@@ -0,0 +1,60 @@
+# pnote-ai-app/tests/test_snapshot.py
+
+import json
+import os
+
+import numpy as np
+
+from core import snapshot
+
+
+def test_export_import_round_trip(service_manager, tmp_path, monkeypatch):
+    sm = service_manager
+    course_id, _ = sm.create_course("Snapshot gốc")
+    copy_id = None
+    try:
+        sm.add_doc(course_id, "Cung và cầu quyết định giá thị trường. " * 80, "cung-cau.txt", "h-cung-cau")
+        sm.add_doc(course_id, "Lạm phát là sự tăng mức giá chung. " * 60, "lam-phat.md", "h-lam-phat")
+        keywords = sm.extract_keywords(course_id)
+        conversation_id = sm.new_conversation(course_id)
+        "".join(sm.get_chat_stream(course_id, "Lạm phát là gì?", conversation_id))
+
+        path = str(tmp_path / "kinh-te.snapshot")
+        info = sm.export_course(course_id, path)
+        assert info["count"] == sm.chroma_client.get_collection(name=course_id).count() and info["bytes"] > 0
+        assert snapshot.read_info(path)["embedding_model"] == sm.embedder.model_name
+
+        # Nhập không gọi mô hình embedding hay mô hình sinh văn bản.
+        monkeypatch.setattr(sm.embedder, "embed", lambda texts: (_ for _ in ()).throw(AssertionError("embed")))
+        calls = sm.llm.model_factory.calls
+        copy_id, error = sm.import_course(path, "Snapshot bản sao")
+        assert error is None and copy_id != course_id
+
+        original, copied = (sm.chroma_client.get_collection(name=cid).get(include=["embeddings", "documents", "metadatas"])
+                            for cid in (course_id, copy_id))
+        order = {chunk_id: i for i, chunk_id in enumerate(copied["ids"])}
+        assert sorted(original["ids"]) == sorted(copied["ids"])
+        for i, chunk_id in enumerate(original["ids"]):
+            j = order[chunk_id]
+            assert copied["documents"][j] == original["documents"][i] and copied["metadatas"][j] == original["metadatas"][i]
+            assert np.allclose(copied["embeddings"][j], original["embeddings"][i])
+        assert sm.list_docs(copy_id) == sm.list_docs(course_id)
+        assert sm._get_manifest(copy_id).fingerprint() == sm._get_manifest(course_id).fingerprint()
+        assert sm._get_bm25(copy_id).search("lạm phát", 3)
+        assert sm.extract_keywords(copy_id) == keywords
+        assert [c["id"] for c in sm.list_conversations(copy_id)] == [conversation_id]
+        assert sm.llm.model_factory.calls == calls
+
+        # Trùng tên, hoặc snapshot của mô hình embedding khác: không tạo khóa học.
+        assert sm.import_course(path, "Snapshot bản sao")[0] is None
+        info_path = os.path.join(path, snapshot.INFO_FILENAME)
+        with open(info_path, encoding="utf-8") as f:
+            stored = json.load(f)
+        with open(info_path, "w", encoding="utf-8") as f:
+            json.dump({**stored, "embedding_model": "mô-hình-khác"}, f)
+        other_id, error = sm.import_course(path, "Snapshot khác")
+        assert other_id is None and "mô-hình-khác" in error
+    finally:
+        sm.delete_course(course_id)
+        if copy_id:
+            sm.delete_course(copy_id)
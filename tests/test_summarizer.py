@@ -0,0 +1,43 @@
+# pnote-ai-app/tests/test_summarizer.py
+
+import threading
+
+from core.summarizer import MapReduceSummarizer
+
+
+def make_summarizer(tokenizer, tmp_path, prompts):
+    def generate(prompt):
+        prompts.append(prompt)
+        return f"tóm tắt {len(prompts)}"
+    return MapReduceSummarizer(generate, tokenizer, str(tmp_path), max_parallel=2)
+
+
+def test_documents_without_chunks_are_skipped(tokenizer, tmp_path):
+    prompts = []
+    summarizer = make_summarizer(tokenizer, tmp_path, prompts)
+    chunks = {"a": ["xin chào thế giới"], "b": []}
+    docs = [{"hash": "a", "name": "a.txt"}, {"hash": "b", "name": "b.txt"}]
+    assert summarizer.summarize(docs, lambda h: chunks[h]) is not None
+    assert "### a.txt" in prompts[-1] and "b.txt" not in prompts[-1]
+    # Tài liệu thiếu chunk không có bản tóm tắt từng phần nên được thử lại ở lần sau.
+    assert summarizer.load_partial("a") is not None and summarizer.load_partial("b") is None
+    assert summarizer.summarize([docs[1]], lambda h: chunks[h]) is None
+
+
+def test_chunks_are_loaded_inside_the_document_task(tokenizer, tmp_path):
+    summarizer = make_summarizer(tokenizer, tmp_path, [])
+    loaded, lock = [], threading.Lock()
+
+    def load_chunks(file_hash):
+        with lock:
+            loaded.append((file_hash, threading.current_thread() is threading.main_thread()))
+        return [f"tài liệu {file_hash}"]
+
+    docs = [{"hash": str(i), "name": f"{i}.txt"} for i in range(5)]
+    summarizer.summarize(docs, load_chunks)
+    assert sorted(h for h, _ in loaded) == [d["hash"] for d in docs]
+    assert not any(on_main for _, on_main in loaded)
+    # Bản tóm tắt từng phần đã lưu: lần sau không nạp lại chunk.
+    loaded.clear()
+    summarizer.summarize(docs, load_chunks)
+    assert loaded == []
@@ -0,0 +1,147 @@
+# pnote-ai-app/tests/test_web_refresh.py
+
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from benchmarks.corpus import make_text
+
+
+class Site:
+    """Một trang web cục bộ có ETag/Last-Modified, đổi được nội dung giữa các lần tải."""
+
+    def __init__(self):
+        self.version = 0
+        self.paragraphs: list[str] = []
+        self.requests: list[dict] = []
+        self.send_length = True
+        self.set([make_text(120, seed=i) for i in range(12)])
+
+    def set(self, paragraphs: list[str]):
+        self.version += 1
+        self.paragraphs = paragraphs
+        self.etag = f'"v{self.version}"'
+        self.last_modified = formatdate(1_700_000_000 + self.version * 3600, usegmt=True)
+
+    @property
+    def body(self) -> bytes:
+        return ("<html><body>" + "".join(f"<p>{p}</p>" for p in self.paragraphs) + "</body></html>").encode("utf-8")
+
+
+@pytest.fixture()
+def site():
+    site = Site()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            headers = {name: self.headers.get(name) for name in ("If-None-Match", "If-Modified-Since")}
+            site.requests.append({"path": self.path, **headers})
+            not_modified = (headers["If-None-Match"] == site.etag if headers["If-None-Match"]
+                            else headers["If-Modified-Since"] == site.last_modified)
+            if not_modified:
+                self.send_response(304)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            body = site.body
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            if self.path != "/no-etag":
+                self.send_header("ETag", site.etag)
+            self.send_header("Last-Modified", site.last_modified)
+            if site.send_length:
+                self.send_header("Content-Length", str(len(body)))
+            else:
+                self.send_header("Connection", "close")
+                self.close_connection = True
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.handle_error = lambda request, client_address: None  # Client ngắt giữa chừng (trang vượt giới hạn).
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    site.url = f"http://127.0.0.1:{server.server_port}"
+    yield site
+    server.shutdown()
+    server.server_close()
+
+
+def test_conditional_fetch(site):
+    from core.extractors import fetch_url_text
+    text, etag, last_modified = fetch_url_text(f"{site.url}/page")
+    assert site.paragraphs[0] in text and etag == site.etag and last_modified == site.last_modified
+    assert fetch_url_text(f"{site.url}/page", etag, last_modified) == (None, etag, last_modified)
+    assert site.requests[-1]["If-None-Match"] == etag
+    # Máy chủ không có ETag: dựa vào Last-Modified.
+    text, etag, last_modified = fetch_url_text(f"{site.url}/no-etag")
+    assert etag is None
+    assert fetch_url_text(f"{site.url}/no-etag", etag, last_modified)[0] is None
+    assert site.requests[-1]["If-Modified-Since"] == last_modified
+
+
+@pytest.mark.parametrize("send_length", [True, False])
+def test_byte_cap(site, send_length):
+    from core.extractors import fetch_url_text
+    site.send_length = send_length  # Không có Content-Length: giới hạn được kiểm tra khi đọc theo luồng.
+    with pytest.raises(ValueError, match="giới hạn"):
+        fetch_url_text(f"{site.url}/page", max_bytes=len(site.body) // 2)
+    assert fetch_url_text(f"{site.url}/page", max_bytes=len(site.body))[0]
+
+
+def test_refresh_source(service_manager, site):
+    from core import extractors
+    from core.chunking import iter_chunks
+    sm = service_manager
+    course_id, _ = sm.create_course("Làm mới nguồn web")
+    url = f"{site.url}/page"
+    [result] = sm.add_sources(course_id, [("url", url)])
+    assert result["status"] == "added"
+    file_hash, manifest = result["hash"], sm._get_manifest(course_id)
+    fingerprint = manifest.fingerprint()
+
+    # Lần đầu chưa có ETag: tải lại toàn bộ, nội dung không đổi.
+    assert sm.refresh_source(course_id, file_hash)["status"] == "unchanged"
+    assert manifest.get_web_source(file_hash)["etag"] == site.etag
+    # Lần sau: yêu cầu có điều kiện, máy chủ trả 304.
+    assert sm.refresh_source(course_id, file_hash)["status"] == "unchanged"
+    assert site.requests[-1]["If-None-Match"] == site.etag
+    assert manifest.fingerprint() == fingerprint
+
+    # Tài liệu nạp trước khi có bảng web_sources: lần làm mới đầu chỉ ghi hash nội dung.
+    manifest._conn.execute("DELETE FROM web_sources"); manifest._conn.commit()
+    result = sm.refresh_source(course_id, file_hash)
+    assert (result["status"], result["added"], result["removed"]) == ("unchanged", 0, 0)
+    assert manifest.get_web_source(file_hash)["content_hash"] and manifest.fingerprint() == fingerprint
+
+    # Đổi một đoạn ở giữa trang: chỉ các chunk chứa đoạn đó được ghi lại.
+    old_chunks = sm._get_doc_chunks(course_id, file_hash)
+    site.set(site.paragraphs[:6] + [make_text(120, seed=99)] + site.paragraphs[7:])
+    result = sm.refresh_source(course_id, file_hash)
+    assert result["status"] == "updated" and result["added"] > 0 and result["kept"] > 0
+    assert result["added"] + result["kept"] == len(sm._get_doc_chunks(course_id, file_hash))
+    new_text = extractors.fetch_url_text(url)[0]
+    assert sm._get_doc_chunks(course_id, file_hash) == list(iter_chunks(sm.tokenizer, new_text))
+    assert sm._get_doc_chunks(course_id, file_hash)[:2] == old_chunks[:2]
+    assert manifest.fingerprint() != fingerprint
+    assert sm.refresh_source(course_id, file_hash)["status"] == "unchanged"
+
+    # Trang vượt giới hạn: báo lỗi và giữ nguyên bản cũ.
+    import core.services
+    site.set(site.paragraphs + [make_text(120, seed=100)])
+    fingerprint, chunks = manifest.fingerprint(), sm._get_doc_chunks(course_id, file_hash)
+    original = core.services.FETCH_MAX_BYTES
+    core.services.FETCH_MAX_BYTES = len(site.body) // 2
+    try:
+        result = sm.refresh_source(course_id, file_hash)
+    finally:
+        core.services.FETCH_MAX_BYTES = original
+    assert result["status"] == "error" and "giới hạn" in result["error"]
+    assert sm._get_doc_chunks(course_id, file_hash) == chunks and manifest.fingerprint() == fingerprint
+    sm.delete_course(course_id)
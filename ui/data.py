@@ -0,0 +1,48 @@
+# pnote-ai-app/ui/data.py
+
+# ==============================================================================
+# CÁC ĐƯỜNG ĐỌC DỮ LIỆU CỦA GIAO DIỆN (CÓ MEMOIZATION)
+#
+# Streamlit chạy lại toàn bộ trang sau mỗi tương tác. Các hàm dưới đây ghi nhớ
+# kết quả theo phiên bản dữ liệu của service_manager (data_version), nên chỉ
+# đọc lại từ ChromaDB/manifest khi tài liệu hoặc khóa học thực sự thay đổi.
+# ==============================================================================
+
+import streamlit as st
+from core.services import service_manager
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _list_courses(version: int) -> list[dict]:
+    return service_manager.list_courses()
+
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def _list_docs(course_id: str, version: int) -> list[dict]:
+    return service_manager.list_docs(course_id)
+
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def _course_statistics(course_id: str, version: int) -> dict | None:
+    return service_manager.get_course_statistics(course_id)
+
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def _answer_cache_enabled(course_id: str, version: int) -> bool:
+    return service_manager.is_answer_cache_enabled(course_id)
+
+
+def list_courses() -> list[dict]:
+    return _list_courses(service_manager.data_version())
+
+
+def list_docs(course_id: str) -> list[dict]:
+    return _list_docs(course_id, service_manager.data_version(course_id))
+
+
+def get_course_statistics(course_id: str) -> dict | None:
+    return _course_statistics(course_id, service_manager.data_version(course_id))
+
+
+def is_answer_cache_enabled(course_id: str) -> bool:
+    return _answer_cache_enabled(course_id, service_manager.data_version(course_id))
@@ -10,6 +10,8 @@ def display():
             except ValueError: s_idx = 0
             s_name = st.radio("Không gian làm việc", names, index=s_idx, label_visibility="collapsed")
             st.session_state.cid = ids[names.index(s_name)]
+            st.session_state.sm.warm_course(st.session_state.cid)
+            st.page_link("pages/search.py", label="Tìm trên mọi workspace", icon="🔎")
         else: st.info("Tạo không gian làm việc mới.")
 
         with st.expander("➕ Quản lý", expanded=not courses):
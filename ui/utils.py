@@ -1,8 +1,12 @@
 # pnote-ai-app/ui/utils.py
+import os
 import streamlit as st
+@st.cache_data(show_spinner=False)
+def _read_css(file, mtime):
+    # mtime nằm trong khóa cache để sửa styles.css vẫn có hiệu lực ngay.
+    with open(file) as f: return f.read()
 def load_css(file):
-    try:
-        with open(file) as f: st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+    try: st.markdown(f"<style>{_read_css(file, os.path.getmtime(file))}</style>", unsafe_allow_html=True)
     except FileNotFoundError: st.error(f"Lỗi: Không tìm thấy file CSS.")
 def page_init(title, icon="📚"):
     st.set_page_config(page_title=title, page_icon=icon, layout="wide")